@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "workflow", "scripts"))
+
+from mock_server import MockServer
+from local_functions.clients import kegg_client
+from local_functions.kegg_entries import KEGG_BATCH_SIZE, get_kegg_entries, get_kegg_entry
+
+
+def main():
+    args = parse_args()
+    kegg_ids = ["lp_{0:04d}".format(i) for i in range(1, args.genes + 1)]
+
+    with MockServer(latency=args.latency) as server:
+        os.environ["KEGG_URL"] = server.url
+        kegg = kegg_client()
+
+        server.reset()
+        start = time.perf_counter()
+        per_row = {kegg_id: get_kegg_entry(kegg_id, kegg=kegg) for kegg_id in kegg_ids}
+        report("per-row", time.perf_counter() - start, server.requests, len(kegg_ids))
+
+        server.reset()
+        start = time.perf_counter()
+        batched = get_kegg_entries(kegg_ids, kegg=kegg, batch_size=args.batch_size)
+        report("batched", time.perf_counter() - start, server.requests, len(kegg_ids))
+
+    if per_row != batched:
+        sys.exit("The batched entries differ from the per-row entries.")
+
+
+def report(name, seconds, requests, genes):
+    print("{0:<8} {1:>8.2f} s {2:>6} requests {3:>9.1f} genes/s".format(name, seconds, requests, genes / seconds))
+
+
+def parse_args():
+    """
+    Function that parses commandline strings.
+    :return:
+    Argument parser object with the arguments 'genes', 'latency' and 'batch_size'.
+    """
+    parser = argparse.ArgumentParser(description="Compare per-row and batched KEGG retrieval against a mock server.")
+    parser.add_argument("--genes", type=int, default=200, help="number of genes to retrieve.")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds of latency per request.")
+    parser.add_argument("--batch-size", type=int, default=KEGG_BATCH_SIZE, help="number of entries per request.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
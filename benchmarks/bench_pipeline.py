@@ -0,0 +1,135 @@
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_server import MockServer
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "workflow", "scripts")
+
+# Scripts that are benchmarked, in the order they are run, with their input and output file in the working directory
+# and whether they query the mock server.
+STAGES = [("gene_id_converter", "counts.txt", "gene_ids.csv", True),
+          ("kegg", "gene_ids.csv", "kegg.csv", True),
+          ("uniprot", "kegg.csv", "uniprot.csv", True),
+          ("calculate_gc_content", "kegg.csv", "gc_content.csv", False),
+          ("cluster_pubmed", "uniprot.csv", "pubmed_clusters.csv", False)]
+
+SAMPLES = ["WCFS1.glc.1", "WCFS1.glc.2", "WCFS1.rib.1", "WCFS1.rib.2", "NC8.glc.1", "NC8.glc.2", "NC8.rib.1",
+           "NC8.rib.2"]
+
+REPORT_COLUMNS = ["genes", "stage", "seconds", "rows", "rows_per_second", "requests", "errors", "retries",
+                  "peak_rss_mb"]
+
+
+def main():
+    args = parse_args()
+    results = []
+    print("{0:>7} {1:<22}{2:>9}{3:>9}{4:>11}{5:>10}{6:>8}{7:>9}{8:>10}".format(*REPORT_COLUMNS))
+    for genes in args.sizes:
+        with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as work_dir:
+            write_counts(os.path.join(work_dir, "counts.txt"), genes)
+            with MockServer(latency=args.latency, error_rate=args.error_rate) as server:
+                env = dict(os.environ, KEGG_URL=server.url, UNIPROT_URL=server.url)
+                for stage in STAGES:
+                    server.reset()
+                    result = run_stage(stage, work_dir, env, args.workers)
+                    result.update({"genes": genes, "requests": server.requests, "errors": server.errors})
+                    results.append(result)
+                    print("{genes:>7} {stage:<22}{seconds:>9.2f}{rows:>9}{rows_per_second:>11.1f}{requests:>10}"
+                          "{errors:>8}{retries:>9}{peak_rss_mb:>10.1f}".format(**result))
+
+    if args.output:
+        with open(args.output, mode="w", newline="") as file:
+            writer = csv.writer(file, dialect="excel", delimiter="\t")
+            writer.writerow(REPORT_COLUMNS)
+            writer.writerows([result[column] for column in REPORT_COLUMNS] for result in results)
+
+
+def write_counts(out_path, genes):
+    """
+    Function that writes a synthetic RNA-Seq count file in the format of data/RNA-Seq-counts.txt.
+    :param out_path:
+    text or byte string giving the name (and path) of the file that should be written to.
+    :param genes:
+    integer representing the number of genes.
+    :return:
+    """
+    with open(out_path, mode="w", newline="") as file:
+        writer = csv.writer(file, dialect="excel", delimiter="\t")
+        writer.writerow(["ID"] + SAMPLES)
+        for number in range(1, genes + 1):
+            writer.writerow(["lp_{0:06d}".format(number)] + [(number * (i + 7)) % 20000 for i in range(len(SAMPLES))])
+
+
+def run_stage(stage, work_dir, env, workers=4):
+    """
+    Function that runs a script of the workflow in a separate process and measures it. The rows per second are taken
+    from the metrics file of the script (see the --metrics-file argument), so the start-up of the interpreter is not
+    counted.
+    :param stage:
+    tuple of the name of the script, its input and output file and whether it queries the mock server (see STAGES).
+    :param work_dir:
+    text or byte string giving the directory containing the input and output files.
+    :param env:
+    dictionary of the environment variables of the process.
+    :param workers:
+    integer representing the number of requests the fetch scripts send concurrently.
+    :return:
+    dictionary with the 'stage', 'seconds', 'rows', 'rows_per_second', 'retries' and 'peak_rss_mb' of the run.
+    """
+    name, input_name, output_name, fetches = stage
+    metrics_path = os.path.join(work_dir, "{0}.json".format(name))
+    command = [sys.executable, os.path.join(SCRIPTS_DIR, "{0}.py".format(name)),
+               "--input", os.path.join(work_dir, input_name), "--output", os.path.join(work_dir, output_name),
+               "--metrics-file", metrics_path]
+    if fetches:
+        # Every run starts without cache and the mock server is not rate limited.
+        command.extend(["--cache", "", "--rate", "0", "--workers", str(workers)])
+
+    with open(os.path.join(work_dir, "{0}.log".format(name)), mode="w+") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=log, env=env)
+        # wait4() returns the resource usage of this process only, unlike getrusage(RUSAGE_CHILDREN).
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        if os.waitstatus_to_exitcode(status) != 0:
+            log.seek(0)
+            sys.exit("{0} failed:\n{1}".format(name, log.read()[-2000:]))
+
+    with open(metrics_path, mode="r") as file:
+        report = json.load(file)
+    retries = sum(value for counter, value in report["counters"].items() if counter.startswith("retries."))
+    # ru_maxrss is given in kilobytes on Linux and in bytes on macOS.
+    peak_rss = usage.ru_maxrss / 1024 if sys.platform != "darwin" else usage.ru_maxrss / 1024 ** 2
+    return {"stage": name,
+            "seconds": seconds,
+            "rows": report["rows"],
+            "rows_per_second": report["rows_per_second"],
+            "retries": retries,
+            "peak_rss_mb": peak_rss}
+
+
+def parse_args():
+    """
+    Function that parses commandline strings.
+    :return:
+    Argument parser object with the arguments 'sizes', 'latency', 'error_rate', 'workers' and 'output'.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the scripts of the workflow on synthetic inputs against a "
+                                                 "mock KEGG and UniProt server.")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+                        default=[1000, 10000, 100000], help="comma separated numbers of genes of the inputs.")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds of latency per request.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of the requests that fail with a 503.")
+    parser.add_argument("--workers", type=int, default=4, help="number of concurrent requests of the fetch scripts.")
+    parser.add_argument("--output", type=str, default=None, help="path for a tsv file with the results.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "workflow", "scripts"))
+
+from mock_server import uniprot_accession, uniprot_record
+from local_functions.uniprot_flatfile import parse_uniprot_entry
+
+
+def regex_parse(data):
+    """
+    The regex parsing of get_uniprot_data() before the flat-file parser, kept as the baseline.
+    """
+    regex_function = re.compile("(?<=CC   -!- FUNCTION: )(?s:.*?)(?=CC   -!-)")
+    regex_pubmed = re.compile("(?<=RX   PubMed=)(\\d*)(?=;)")
+
+    try:
+        pubmed_ids = re.findall(regex_pubmed, data)
+        match = re.search(regex_function, data)
+        if match:
+            gene_function = match.group()
+            gene_function = re.sub("\nCC", "", gene_function)
+            gene_function = re.sub(" +", " ", gene_function)
+            gene_function = gene_function.strip().replace(";", ".")
+        else:
+            gene_function = ""
+    except TypeError:
+        gene_function = ""
+        pubmed_ids = ""
+
+    return gene_function, pubmed_ids
+
+
+def line_parse(data):
+    entry = parse_uniprot_entry(data)
+    return entry["function"], entry["pubmed_ids"]
+
+
+def line_parse_details(data):
+    return parse_uniprot_entry(data, details=True)
+
+
+def main():
+    args = parse_args()
+    entries = [uniprot_record(uniprot_accession("lp_{0:06d}".format(number))) for number in range(args.entries)]
+
+    for entry in entries:
+        if regex_parse(entry) != line_parse(entry):
+            sys.exit("The parsers disagree on:\n{0}".format(entry))
+
+    print("{0:<16}{1:>10}{2:>18}".format("parser", "us/entry", "peak KiB/entry"))
+    for name, parse in [("regex", regex_parse), ("line", line_parse), ("line + details", line_parse_details)]:
+        start = time.process_time()
+        for _ in range(args.repeat):
+            for entry in entries:
+                parse(entry)
+        cpu = (time.process_time() - start) / (args.repeat * len(entries))
+
+        # The memory allocated while parsing an entry is measured separately, tracing it slows the parsers down.
+        tracemalloc.start()
+        peak = 0
+        for entry in entries:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            parse(entry)
+            peak += tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+        print("{0:<16}{1:>10.1f}{2:>18.2f}".format(name, cpu * 1e6, peak / len(entries) / 1024))
+
+def parse_args():
+    """
+    Function that parses commandline strings.
+    :return:
+    Argument parser object with the arguments 'entries' and 'repeat'.
+    """
+    parser = argparse.ArgumentParser(description="Compare the regex and flat-file parsers of UniProt entries.")
+    parser.add_argument("--entries", type=int, default=1000, help="number of synthetic entries to parse.")
+    parser.add_argument("--repeat", type=int, default=20, help="number of times every entry is parsed.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
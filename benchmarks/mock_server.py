@@ -0,0 +1,212 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Number of distinct synthetic PubMed identifiers, small enough that genes share articles.
+PUBMED_POOL = 5000
+
+# Status of the responses that fail on purpose, one of the statuses the fetch scripts retry after.
+ERROR_STATUS = 503
+
+
+def kegg_record(kegg_id):
+    """
+    Function that generates a synthetic (but deterministic) KEGG flat-file record for a gene identifier.
+    :param kegg_id:
+    string giving the identifier of the gene without organism prefix, e.g. 'lp_0001'.
+    :return:
+    string containing the record including the '///' terminator.
+    """
+    digest = hashlib.sha256(kegg_id.encode()).digest()
+    length = 300 + int.from_bytes(digest[:2], "big") % 1200
+    seq = "".join("acgt"[(digest[i % len(digest)] >> (i % 4)) % 4] for i in range(length))
+    number = int.from_bytes(digest[2:5], "big")
+    lines = ["ENTRY       {0:<18}CDS       T00011".format(kegg_id),
+             "NAME        gene{0}".format(number % 1000),
+             "DEFINITION  synthetic protein {0}".format(kegg_id),
+             "ORGANISM    lpl  Lactiplantibacillus plantarum WCFS1",
+             "PATHWAY     lpl0{0:04d}  Synthetic pathway {0}".format(number % 50),
+             "            lpl01100  Metabolic pathways",
+             "DBLINKS     NCBI-ProteinID: CCC{0:05d}".format(number % 100000),
+             "            UniProt: {0}".format(uniprot_accession(kegg_id)),
+             "NTSEQ       {0}".format(length)]
+    lines.extend("            " + seq[i:i + 60] for i in range(0, length, 60))
+    return "\n".join(lines) + "\n///\n"
+
+
+def uniprot_accession(kegg_id):
+    """
+    Function that generates the synthetic (but deterministic) UniProt accession listed in the record of a gene.
+    :param kegg_id:
+    string giving the identifier of the gene without organism prefix, e.g. 'lp_0001'.
+    :return:
+    string giving a UniProt accession, e.g. 'F9U1A2B3'.
+    """
+    digest = hashlib.sha256(kegg_id.encode()).digest()
+    return "F9U{0:05X}".format(int.from_bytes(digest[2:5], "big") % 0x100000)
+
+
+def uniprot_fields(accession):
+    """
+    Function that generates the synthetic (but deterministic) function and PubMed identifiers of a UniProt entry.
+    :param accession:
+    string giving the UniProt accession.
+    :return:
+    a string giving the gene function and a list containing the PubMed identifiers.
+    """
+    digest = hashlib.sha256(accession.encode()).digest()
+    gene_function = ("Catalyzes synthetic reaction {0} of the {1} pathway. Requires Mg(2+) as a cofactor; the activity "
+                     "is lost on dimer dissociation.".format(digest[0], digest[1] % 50))
+    pubmed_ids = sorted({str(10000000 + int.from_bytes(digest[3 + 2 * i:5 + 2 * i], "big") % PUBMED_POOL)
+                         for i in range(digest[2] % 7)})
+    return gene_function, pubmed_ids
+
+
+def uniprot_record(accession):
+    """
+    Function that generates a synthetic (but deterministic) UniProt flat-file entry for an accession.
+    :param accession:
+    string giving the UniProt accession.
+    :return:
+    string containing the entry including the '//' terminator.
+    """
+    gene_function, pubmed_ids = uniprot_fields(accession)
+    digest = hashlib.sha256(accession.encode()).digest()
+    lines = ["ID   {0}_LACPL              Reviewed;         300 AA.".format(accession),
+             "AC   {0};".format(accession),
+             "DE   RecName: Full=Synthetic protein {0};".format(accession),
+             "DE            EC=2.7.{0}.{1} {{ECO:0000255|HAMAP-Rule:MF_00001}};".format(digest[0] % 12, digest[1]),
+             "OS   Lactiplantibacillus plantarum (strain ATCC BAA-793 / NCIMB 8826 / WCFS1)."]
+    for number, pubmed_id in enumerate(pubmed_ids, start=1):
+        lines.extend(["RN   [{0}]".format(number),
+                      "RP   NUCLEOTIDE SEQUENCE [LARGE SCALE GENOMIC DNA].",
+                      "RX   PubMed={0}; DOI=10.0000/synthetic.{0};".format(pubmed_id),
+                      "RA   Kleerebezem M., Boekhorst J., van Kranenburg R., Molenaar D., Kuipers O.P., Leer R.;",
+                      "RT   \"Complete genome sequence of a synthetic strain.\";",
+                      "RL   Proc. Natl. Acad. Sci. U.S.A. 100:1990-1995(2003)."])
+    # The function is wrapped over several lines like in real entries.
+    words = gene_function.split()
+    cc_lines, line = [], "CC   -!- FUNCTION:"
+    for word in words:
+        if len(line) + len(word) >= 75:
+            cc_lines.append(line)
+            line = "CC      "
+        line += " " + word
+    lines.extend(cc_lines + [line,
+                             "CC   -!- SUBCELLULAR LOCATION: Cytoplasm.",
+                             "CC   -!- SIMILARITY: Belongs to the synthetic protein family.",
+                             "CC   " + "-" * 75,
+                             "CC   Copyrighted by the UniProt Consortium, see https://www.uniprot.org/terms",
+                             "CC   Distributed under the Creative Commons Attribution (CC BY 4.0) License",
+                             "CC   " + "-" * 75,
+                             "DR   EMBL; AL935263; CCC{0:05d}.1; -; Genomic_DNA.".format(digest[2] * 100),
+                             "DR   RefSeq; WP_{0:09d}.1; NZ_CP028977.1.".format(int.from_bytes(digest[3:6], "big")),
+                             "DR   AlphaFoldDB; {0}; -.".format(accession),
+                             "DR   STRING; 220668.lp_{0:04d}; -.".format(digest[4] * 10)])
+    lines.extend("DR   GO; GO:{0:07d}; F:synthetic activity {1}; IEA:InterPro.".format(
+        int.from_bytes(digest[6 + 2 * i:8 + 2 * i], "big"), i) for i in range(1 + digest[5] % 8))
+    lines.extend(["DR   InterPro; IPR{0:06d}; Synthetic_dom.".format(digest[7] * 100),
+                  "DR   Pfam; PF{0:05d}; Synthetic; 1.".format(digest[8] * 10),
+                  "PE   3: Inferred from homology;",
+                  "KW   Cytoplasm; Reference proteome; Transferase.",
+                  "FT   CHAIN           1..300",
+                  "FT                   /note=\"Synthetic protein {0}\"".format(accession),
+                  "SQ   SEQUENCE   300 AA;  33000 MW;  0000000000000000 CRC64;"])
+    lines.extend("     " + " ".join("MKVLAAGIVG" for _ in range(6)) for _ in range(5))
+    lines.append("//")
+    return "\n".join(lines) + "\n"
+
+
+class MockServer:
+    """
+    Local HTTP stand-in for the KEGG REST 'get' operation and the UniProt entry and stream endpoints. Every request is
+    delayed by the configured latency, a share of the requests fails with ERROR_STATUS and the number of requests is
+    counted so fetch strategies can be compared without querying the real services.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        """
+        :param latency:
+        number of seconds every response is delayed.
+        :param error_rate:
+        number between 0 and 1 giving the share of the requests that fail.
+        :param seed:
+        integer used to seed the choice of the failing requests, so runs fail the same requests.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{0}".format(self._server.server_address[1])
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+
+    def respond(self, path):
+        """
+        Function that creates the response for a request path.
+        :param path:
+        string giving the path of the request.
+        :return:
+        integer giving the HTTP status and a string giving the body of the response.
+        """
+        url = urlsplit(path)
+        if url.path.startswith("/get/"):
+            records = [kegg_record(entry.split(":", 1)[-1]) for entry in unquote(url.path[5:]).split("+") if entry]
+            return 200, "".join(records)
+        if url.path.endswith("/uniprotkb/stream"):
+            query = parse_qs(url.query).get("query", [""])[0]
+            lines = ["Entry\tFunction [CC]\tPubMed ID"]
+            for accession in re.findall("[A-Z0-9]+", query.split(":", 1)[-1]):
+                if accession != "OR":
+                    gene_function, pubmed_ids = uniprot_fields(accession)
+                    lines.append("{0}\tFUNCTION: {1}\t{2}".format(accession, gene_function, "; ".join(pubmed_ids)))
+            return 200, "\n".join(lines) + "\n"
+        if "/uniprotkb/" in url.path:
+            return 200, uniprot_record(url.path.rsplit("/", 1)[-1].split(".", 1)[0])
+        return 404, ""
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    failed = server._random.random() < server.error_rate
+                    if failed:
+                        server.errors += 1
+                time.sleep(server.latency)
+                status, body = (ERROR_STATUS, "") if failed else server.respond(self.path)
+                body = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
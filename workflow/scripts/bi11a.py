@@ -0,0 +1,109 @@
+import argparse
+import importlib
+import sys
+
+from local_functions.worker import WorkerUnavailable, detach, serve, stop, submit
+
+# Commands of the CLI, every command is the main() function of the script with the same name.
+COMMANDS = {"import_dump": "import KEGG and UniProt flat-files into a local store",
+            "split_by_organism": "split the genes into one file per organism",
+            "merge_organisms": "merge the files of multiple organisms into one file",
+            "kegg_harvest": "get the UniProt and NCBI protein identifiers, NT sequence and pathways of every gene",
+            "gene_id_converter": "get the UniProt and NCBI protein identifiers of every gene",
+            "kegg": "get the NT sequence and pathways of every gene",
+            "uniprot": "get the function and PubMed identifiers of every gene",
+            "stream_fetch": "get the KEGG and UniProt data of every gene in one streaming pipeline",
+            "sort_by_pubmed": "sort the genes by their number of PubMed identifiers",
+            "cluster_pubmed": "list the genes of every PubMed identifier",
+            "pubmed_cooccurrence": "find the pairs and clusters of genes that share PubMed identifiers",
+            "calculate_gc_content": "calculate the GC content of every gene",
+            "plot_gc_content": "plot the GC content of every gene",
+            "pathway_enrichment": "test which KEGG pathways are over-represented in sets of genes",
+            "expression_analysis": "normalise the RNA-Seq counts and compare the conditions, GC content and literature",
+            "metrics_report": "summarise the metrics of the stages of a run"}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "serve":
+        if args.detach:
+            detach(args.socket, args.log, run_command, COMMANDS)
+        else:
+            serve(args.socket, run_command, COMMANDS)
+    elif args.command == "stop":
+        try:
+            stop(args.socket)
+        except WorkerUnavailable:
+            pass
+    elif args.socket:
+        try:
+            sys.exit(submit(args.socket, args.command, args.arguments))
+        except WorkerUnavailable:
+            run_command(args.command, args.arguments)
+    else:
+        run_command(args.command, args.arguments)
+
+
+def run_command(command, argv):
+    """
+    Function that runs a command of the CLI in the current process.
+    :param command:
+    string giving the name of the command (see COMMANDS).
+    :param argv:
+    list of strings giving the arguments of the command.
+    :return:
+    """
+    module = importlib.import_module(command)
+    # The scripts report their commandline in their metrics and help messages.
+    sys.argv = [module.__file__] + list(argv)
+    module.main(list(argv))
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. The first argument is the command, the arguments after it are passed on
+    to the script of the command (see COMMANDS). With --socket the command is run by the worker listening on that
+    socket, or in this process if no worker is listening. The 'serve' command starts a worker on the socket, which
+    imports all scripts once and runs every command it receives in a fork of itself (in the background with --detach,
+    writing its own output to --log), and the 'stop' command stops it.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'socket', 'detach', 'log', 'command' and 'arguments'.
+    """
+    parser = argparse.ArgumentParser(description="Run the scripts of the workflow.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog="commands:\n" + "\n".join("  {0:<22}{1}".format(command, description)
+                                                                      for command, description in COMMANDS.items()) +
+                                     "\n  {0:<22}{1}\n  {2:<22}{3}".format("serve", "start a worker on --socket",
+                                                                           "stop", "stop the worker on --socket"))
+
+    parser.add_argument("--socket",
+                        type=str,
+                        required=False,
+                        default=None,
+                        help="(absolute) path for the Unix socket of the worker.")
+    parser.add_argument("--detach",
+                        action="store_true",
+                        help="start the worker in the background and return once it is listening.")
+    parser.add_argument("--log",
+                        type=str,
+                        required=False,
+                        default="./results/worker.log",
+                        help="(absolute) path for the file the output of a detached worker is written to.")
+    parser.add_argument("command",
+                        choices=list(COMMANDS) + ["serve", "stop"],
+                        help="the command to run, see below.")
+    parser.add_argument("arguments",
+                        nargs=argparse.REMAINDER,
+                        help="arguments of the command, see '{command} --help'.")
+
+    args = parser.parse_args(argv)
+    if args.command in ("serve", "stop") and not args.socket:
+        parser.error("The {0} command requires --socket.".format(args.command))
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,113 @@
 import argparse
+import functools
+import itertools
 import sys
 
 from local_functions.local_functions import *
+from local_functions.gc_content import METRICS, profile_cells, profile_chunk, profile_genome_chunk
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.processing import add_jobs_argument, job_count, process_all
 
+# Number of rows per chunk sent to a worker process, large enough that pickling a chunk is cheap compared to
+# calculating it for bacterial genes of ~1 kb.
+GC_CHUNK_SIZE = 256
 
-def main():
-    args = parse_args()
-    data, row_count = calculate_gc_content(args.input)
-    write_to_csv(args.output, data, row_count)
 
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("calculate_gc_content", args.metrics_file):
+        metrics = args.metrics.split(",")
+        genome = (tuple(args.genome), tuple(args.annotation)) if args.genome else None
+        rows = calculate_gc_content(read_rows(args.input), args.window, args.step, metrics, job_count(args.jobs),
+                                    args.chunk_size, genome)
+        write_rows(args.output, rows, row_count_hint(args.input), desc="Calculating GC", out_format=args.format)
 
-def calculate_gc_content(data_path):
-    """
-    Function that parses a tabular file for nucleotide sequences and appends the calculated overall GC percentage and
-    windowed GC percentages of the sequences to the rows in the columns 'gc_content' and 'gc_content_subsections'.
-    :param data_path:
-    text or byte string giving the name (and path) of the tabular file containing nucleotide sequences.
-    :return:
-    nested list [[],[],etc] containing the contents of the input file along with the acquired GC percentages.
-    Integer representing the number of rows in the input file.
-    """
-    data = []
-    with open(data_path, mode="r") as file:
-        row_count = count_lines(file)
-        csvReader = csv.reader(file, dialect="excel", delimiter="\t")
-
-        header = csvReader.__next__()
-        if header[0] == "KEGG_ID":
-            header.extend(["gc_content", "gc_content_subsections"])
-            data.append(header)
-            nt_seq_index = header.index("nt_seq")
-        else:
-            sys.exit("The file does not contain a valid header, quitting.")
-
-        for line in tqdm(csvReader, desc="Calculating GC", total=row_count - 1):
-            seq = line[nt_seq_index]
-            if seq:
-                gc_content = get_gc_content(seq)
-                gc_content_subsections = get_gc_content_subsection(seq)
-                line.extend([gc_content, ";".join("{0}".format(n) for n in gc_content_subsections)])
-            else:
-                line.extend(["", ""])
-            data.append(line)
-
-    return data, row_count
-
-
-def get_gc_content_subsection(seq, window=10):
+
+def calculate_gc_content(rows, window=10, step=None, metrics=("gc",), jobs=1, chunk_size=GC_CHUNK_SIZE, genome=None):
     """
-    Function that calculates the windowed GC percentages of a nucleotide sequence by dividing the sequence in
-    subsections and then calling get_gc_content() for each subsection and storing the results in a list.
-    :param seq:
-    string representing a nucleotide sequence.
+    Function that takes the rows of a tabular file with nucleotide sequences and appends the overall and windowed
+    values of the requested metrics of the sequences to the rows. For the default 'gc' metric these are the GC
+    percentages in the columns 'gc_content' and 'gc_content_subsections', the 'skew' and 'n' metrics add the columns
+    'gc_skew' and 'gc_skew_subsections' and 'n_content' and 'n_content_subsections' respectively. With a genome the
+    sequences are extracted from it by the KEGG IDs (the locus tags of the genes) in the worker processes, the
+    'nt_seq' column is then optional and only used for genes that are not in the genome.
+    :param rows:
+    iterator yielding the header row followed by the other rows of a tabular file containing nucleotide sequences (see
+    read_rows()).
     :param window:
-    integer representing the size the subsections in which the supplied sequence will be divided.
+    integer representing the size of the subsections.
+    :param step:
+    integer representing the distance between the starts of consecutive subsections, defaults to the window size.
+    :param metrics:
+    list of metric names ('gc', 'skew' and/or 'n').
+    :param jobs:
+    integer representing the number of processes the rows are divided over, the output order does not depend on it.
+    :param chunk_size:
+    integer representing the number of rows sent to a process at once.
+    :param genome:
+    tuple of a tuple of the paths of the FASTA files and a tuple of the paths of the GFF3 or GenBank files of a
+    reference genome, or None to use the 'nt_seq' column.
     :return:
-    list of integers where each integer represents the GC percentage of a subsection of the supplied sequence.
+    generator yielding the header row followed by the rows of the input along with the calculated values.
     """
-    result = []
-    for i in range(0, len(seq) - window + 1, window):
-        subseq = seq[i:i + window]
-        result.append(get_gc_content(subseq))
-    return result
-
-
-def get_gc_content(seq):
+    header = next(rows)
+    if header[0] == "KEGG_ID":
+        for metric in metrics:
+            header.extend([METRICS[metric], "{0}_subsections".format(METRICS[metric])])
+        yield header
+        nt_seq_index = header.index("nt_seq") if genome is None or "nt_seq" in header else None
+    else:
+        sys.exit("The file does not contain a valid header, quitting.")
+
+    # Only the sequences are sent to the worker processes, the rows wait in the tee buffer (at most jobs * 2 chunks).
+    chunks, seq_chunks = itertools.tee(chunked(rows, chunk_size))
+    if genome is None:
+        seq_chunks = ([line[nt_seq_index] for line in lines] for lines in seq_chunks)
+        calculate = functools.partial(profile_chunk, window=window, step=step, metrics=metrics)
+    else:
+        # Only the locus tags (and sequences of the rows that have one) are sent, the workers map the genome.
+        seq_chunks = ([(line[0], line[nt_seq_index] if nt_seq_index is not None else "") for line in lines]
+                      for lines in seq_chunks)
+        calculate = functools.partial(profile_genome_chunk, window=window, step=step, metrics=metrics,
+                                      fasta_paths=genome[0], annotation_paths=genome[1])
+    for lines, cells in zip(chunks, process_all(seq_chunks, calculate, jobs)):
+        for line, line_cells in zip(lines, cells):
+            line.extend(line_cells)
+            yield line
+
+
+def get_gc_data(seq, window=10, step=None, metrics=("gc",)):
     """
-    Function that calculates the overall GC percentage of a nucleotide sequence by counting the number of 'c' and 'g'
-    characters in the input string and then dividing this number by the total number of characters in the string before
-    multiplying it by a hundred.
+    Function that calculates the overall and windowed values of the requested metrics of a nucleotide sequence and
+    formats them as the cells of a row, with the windowed values separated by semicolons.
     :param seq:
-    string representing a nucleotide sequence.
+    string representing a nucleotide sequence (can be empty).
+    :param window:
+    integer representing the size of the subsections.
+    :param step:
+    integer representing the distance between the starts of consecutive subsections, defaults to the window size.
+    :param metrics:
+    list of metric names ('gc', 'skew' and/or 'n').
     :return:
-    integer representing the overall GC percentage of the supplied sequence.
+    list of strings containing two cells per metric, empty if the sequence is empty.
     """
-    return round((seq.count("c") + seq.count("g")) / len(seq) * 100)
+    return profile_cells(seq, window, step, metrics)
 
 
-def parse_args():
+def parse_args(argv=None):
     """
     Function that parses commandline strings. Has an --input and --output argument for an input file and output file
     respectively. The input file must be tabular with a header row and column called 'nt_seq' containing valid
-    nucleotide sequences (cells can be left empty).
+    nucleotide sequences (cells can be left empty), unless the sequences are taken from the reference genome in the
+    --genome FASTA files, whose genes are located with the --annotation GFF3 or GenBank files. The --window, --step and
+    --metrics arguments set the size of the subsections, the distance between them and the values that are calculated
+    and the --jobs and --chunk-size arguments the number of processes and the number of rows sent to a process at once.
+    The --format argument sets the format of the output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
     :return:
-    Argument parser object with the arguments 'input' and 'output'.
+    Argument parser object with the arguments 'input', 'output', 'window', 'step', 'metrics', 'genome', 'annotation',
+    'jobs', 'chunk_size', 'format' and 'metrics_file'.
     """
     parser = argparse.ArgumentParser(description="Calculate and visualize the GC content of (a) sequence(s).",
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -98,10 +122,51 @@ def parse_args():
                         required=False,
                         default="./results/gc_content.csv",
                         help="(absolute) path for the output file.")
-
-    args = parser.parse_args()
+    parser.add_argument("--window",
+                        type=int,
+                        required=False,
+                        default=10,
+                        help="size of the subsections in nucleotides.")
+    parser.add_argument("--step",
+                        type=int,
+                        required=False,
+                        default=None,
+                        help="distance between the starts of consecutive subsections, defaults to the window size. "
+                             "Use a step smaller than the window for overlapping subsections.")
+    parser.add_argument("--metrics",
+                        type=str,
+                        required=False,
+                        default="gc",
+                        help="comma separated list of the values to calculate: 'gc' (GC percentage), 'skew' (GC skew) "
+                             "and/or 'n' (percentage of unknown bases).")
+    parser.add_argument("--genome",
+                        type=str,
+                        nargs="+",
+                        default=[],
+                        help="(absolute) paths for FASTA files of a reference genome to take the sequences from, "
+                             "instead of the nt_seq column.")
+    parser.add_argument("--annotation",
+                        type=str,
+                        nargs="+",
+                        default=[],
+                        help="(absolute) paths for GFF3 or GenBank files with the locations of the genes of the "
+                             "--genome, by their locus tags.")
+    add_jobs_argument(parser, GC_CHUNK_SIZE)
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+    if args.window < 1 or (args.step is not None and args.step < 1):
+        parser.error("--window and --step must be at least 1.")
+    if args.jobs < 0 or args.chunk_size < 1:
+        parser.error("--jobs must be at least 0 and --chunk-size at least 1.")
+    if bool(args.genome) != bool(args.annotation):
+        parser.error("--genome and --annotation must be given together.")
+    if not set(args.metrics.split(",")) <= set(METRICS):
+        parser.error("--metrics must be a comma separated list of: {0}.".format(", ".join(METRICS)))
 
     return args
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,14 @@ import argparse
 import sys
 
 from local_functions.local_functions import *
+from local_functions.metrics import add_metrics_argument, instrument
 
 
-def main():
-    args = parse_args()
-    data, row_count = cluster_pubmed(args.input)
-    write_to_csv(args.output, data, row_count)
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("cluster_pubmed", args.metrics_file):
+        data, row_count = cluster_pubmed(args.input)
+        write_to_csv(args.output, data, row_count, args.format)
 
 
 def cluster_pubmed(data_path):
@@ -21,20 +23,20 @@ def cluster_pubmed(data_path):
     integer representing the number of inner lists in the returned nested list.
     """
     data = [["PubMed_ID", "KEGG_ID"]]
-    with open(data_path, mode="r") as file:
-        row_count = count_lines(file)
-        csvReader = csv.reader(file, dialect="excel", delimiter="\t")
+    rows = read_rows(data_path)
+    header = next(rows)
+    rows.close()
+    if header[0] != "KEGG_ID":
+        sys.exit("The file does not contain a valid header, quitting.")
 
-        header = csvReader.__next__()
-        if header[0] == "KEGG_ID":
-            pubmed_id_index = header.index("PubMed_ID")
-        else:
-            sys.exit("The file does not contain a valid header, quitting.")
+    # Only the two columns that are needed are read, which skips decoding the sequences of a Parquet file.
+    rows = read_rows(data_path, columns=["KEGG_ID", "PubMed_ID"])
+    next(rows)
 
-        pubmed_cluster = build_dictionary(csvReader, pubmed_id_index, row_count)
-        for key in pubmed_cluster.keys():
-            line = [key, ";".join(pubmed_cluster[key])]
-            data.append(line)
+    pubmed_cluster = build_dictionary(rows, 1, row_count_hint(data_path))
+    for key in pubmed_cluster.keys():
+        line = [key, ";".join(pubmed_cluster[key])]
+        data.append(line)
 
     return data, len(data)
 
@@ -48,12 +50,12 @@ def build_dictionary(csv_reader, pubmed_id_index, row_count):
     :param pubmed_id_index:
     integer representing the location of the PubMed identifier in the row.
     :param row_count:
-    integer representing the number of rows in the input file.
+    integer representing the number of rows in the input file (excluding the header), or None if it is not known.
     :return:
     dictionary where each key is a PubMed identifier and each value is a list of KEGG identifiers.
     """
     pubmed_cluster = {}
-    for line in tqdm(csv_reader, desc="Clustering", total=row_count - 1):
+    for line in tqdm(csv_reader, desc="Clustering", total=row_count):
         kegg_id = line[0]
         pubmed_ids = line[pubmed_id_index].split(";")
         for pubmed_id in pubmed_ids:
@@ -67,13 +69,15 @@ def build_dictionary(csv_reader, pubmed_id_index, row_count):
     return pubmed_cluster
 
 
-def parse_args():
+def parse_args(argv=None):
     """
     Function that parses commandline strings. Has an --input and --output argument for an input file and output file
     respectively. The input file must be tabular with a header row and a column called 'PubMed_ID' containing valid
-    PubMed identifiers (cells can be left empty).
+    PubMed identifiers (cells can be left empty). The --format argument sets the format of the output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
     :return:
-    Argument parser object with the arguments 'input' and 'output'.
+    Argument parser object with the arguments 'input', 'output', 'format' and 'metrics_file'.
     """
     parser = argparse.ArgumentParser(description="Create a summary of which genes appear "
                                                  "in the same PubMed publication",
@@ -89,10 +93,13 @@ def parse_args():
                         required=False,
                         default="./results/pubmed_clusters.csv",
                         help="(absolute) path for the output file.")
+    add_format_argument(parser)
+    add_metrics_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     return args
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import sys
+
+import numpy as np
+
+from local_functions.local_functions import *
+from local_functions.expression import anova, benjamini_hochberg, condition_groups, cpm, group_means, sample_columns, \
+    spearman, to_matrix, tpm
+from local_functions.genome import read_annotation
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.organisms import ORGANISM_COLUMN
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("expression_analysis", args.metrics_file):
+        table = read_expression(args.input, args.samples, args.annotation)
+        genes, summary = analyse_expression(table, args.contrasts)
+        write_rows(args.output, genes, len(table["kegg_ids"]), desc="Writing genes", out_format=args.format)
+        write_rows(args.summary, summary, desc="Writing summary", out_format=args.format)
+
+
+def read_expression(data_path, samples=None, annotation_paths=()):
+    """
+    Function that reads the RNA-Seq counts of a tabular file in a single pass, together with the GC content, the
+    PubMed IDs and the length of every gene. The PubMed IDs and sequences are reduced to their number and length while
+    the rows are read, only the short cells are kept and the counts are loaded into one contiguous gene x sample array.
+    :param data_path:
+    text or byte string giving the name (and path) of the tabular file.
+    :param samples:
+    list of strings giving the names of the count columns, or None to use every column named like a sample (see
+    expression.SAMPLE_PATTERN).
+    :param annotation_paths:
+    list of the paths of GFF3 or GenBank files the lengths of the genes are taken from (see genome.read_annotation()),
+    for the genes without a sequence in the 'nt_seq' column.
+    :return:
+    dictionary with the KEGG IDs ('kegg_ids'), the organisms ('organisms', None if the file has no such column), the
+    names of the samples ('samples'), the count array ('counts') and numpy arrays with the GC content ('gc_content'),
+    the number of PubMed IDs ('pubmed_counts') and the length ('lengths') of every gene, NaN where it is not known.
+    """
+    rows = read_rows(data_path)
+    header = next(rows)
+    rows.close()
+    samples = samples or sample_columns(header)
+    missing = [sample for sample in samples if sample not in header]
+    if not samples or missing:
+        sys.exit("The file does not contain the count columns {0}, quitting.".format(", ".join(missing) or "(none)"))
+
+    optional = [column for column in (ORGANISM_COLUMN, "gc_content") if column in header]
+    measured = [column for column in ("PubMed_ID", "nt_seq") if column in header]
+    rows = read_rows(data_path, columns=[header[0]] + optional + samples + measured)
+    next(rows)
+    width = len(optional) + len(samples) + 1
+    cells = []
+    sizes = []
+    for row in tqdm(rows, desc="Reading file", total=row_count_hint(data_path)):
+        cells.append(row[:width])
+        sizes.append([len(cell) if column == "nt_seq" else cell.count(";") + (cell != "")
+                      for column, cell in zip(measured, row[width:])])
+    text = np.array(cells, dtype=str).reshape(len(cells), width)
+    column = {name: text[:, index] for index, name in enumerate(optional, start=1)}
+    column.update(zip(measured, np.array(sizes, dtype=np.float64).reshape(len(cells), len(measured)).T))
+
+    gene_count = len(cells)
+    gc_content = to_matrix(column["gc_content"][:, np.newaxis], missing=np.nan)[:, 0] \
+        if "gc_content" in column else np.full(gene_count, np.nan)
+    pubmed_counts = column.get("PubMed_ID", np.full(gene_count, np.nan))
+    lengths = column.get("nt_seq", np.zeros(gene_count))
+    if annotation_paths:
+        loci = {}
+        for annotation_path in annotation_paths:
+            for locus_tag, location in read_annotation(annotation_path).items():
+                loci.setdefault(locus_tag, location[2] - location[1])
+        annotated = np.array([loci.get(kegg_id, 0) for kegg_id in text[:, 0]], dtype=np.float64)
+        lengths = np.where(lengths > 0, lengths, annotated)
+
+    return {"kegg_ids": text[:, 0].tolist(),
+            "organisms": column[ORGANISM_COLUMN].tolist() if ORGANISM_COLUMN in column else None,
+            "samples": samples,
+            "counts": to_matrix(text[:, len(optional) + 1:]),
+            "gc_content": gc_content,
+            "pubmed_counts": pubmed_counts,
+            "lengths": np.where(lengths > 0, lengths, np.nan)}
+
+
+def parse_contrasts(contrasts, conditions):
+    """
+    Function that looks up the conditions of the fold changes to calculate.
+    :param contrasts:
+    list of strings giving the contrasts as '{condition}:{reference}', or an empty list to compare every condition to
+    the first.
+    :param conditions:
+    list of strings giving the names of the conditions.
+    :return:
+    list of tuples of the index of the condition and of its reference.
+    """
+    if not contrasts:
+        return [(index, 0) for index in range(1, len(conditions))]
+    pairs = []
+    for contrast in contrasts:
+        condition, _, reference = contrast.partition(":")
+        if condition not in conditions or reference not in conditions:
+            sys.exit("The contrast {0} is not between two of the conditions {1}, quitting.".format(
+                contrast, ", ".join(conditions)))
+        pairs.append((conditions.index(condition), conditions.index(reference)))
+    return pairs
+
+
+def format_column(values, spec="%.4g"):
+    """
+    Function that formats a numpy array of floats to the cells of a column, NaN values become empty cells.
+    :param values:
+    numpy array of floats.
+    :param spec:
+    string giving the printf-style format of the values.
+    :return:
+    list of strings.
+    """
+    cells = np.char.mod(spec, values)
+    cells[~np.isfinite(values)] = ""
+    return cells.tolist()
+
+
+def analyse_expression(table, contrasts=()):
+    """
+    Function that calculates the expression statistics of every gene and summarises the relation of expression with
+    the GC content and the literature, all with array operations over the gene x sample matrix. Counts are normalised
+    to counts per million (CPM) and, for genes with a known length, transcripts per million (TPM). Log2 fold changes
+    are the differences between the mean log2(CPM + 1) of two conditions, and a one-way ANOVA on the log2(CPM + 1)
+    values tests whether the expression of a gene differs between the conditions, the p-values are adjusted with the
+    Benjamini-Hochberg procedure.
+    :param table:
+    dictionary with the data of the genes (see read_expression()).
+    :param contrasts:
+    list of strings giving the fold changes to calculate as '{condition}:{reference}', by default every condition is
+    compared to the first.
+    :return:
+    list with the header row followed by a row per gene and a list with the header row followed by a row per
+    condition (and one for all samples) with the Spearman correlation of the mean log2(CPM + 1) with the GC content and
+    the number of PubMed IDs, and the median CPM of the genes with (cited) and without PubMed IDs.
+    """
+    conditions, groups = condition_groups(table["samples"])
+    counts = table["counts"]
+    cpm_values = cpm(counts)
+    log_cpm = np.log2(cpm_values + 1)
+    mean_cpm = group_means(cpm_values, groups, len(conditions))
+    mean_tpm = group_means(tpm(counts, table["lengths"]), groups, len(conditions))
+    mean_log_cpm = group_means(log_cpm, groups, len(conditions))
+    pairs = parse_contrasts(contrasts, conditions)
+    fold_changes = np.stack([mean_log_cpm[:, condition] - mean_log_cpm[:, reference] for condition, reference in pairs],
+                            axis=1) if pairs else np.zeros((counts.shape[0], 0))
+    p_values = anova(log_cpm, groups, len(conditions))
+
+    header = ["KEGG_ID"] + ([ORGANISM_COLUMN] if table["organisms"] is not None else []) + \
+        ["gc_content", "PubMed_ID_count", "length"] + \
+        ["mean_cpm.{0}".format(condition) for condition in conditions] + \
+        ["mean_tpm.{0}".format(condition) for condition in conditions] + \
+        ["log2_fc.{0}_vs_{1}".format(conditions[condition], conditions[reference])
+         for condition, reference in pairs] + \
+        ["p_value", "q_value"]
+    columns = [table["kegg_ids"]] + ([table["organisms"]] if table["organisms"] is not None else []) + \
+        [format_column(table["gc_content"], "%.0f"), format_column(table["pubmed_counts"], "%.0f"),
+         format_column(table["lengths"], "%.0f")] + \
+        [format_column(mean_cpm[:, index], "%.2f") for index in range(len(conditions))] + \
+        [format_column(mean_tpm[:, index], "%.2f") for index in range(len(conditions))] + \
+        [format_column(fold_changes[:, index], "%.3f") for index in range(len(pairs))] + \
+        [format_column(p_values), format_column(benjamini_hochberg(p_values))]
+    genes = [header] + [list(row) for row in zip(*columns)]
+
+    # The expression of every condition and of all samples together.
+    expression = np.column_stack([mean_log_cpm, log_cpm.mean(axis=1)])
+    gc_rho, gc_genes = spearman(expression, table["gc_content"])
+    pubmed_rho, _ = spearman(expression, table["pubmed_counts"])
+    cited = table["pubmed_counts"] > 0
+    uncited = table["pubmed_counts"] == 0
+    all_cpm = np.column_stack([mean_cpm, cpm_values.mean(axis=1)])
+    no_genes = np.full(all_cpm.shape[1], np.nan)
+    rows = len(conditions) + 1
+    columns = [conditions + ["all"], [counts.shape[0]] * rows, [gc_genes] * rows, format_column(gc_rho),
+               [int(cited.sum())] * rows, format_column(pubmed_rho),
+               format_column(np.median(all_cpm[cited], axis=0) if cited.any() else no_genes, "%.2f"),
+               format_column(np.median(all_cpm[uncited], axis=0) if uncited.any() else no_genes, "%.2f")]
+    summary = [["condition", "genes", "genes_with_gc_content", "spearman_gc_content", "genes_cited",
+                "spearman_PubMed_ID_count", "median_cpm_cited", "median_cpm_uncited"]] + \
+        [list(row) for row in zip(*columns)]
+    return genes, summary
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input argument for an input file and an --output and --summary
+    argument for the output files with the statistics per gene and the summary per condition. The input file must be
+    tabular with a header row, the KEGG IDs in the first column and the RNA-Seq counts in columns named
+    '{strain}.{condition}.{replicate}' (or the columns given with --samples). The optional 'gc_content', 'PubMed_ID'
+    and 'nt_seq' columns give the GC content, literature and length of the genes, the --annotation argument gives the
+    lengths of genes without a sequence. The --contrasts argument sets the fold changes that are calculated and the
+    --format argument sets the format of the output files.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input', 'output', 'summary', 'samples', 'contrasts', 'annotation',
+    'format' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Normalise the RNA-Seq counts and compare the expression of the "
+                                                 "conditions, the GC content and the literature.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        required=False,
+                        default="./results/gc_content.csv",
+                        help="(absolute) path for file with the RNA-Seq counts. First row must be a header and first "
+                             "column must contain KEGG identifiers.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=False,
+                        default="./results/expression.csv",
+                        help="(absolute) path for the output file with the statistics of every gene.")
+    parser.add_argument("--summary",
+                        type=str,
+                        required=False,
+                        default="./results/expression_summary.csv",
+                        help="(absolute) path for the output file with the summary per condition.")
+    parser.add_argument("--samples",
+                        type=lambda value: [sample.strip() for sample in value.split(",") if sample.strip()],
+                        required=False,
+                        default=None,
+                        help="comma separated names of the count columns, named '{condition}.{replicate}'. By default "
+                             "every column named like that is used.")
+    parser.add_argument("--contrasts",
+                        type=lambda value: [contrast.strip() for contrast in value.split(",") if contrast.strip()],
+                        required=False,
+                        default=[],
+                        help="comma separated fold changes to calculate as condition:reference (e.g. "
+                             "WCFS1.rib:WCFS1.glc). By default every condition is compared to the first.")
+    parser.add_argument("--annotation",
+                        type=str,
+                        nargs="+",
+                        default=[],
+                        help="(absolute) paths for GFF3 or GenBank files with the lengths of the genes without a "
+                             "sequence in the nt_seq column.")
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,99 @@
 import argparse
 import sys
 
-from bioservices import KEGG
 from local_functions.local_functions import *
-
-
-def main():
-    args = parse_args()
-    data, row_count = kegg_to_alt_id(args.input)
-    write_to_csv(args.output, data, row_count)
-
-
-def kegg_to_alt_id(data_path):
+from local_functions.cache import add_cache_arguments, journal_ttl, open_cache
+from local_functions.checkpoint import FetchJournal, add_journal_arguments
+from local_functions.clients import kegg_client
+from local_functions.fetching import add_fetch_arguments, fetch_all, set_rate_limit
+from local_functions.kegg_entries import KEGG_BATCH_SIZE, get_alt_ids, get_kegg_entry, get_organism_entries
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.organisms import DEFAULT_ORGANISM, add_organism_argument, organism_getter
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("gene_id_converter", args.metrics_file):
+        cache = open_cache(args)
+        set_rate_limit("kegg", args.rate, args.rate_file)
+        journal = FetchJournal(args.output, refresh=args.refresh, organism=args.organism, ttl=journal_ttl(args))
+        rows = journal.resume(read_rows(args.input),
+                              lambda rows: kegg_to_alt_id(rows, cache, args.batch_size, args.workers, journal.failures,
+                                                          args.organism))
+        write_rows(args.output, rows, row_count_hint(args.input), desc="Retrieving data", out_format=args.format)
+
+
+def kegg_to_alt_id(rows, cache=None, batch_size=KEGG_BATCH_SIZE, workers=1, failures=None, organism=DEFAULT_ORGANISM):
     """
-    Function that parses a tabular file for KEGG IDs and appends the corresponding UniProt and NCBI IDs to the rows in
-    the columns 'UniProt_ID' and 'NCBI_protein_ID'.
-    :param data_path:
-    text or byte string giving the name (and path) of the tabular file containing KEGG IDs.
+    Function that takes the rows of a tabular file with KEGG IDs and appends the corresponding UniProt and NCBI IDs to
+    the rows in the columns 'UniProt_ID' and 'NCBI_protein_ID'. Rows are yielded as soon as their data is retrieved.
+    :param rows:
+    iterator yielding the header row followed by the other rows of a tabular file containing KEGG IDs (see read_rows()).
+    :param cache:
+    EntryCache object used to look up KEGG entries before querying the database, or None to always query it.
+    :param batch_size:
+    integer representing the number of KEGG entries retrieved per request.
+    :param workers:
+    integer representing the number of requests that are sent concurrently.
+    :param failures:
+    set to which the KEGG IDs whose entry could not be retrieved are added (their columns are left empty), or None to
+    raise a FetchError instead.
+    :param organism:
+    string giving the KEGG organism code of the genes, for the rows without one in the 'organism' column.
     :return:
-    nested list [[],[],etc] containing the contents of the input file along with the acquired UniProt and NCBI IDs.
-    Integer representing the number of rows in the input file.
+    generator yielding the header row followed by the rows of the input along with the acquired UniProt and NCBI IDs.
     """
-    data = []
-    with open(data_path, mode="r") as file:
-        row_count = count_lines(file)
-        csvReader = csv.reader(file, dialect="excel", delimiter="\t")
-
-        header = csvReader.__next__()
-        if header[0] == "ID":
-            header[0] = "KEGG_ID"
-            header.extend(["UniProt_ID", "NCBI_protein_ID"])
-            data.append(header)
-        else:
-            sys.exit("The file does not contain a valid header, quitting.")
-
-        for line in tqdm(csvReader, desc="Retrieving data", total=row_count-1):
-            uniprot_id, ncbi_protein_id = get_alt_id(line[0])
+    header = next(rows)
+    if header[0] == "ID":
+        header[0] = "KEGG_ID"
+        header.extend(["UniProt_ID", "NCBI_protein_ID"])
+        yield header
+    else:
+        sys.exit("The file does not contain a valid header, quitting.")
+
+    kegg = kegg_client(offline=cache is not None and cache.offline)
+    organism_of = organism_getter(header, organism)
+    batches = chunked(rows, batch_size)
+    for lines, kegg_entries in fetch_all(batches, lambda batch: get_organism_entries(
+            batch, organism_of, cache, kegg, batch_size, failures), workers):
+        for line in lines:
+            uniprot_id, ncbi_protein_id = get_alt_ids(kegg_entries[organism_of(line), line[0]])
             line.extend([uniprot_id, ncbi_protein_id])
-            data.append(line)
+            yield line
 
-    return data, row_count
 
-
-def get_alt_id(kegg_id):
+def get_alt_id(kegg_id, cache=None, organism=DEFAULT_ORGANISM):
     """
     Function that uses a KEGG ID to query the KEGG database for the corresponding entry from which it then takes the
     UniProt and NCBI Protein ID (if available) and returns them.
     :param kegg_id:
     string giving the identifier of a KEGG database entry.
+    :param cache:
+    EntryCache object used to look up the entry before querying the database, or None to always query it.
+    :param organism:
+    string giving the KEGG organism code of the gene (e.g. 'lpl').
     :return:
     two strings giving the identifiers for UniProt and NCBI respectively.
     """
-    kegg = KEGG()
-    response = kegg.get("lpl:{}".format(kegg_id))
-    kegg_entry = kegg.parse(response)
-
-    try:
-        uniprot = kegg_entry["DBLINKS"]["UniProt"]
-    except KeyError:
-        uniprot = ""
-
-    try:
-        NCBIProteinID = kegg_entry["DBLINKS"]["NCBI-ProteinID"]
-    except KeyError:
-        NCBIProteinID = ""
+    return get_alt_ids(get_kegg_entry(kegg_id, cache, organism=organism))
 
-    return uniprot, NCBIProteinID
 
-
-def parse_args():
+def parse_args(argv=None):
     """
     Function that parses commandline strings. Has an --input and --output argument for an input file and output file
-    respectively. The input file must be tabular with a header row and the first column must be called 'ID' and
-    contain valid KEGG identifiers.
+    respectively. The input file must be tabular with a header row and the first column must be called 'ID' and contain
+    valid KEGG identifiers, an optional 'organism' column gives the KEGG organism code of every gene (--organism for
+    genes without one). The --batch-size, --workers and --rate arguments set the number of entries per request, the
+    number of concurrent requests and the requests per second, which the --rate-file argument shares with other scripts,
+    and the --cache, --cache-ttl, --cache-size and --offline arguments configure the entry cache, with --source local
+    the entries are read from the --store instead. The --refresh argument disables reusing the results of previous runs
+    and the --format argument sets the format of the output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
     :return:
-    Argument parser object with the arguments 'input' and 'output'.
+    Argument parser object with the arguments 'input', 'output', 'batch_size', 'organism', 'workers', 'rate',
+    'rate_file', 'cache', 'cache_ttl', 'cache_size', 'offline', 'source', 'store', 'refresh', 'format' and
+    'metrics_file'.
     """
     parser = argparse.ArgumentParser(description="Get UniProt ID and NCBI protein ID.",
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -90,10 +109,24 @@ def parse_args():
                         required=False,
                         default="./results/alternate_identifiers.csv",
                         help="(absolute) path for the output file.")
-
-    args = parser.parse_args()
+    parser.add_argument("--batch-size",
+                        type=int,
+                        required=False,
+                        default=KEGG_BATCH_SIZE,
+                        choices=range(1, KEGG_BATCH_SIZE + 1),
+                        metavar="[1-{}]".format(KEGG_BATCH_SIZE),
+                        help="number of KEGG entries retrieved per request (1 retrieves every entry separately).")
+    add_organism_argument(parser)
+    add_fetch_arguments(parser, "kegg")
+    add_cache_arguments(parser)
+    add_journal_arguments(parser)
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
 
     return args
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import sys
+
+from local_functions.local_store import import_dumps
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.organisms import DEFAULT_ORGANISM
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("import_dump", args.metrics_file):
+        counts = import_dumps(args.store, args.kegg, args.uniprot, args.organism, args.from_cache)
+    print("Imported {0} KEGG and {1} UniProt entries and the UniProt fields of {2} entries into {3}.".format(
+        counts["kegg"], counts["uniprot"], counts["uniprot_fields"], args.store), file=sys.stderr)
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has a --kegg and --uniprot argument for the KEGG and UniProt flat-files
+    (optionally gzipped) to import, a --from-cache argument for an entry cache whose entries are imported as well and a
+    --store argument for the directory of the local store, which is replaced. The --organism argument gives the KEGG
+    organism code of the KEGG entries without an ORGANISM line.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'kegg', 'uniprot', 'from_cache', 'organism', 'store' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Import KEGG and UniProt flat-files into a local store.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--kegg",
+                        type=str,
+                        nargs="*",
+                        default=[],
+                        help="(absolute) paths for KEGG flat-files with the gene entries, separated by '///' lines.")
+    parser.add_argument("--uniprot",
+                        type=str,
+                        nargs="*",
+                        default=[],
+                        help="(absolute) paths for UniProt flat-files ('.dat'), e.g. of the proteome of the organism.")
+    parser.add_argument("--from-cache",
+                        type=str,
+                        required=False,
+                        default=None,
+                        help="(absolute) path for an entry cache file whose KEGG and UniProt entries (and UniProt "
+                             "fields) are imported as well, e.g. ./results/.cache/entries.sqlite.")
+    parser.add_argument("--organism",
+                        type=str,
+                        required=False,
+                        default=DEFAULT_ORGANISM,
+                        help="KEGG organism code of the KEGG entries without an ORGANISM line.")
+    parser.add_argument("--store",
+                        type=str,
+                        required=False,
+                        default="./data/local_store",
+                        help="(absolute) path for the directory of the local store.")
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+    if not (args.kegg or args.uniprot or args.from_cache):
+        parser.error("Give at least one of --kegg, --uniprot and --from-cache.")
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,102 @@
 import argparse
 import sys
 
-from bioservices import KEGG
 from local_functions.local_functions import *
-
-
-def main():
-    args = parse_args()
-    data, row_count = get_kegg_data(args.input)
-    write_to_csv(args.output, data, row_count)
-
-
-def get_kegg_data(data_path):
+from local_functions.cache import add_cache_arguments, journal_ttl, open_cache
+from local_functions.checkpoint import FetchJournal, add_journal_arguments
+from local_functions.clients import kegg_client
+from local_functions.fetching import add_fetch_arguments, fetch_all, set_rate_limit
+from local_functions.kegg_entries import KEGG_BATCH_SIZE, get_kegg_entry, get_organism_entries, get_seq_and_pathways
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.organisms import DEFAULT_ORGANISM, add_organism_argument, organism_getter
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("kegg", args.metrics_file):
+        cache = open_cache(args)
+        set_rate_limit("kegg", args.rate, args.rate_file)
+        journal = FetchJournal(args.output, refresh=args.refresh, organism=args.organism, ttl=journal_ttl(args))
+        rows = journal.resume(read_rows(args.input),
+                              lambda rows: get_kegg_data(rows, cache, args.batch_size, args.workers, journal.failures,
+                                                         args.organism))
+        if args.no_nt_seq:
+            # Only the written rows lose their sequence, the journal keeps them for a run without the option.
+            rows = (row if index == 0 else row[:-2] + ["", row[-1]] for index, row in enumerate(rows))
+        write_rows(args.output, rows, row_count_hint(args.input), desc="Retrieving data", out_format=args.format)
+
+
+def get_kegg_data(rows, cache=None, batch_size=KEGG_BATCH_SIZE, workers=1, failures=None, organism=DEFAULT_ORGANISM):
     """
-    Function that parses a tabular file for KEGG IDs and appends the corresponding nucleotide sequence and pathways to
-    the rows in the columns 'nt_seq' and 'pathways'.
-    :param data_path:
-    text or byte string giving the name (and path) of the tabular file containing KEGG IDs.
+    Function that takes the rows of a tabular file with KEGG IDs and appends the corresponding nucleotide sequence and
+    pathways to the rows in the columns 'nt_seq' and 'pathways'. Rows are yielded as soon as their data is retrieved.
+    :param rows:
+    iterator yielding the header row followed by the other rows of a tabular file containing KEGG IDs (see read_rows()).
+    :param cache:
+    EntryCache object used to look up KEGG entries before querying the database, or None to always query it.
+    :param batch_size:
+    integer representing the number of KEGG entries retrieved per request.
+    :param workers:
+    integer representing the number of requests that are sent concurrently.
+    :param failures:
+    set to which the KEGG IDs whose entry could not be retrieved are added (their columns are left empty), or None to
+    raise a FetchError instead.
+    :param organism:
+    string giving the KEGG organism code of the genes, for the rows without one in the 'organism' column.
     :return:
-    nested list [[],[],etc] containing the contents of the input file along with the acquired sequences and pathways.
-    Integer representing the number of rows in the input file.
+    generator yielding the header row followed by the rows of the input along with the acquired sequences and pathways.
     """
-    data = []
-    with open(data_path, mode="r") as file:
-        row_count = count_lines(file)
-        csvReader = csv.reader(file, dialect="excel", delimiter="\t")
-
-        header = csvReader.__next__()
-        if header[0] == "KEGG_ID":
-            header.extend(["nt_seq", "pathways"])
-            data.append(header)
-        else:
-            sys.exit("The file does not contain a valid header, quitting.")
-
-        for line in tqdm(csvReader, desc="Retrieving data", total=row_count-1):
-            nt_seq, pathways = get_data(line[0])
+    header = next(rows)
+    if header[0] == "KEGG_ID":
+        header.extend(["nt_seq", "pathways"])
+        yield header
+    else:
+        sys.exit("The file does not contain a valid header, quitting.")
+
+    kegg = kegg_client(offline=cache is not None and cache.offline)
+    organism_of = organism_getter(header, organism)
+    batches = chunked(rows, batch_size)
+    for lines, kegg_entries in fetch_all(batches, lambda batch: get_organism_entries(
+            batch, organism_of, cache, kegg, batch_size, failures), workers):
+        for line in lines:
+            nt_seq, pathways = get_seq_and_pathways(kegg_entries[organism_of(line), line[0]])
             line.extend([nt_seq.lower(), ";".join(pathways)])
-            data.append(line)
+            yield line
 
-    return data, row_count
 
-
-def get_data(kegg_id):
+def get_data(kegg_id, cache=None, organism=DEFAULT_ORGANISM):
     """
     Function that uses a KEGG ID to query the KEGG database for the corresponding entry from which it then takes the
     nucleotide sequence and the pathways (if available) and returns them.
     :param kegg_id:
     string giving the identifier of a KEGG database entry.
+    :param cache:
+    EntryCache object used to look up the entry before querying the database, or None to always query it.
+    :param organism:
+    string giving the KEGG organism code of the gene (e.g. 'lpl').
     :return:
     a string giving the nucleotide sequence and a list containing the pathways.
     """
-    kegg = KEGG()
-    kegg_entry = kegg.get("lpl:{}".format(kegg_id))
-    data = kegg.parse(kegg_entry)
-
-    try:
-        nt_seq = data["NTSEQ"]
-    except KeyError:
-        nt_seq = ""
-
-    try:
-        pathways = []
-        for pathway in data["PATHWAY"]:
-            s = "{0}: {1}".format(pathway, data["PATHWAY"][pathway])
-            pathways.append(s.replace(";", "."))
-    except KeyError:
-        pathways = ""
+    return get_seq_and_pathways(get_kegg_entry(kegg_id, cache, organism=organism))
 
-    return nt_seq, pathways
 
-
-def parse_args():
+def parse_args(argv=None):
     """
     Function that parses commandline strings. Has an --input and --output argument for an input file and output file
     respectively. The input file must be tabular with a header row and the first column must be called 'KEGG_ID' and
-    contain valid KEGG identifiers.
+    contain valid KEGG identifiers, an optional 'organism' column gives the KEGG organism code of every gene (--organism
+    for genes without one). The --batch-size, --workers and --rate arguments set the number of entries per request, the
+    number of concurrent requests and the requests per second, which the --rate-file argument shares with other scripts,
+    and the --cache, --cache-ttl, --cache-size and --offline arguments configure the entry cache, with --source local
+    the entries are read from the --store instead. The --refresh argument disables reusing the results of previous runs
+    and the --format argument sets the format of the output file. The --no-nt-seq argument leaves the sequences out of
+    the output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
     :return:
-    Argument parser object with the arguments 'input' and 'output'.
+    Argument parser object with the arguments 'input', 'output', 'batch_size', 'no_nt_seq', 'organism', 'workers',
+    'rate', 'rate_file', 'cache', 'cache_ttl', 'cache_size', 'offline', 'source', 'store', 'refresh', 'format' and
+    'metrics_file'.
     """
     parser = argparse.ArgumentParser(description="Get NT sequence and KEGG pathways.",
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -92,10 +112,28 @@ def parse_args():
                         required=False,
                         default="./results/kegg.csv",
                         help="(absolute) path for the output file.")
-
-    args = parser.parse_args()
+    parser.add_argument("--batch-size",
+                        type=int,
+                        required=False,
+                        default=KEGG_BATCH_SIZE,
+                        choices=range(1, KEGG_BATCH_SIZE + 1),
+                        metavar="[1-{}]".format(KEGG_BATCH_SIZE),
+                        help="number of KEGG entries retrieved per request (1 retrieves every entry separately).")
+    parser.add_argument("--no-nt-seq",
+                        action="store_true",
+                        help="leave the nt_seq column empty, e.g. when the sequences are taken from a reference "
+                             "genome by calculate_gc_content.py.")
+    add_organism_argument(parser)
+    add_fetch_arguments(parser, "kegg")
+    add_cache_arguments(parser)
+    add_journal_arguments(parser)
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
 
     return args
 
 
-main()
+if __name__ == "__main__":
+    main()
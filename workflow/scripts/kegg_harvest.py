@@ -0,0 +1,165 @@
+import argparse
+import sys
+
+from local_functions.local_functions import *
+from local_functions.cache import add_cache_arguments, journal_ttl, open_cache
+from local_functions.checkpoint import FetchJournal, add_journal_arguments
+from local_functions.clients import kegg_client
+from local_functions.fetching import add_fetch_arguments, fetch_all, set_rate_limit
+from local_functions.kegg_entries import KEGG_BATCH_SIZE, get_alt_ids, get_organism_entries, get_seq_and_pathways
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.organisms import DEFAULT_ORGANISM, add_organism_argument, organism_getter
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("kegg_harvest", args.metrics_file):
+        cache = open_cache(args)
+        set_rate_limit("kegg", args.rate, args.rate_file)
+        journal = FetchJournal(args.output, refresh=args.refresh, organism=args.organism, ttl=journal_ttl(args))
+        rows = journal.resume(read_rows(args.input),
+                              lambda rows: harvest_kegg(rows, cache, args.batch_size, args.workers, journal.failures,
+                                                        args.organism))
+        with open_writer(args.output, args.format) as kegg_writer, RowWriter(args.alt_id_output) as alt_id_writer:
+            rows = write_outputs(rows, kegg_writer, alt_id_writer, args.no_nt_seq)
+            next(rows)
+            for _ in tqdm(rows, desc="Retrieving data", total=row_count_hint(args.input)):
+                pass
+
+
+def write_outputs(rows, kegg_writer, alt_id_writer, no_nt_seq=False):
+    """
+    Function that writes the rows of harvest_kegg() to the two output files as they pass through, so they can be
+    processed further while they are written (see stream_fetch.py).
+    :param rows:
+    iterator yielding the header row followed by the rows of harvest_kegg().
+    :param kegg_writer:
+    RowWriter or ParquetRowWriter object for the output file with all retrieved data.
+    :param alt_id_writer:
+    RowWriter object for the output file with only the UniProt and NCBI identifiers (all but the last two columns).
+    :param no_nt_seq:
+    boolean, if True the nt_seq column is left empty.
+    :return:
+    generator yielding copies of the rows as they are written to the output file with all retrieved data.
+    """
+    header = next(rows)
+    kegg_writer.writerow(header)
+    alt_id_writer.writerow(header[:-2])
+    yield list(header)
+    for row in rows:
+        if no_nt_seq:
+            # Only the written rows lose their sequence, the journal keeps them for a run without the option.
+            row[-2] = ""
+        kegg_writer.writerow(row)
+        alt_id_writer.writerow(row[:-2])
+        # A copy, as a Parquet writer holds on to the rows until its row group is full.
+        yield list(row)
+
+
+def harvest_kegg(rows, cache=None, batch_size=KEGG_BATCH_SIZE, workers=1, failures=None, organism=DEFAULT_ORGANISM):
+    """
+    Function that takes the rows of a tabular file with KEGG IDs and retrieves the corresponding KEGG entry once per
+    gene. From each entry the UniProt and NCBI IDs are appended to the rows in the columns 'UniProt_ID' and
+    'NCBI_protein_ID', after which the nucleotide sequence and pathways are appended in the columns 'nt_seq' and
+    'pathways'. Rows are yielded as soon as their data is retrieved, the alternate identifiers output consists of all
+    but the last two columns of each row.
+    :param rows:
+    iterator yielding the header row followed by the other rows of a tabular file containing KEGG IDs (see read_rows()).
+    :param cache:
+    EntryCache object used to look up KEGG entries before querying the database, or None to always query it.
+    :param batch_size:
+    integer representing the number of KEGG entries retrieved per request.
+    :param workers:
+    integer representing the number of requests that are sent concurrently.
+    :param failures:
+    set to which the KEGG IDs whose entry could not be retrieved are added (their columns are left empty), or None to
+    raise a FetchError instead.
+    :param organism:
+    string giving the KEGG organism code of the genes, for the rows without one in the 'organism' column.
+    :return:
+    generator yielding the header row followed by the rows of the input along with the acquired UniProt and NCBI IDs,
+    sequences and pathways.
+    """
+    header = next(rows)
+    if header[0] == "ID":
+        header[0] = "KEGG_ID"
+        header.extend(["UniProt_ID", "NCBI_protein_ID", "nt_seq", "pathways"])
+        yield header
+    else:
+        sys.exit("The file does not contain a valid header, quitting.")
+
+    kegg = kegg_client(offline=cache is not None and cache.offline)
+    organism_of = organism_getter(header, organism)
+    batches = chunked(rows, batch_size)
+    for lines, kegg_entries in fetch_all(batches, lambda batch: get_organism_entries(
+            batch, organism_of, cache, kegg, batch_size, failures), workers):
+        for line in lines:
+            kegg_entry = kegg_entries[organism_of(line), line[0]]
+            line.extend(get_alt_ids(kegg_entry))
+            nt_seq, pathways = get_seq_and_pathways(kegg_entry)
+            line.extend([nt_seq.lower(), ";".join(pathways)])
+            yield line
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input argument for an input file and an --output and
+    --alt-id-output argument for the two output files. The input file must be tabular with a header row and the first
+    column must be called 'ID' and contain valid KEGG identifiers, an optional 'organism' column gives the KEGG organism
+    code of every gene (--organism for genes without one). The --batch-size, --workers and --rate arguments set the
+    number of entries per request, the number of concurrent requests and the requests per second, which the --rate-file
+    argument shares with other scripts, and the --cache, --cache-ttl, --cache-size and --offline arguments configure the
+    entry cache, with --source local the entries are read from the --store instead. The --refresh argument disables
+    reusing the results of previous runs and the --format argument sets the format of the --output file, the alternate
+    identifiers are always written as tsv. The --no-nt-seq argument leaves the sequences out of the --output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input', 'output', 'alt_id_output', 'batch_size', 'no_nt_seq',
+    'organism', 'workers', 'rate', 'rate_file', 'cache', 'cache_ttl', 'cache_size', 'offline', 'source', 'store',
+    'refresh', 'format' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Get UniProt ID, NCBI protein ID, NT sequence and KEGG pathways.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        required=False,
+                        default="./data/RNA-Seq-counts.txt",
+                        help="(absolute) path for file with KEGG identifiers. First row must be a header and first "
+                             "column must contain KEGG identifiers.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=False,
+                        default="./results/kegg.csv",
+                        help="(absolute) path for the output file with all retrieved data.")
+    parser.add_argument("--alt-id-output",
+                        type=str,
+                        required=False,
+                        default="./results/alternate_identifiers.csv",
+                        help="(absolute) path for the output file with only the UniProt and NCBI identifiers.")
+    parser.add_argument("--batch-size",
+                        type=int,
+                        required=False,
+                        default=KEGG_BATCH_SIZE,
+                        choices=range(1, KEGG_BATCH_SIZE + 1),
+                        metavar="[1-{}]".format(KEGG_BATCH_SIZE),
+                        help="number of KEGG entries retrieved per request (1 retrieves every entry separately).")
+    parser.add_argument("--no-nt-seq",
+                        action="store_true",
+                        help="leave the nt_seq column empty, e.g. when the sequences are taken from a reference "
+                             "genome by calculate_gc_content.py.")
+    add_organism_argument(parser)
+    add_fetch_arguments(parser, "kegg")
+    add_cache_arguments(parser)
+    add_journal_arguments(parser)
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import atexit
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from local_functions.local_store import LocalStore
+from local_functions.metrics import metrics
+
+# Number of cache hits whose access time is kept in memory before it is written to the SQLite file.
+ACCESS_BATCH_SIZE = 1000
+
+# Fraction of max_size the cache is reduced to when it has grown beyond max_size, so the entries are not evicted again
+# on every put.
+EVICT_TO = 0.9
+
+
+class EntryCache:
+    """
+    Persistent on-disk cache for raw database entries (KEGG and UniProt flat-files) backed by SQLite. The text of each
+    entry is stored once under its SHA-256 digest and entries are looked up by database name and identifier. Entries
+    older than the TTL are treated as missing and the least recently used entries are evicted once the total size of the
+    cached text exceeds max_size. The access times of cache hits are written in batches (and when the cache is closed or
+    the process exits) instead of once per hit. In offline mode nothing is fetched and entries missing from the cache
+    are returned as None.
+    """
+
+    def __init__(self, path, ttl=None, max_size=None, offline=False):
+        """
+        :param path:
+        text or byte string giving the name (and path) of the SQLite file, the directory is created if needed.
+        :param ttl:
+        number of seconds an entry stays valid, None means entries never expire.
+        :param max_size:
+        integer giving the maximum number of bytes of cached text, None means the cache is unbounded.
+        :param offline:
+        boolean, if True entries that are not cached are never fetched.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                db TEXT NOT NULL,
+                id TEXT NOT NULL,
+                digest TEXT NOT NULL REFERENCES blobs (digest),
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (db, id)
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+            CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+        """)
+        self._connection.commit()
+        # Running total of the size of the cached text, read from the file again only when it exceeds max_size,
+        # because other processes may have added or evicted entries in the meantime.
+        self._size = self._total_size()
+        self._accessed = {}
+        atexit.register(self._flush_accessed)
+
+    def get(self, db, entry_id):
+        """
+        Function that looks up an entry in the cache and marks it as recently used.
+        :param db:
+        string giving the name of the database the entry belongs to (e.g. 'kegg' or 'uniprot').
+        :param entry_id:
+        string giving the identifier of the entry.
+        :return:
+        string containing the raw text of the entry or None if it is not cached or has expired.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT blobs.text, entries.fetched FROM entries JOIN blobs ON entries.digest = blobs.digest "
+                "WHERE entries.db = ? AND entries.id = ?", (db, entry_id)).fetchone()
+            if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+                self.misses += 1
+                metrics.count("cache.{0}.misses".format(db))
+                return None
+
+            self._accessed[db, entry_id] = time.time()
+            if len(self._accessed) >= ACCESS_BATCH_SIZE:
+                self._write_accessed()
+                self._connection.commit()
+            self.hits += 1
+            metrics.count("cache.{0}.hits".format(db))
+            return row[0]
+
+    def put(self, db, entry_id, text):
+        """
+        Function that stores the raw text of an entry in the cache and evicts the least recently used entries if the
+        cache has grown beyond its maximum size.
+        :param db:
+        string giving the name of the database the entry belongs to (e.g. 'kegg' or 'uniprot').
+        :param entry_id:
+        string giving the identifier of the entry.
+        :param text:
+        string containing the raw text of the entry.
+        :return:
+        """
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        now = time.time()
+        size = len(text.encode())
+        with self._lock:
+            previous = self._connection.execute("SELECT digest FROM entries WHERE db = ? AND id = ?",
+                                                (db, entry_id)).fetchone()
+            # Text that is already cached under another ID is stored once and does not add to the size.
+            self._size += self._connection.execute("INSERT OR IGNORE INTO blobs (digest, text, size) VALUES (?, ?, ?)",
+                                                   (digest, text, size)).rowcount * size
+            self._connection.execute("INSERT OR REPLACE INTO entries (db, id, digest, fetched, accessed) "
+                                     "VALUES (?, ?, ?, ?, ?)", (db, entry_id, digest, now, now))
+            if previous is not None and previous[0] != digest:
+                self._size -= self._release(previous[0])
+            self._accessed.pop((db, entry_id), None)
+            if self.max_size is not None and self._size > self.max_size:
+                self._write_accessed()
+                self._evict()
+            self._connection.commit()
+
+    def fetch(self, db, entry_id, retrieve):
+        """
+        Function that returns an entry from the cache or, if it is not cached, retrieves it with the supplied function
+        and stores the result. Results that are not strings (e.g. error codes) are returned without being cached.
+        :param db:
+        string giving the name of the database the entry belongs to (e.g. 'kegg' or 'uniprot').
+        :param entry_id:
+        string giving the identifier of the entry.
+        :param retrieve:
+        function that takes entry_id and returns the raw text of the entry.
+        :return:
+        string containing the raw text of the entry, the value returned by retrieve if it is not a string or None if
+        the entry is not cached and the cache is offline.
+        """
+        text = self.get(db, entry_id)
+        if text is not None or self.offline:
+            return text
+
+        text = retrieve(entry_id)
+        if isinstance(text, str) and text:
+            self.put(db, entry_id, text)
+        return text
+
+    def size(self):
+        """
+        Function that returns the total number of bytes of text referenced by the cached entries.
+        :return:
+        integer
+        """
+        with self._lock:
+            return self._total_size()
+
+    def close(self):
+        """
+        Function that writes the pending access times and closes the connection to the SQLite file.
+        :return:
+        """
+        self._flush_accessed()
+        atexit.unregister(self._flush_accessed)
+        with self._lock:
+            self._connection.close()
+
+    def _flush_accessed(self):
+        with self._lock:
+            if self._accessed:
+                self._write_accessed()
+                self._connection.commit()
+
+    def _write_accessed(self):
+        self._connection.executemany("UPDATE entries SET accessed = ? WHERE db = ? AND id = ?",
+                                     [(accessed, db, entry_id) for (db, entry_id), accessed in self._accessed.items()])
+        self._accessed.clear()
+
+    def _total_size(self):
+        return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _evict(self):
+        self._size = self._total_size()
+        if self._size <= self.max_size:
+            return
+
+        rows = self._connection.execute("SELECT db, id, digest FROM entries ORDER BY accessed ASC").fetchall()
+        for db, entry_id, digest in rows:
+            if self._size <= self.max_size * EVICT_TO:
+                break
+            self._connection.execute("DELETE FROM entries WHERE db = ? AND id = ?", (db, entry_id))
+            self._size -= self._release(digest)
+
+    def _release(self, digest):
+        # The text is only removed once no entry refers to it anymore, the number of bytes freed is returned.
+        row = self._connection.execute("SELECT size FROM blobs WHERE digest = ? AND NOT EXISTS "
+                                       "(SELECT 1 FROM entries WHERE digest = ?)", (digest, digest)).fetchone()
+        if row is None:
+            return 0
+        self._connection.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        return row[0]
+
+
+def cached_fetch(cache, db, entry_id, retrieve):
+    """
+    Function that retrieves an entry through the cache if one is supplied and directly otherwise.
+    :param cache:
+    EntryCache object or None.
+    :param db:
+    string giving the name of the database the entry belongs to (e.g. 'kegg' or 'uniprot').
+    :param entry_id:
+    string giving the identifier of the entry.
+    :param retrieve:
+    function that takes entry_id and returns the raw text of the entry.
+    :return:
+    the raw text of the entry (see EntryCache.fetch).
+    """
+    if cache is None:
+        return retrieve(entry_id)
+    return cache.fetch(db, entry_id, retrieve)
+
+
+def add_cache_arguments(parser):
+    """
+    Function that adds the commandline arguments used to configure the entry cache to an argument parser.
+    :param parser:
+    argparse.ArgumentParser object.
+    :return:
+    """
+    parser.add_argument("--cache",
+                        type=str,
+                        required=False,
+                        default="./results/.cache/entries.sqlite",
+                        help="(absolute) path for the cache file with raw KEGG and UniProt entries. Use an empty "
+                             "string to disable the cache.")
+    parser.add_argument("--cache-ttl",
+                        type=float,
+                        required=False,
+                        default=30,
+                        help="number of days a cached entry stays valid, 0 means entries never expire.")
+    parser.add_argument("--cache-size",
+                        type=float,
+                        required=False,
+                        default=1024,
+                        help="maximum size of the cache in megabytes, 0 means the cache is unbounded.")
+    parser.add_argument("--offline",
+                        action="store_true",
+                        help="only use cached entries, entries that are not cached are left empty.")
+    parser.add_argument("--source",
+                        type=str,
+                        required=False,
+                        default="remote",
+                        choices=["remote", "local"],
+                        help="where the entries come from: 'remote' queries the databases (through the cache), "
+                             "'local' only reads the local store (see --store) and sends no requests at all.")
+    parser.add_argument("--store",
+                        type=str,
+                        required=False,
+                        default="./data/local_store",
+                        help="(absolute) path for the directory of the local store created by import_dump.py.")
+
+
+def open_cache(args):
+    """
+    Function that creates an EntryCache object from the arguments added by add_cache_arguments(), or opens the local
+    store if the entries come from there.
+    :param args:
+    Argument parser object with the arguments 'cache', 'cache_ttl', 'cache_size', 'offline', 'source' and 'store'.
+    :return:
+    EntryCache object, LocalStore object or None if the cache is disabled.
+    """
+    if args.source == "local":
+        return LocalStore(args.store)
+    if not args.cache:
+        if args.offline:
+            sys.exit("Offline mode requires a cache, quitting.")
+        return None
+
+    return EntryCache(args.cache,
+                      ttl=args.cache_ttl * 86400 if args.cache_ttl else None,
+                      max_size=int(args.cache_size * 1024 * 1024) if args.cache_size else None,
+                      offline=args.offline)
+
+
+def journal_ttl(args):
+    """
+    Function that gives the number of seconds the rows of a fetch journal (see checkpoint.FetchJournal) stay valid,
+    the same as the entries of the cache, so the journal does not keep data the cache would fetch again.
+    :param args:
+    Argument parser object with the arguments 'cache_ttl', 'offline' and 'source'.
+    :return:
+    number of seconds, or None if the rows never expire: without a TTL, offline and with the local store, where
+    nothing newer can be fetched.
+    """
+    if not args.cache_ttl or args.offline or args.source == "local":
+        return None
+    return args.cache_ttl * 86400
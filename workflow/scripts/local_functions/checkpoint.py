@@ -0,0 +1,173 @@
+import csv
+import hashlib
+import itertools
+import os
+import sys
+import time
+
+from local_functions.organisms import DEFAULT_ORGANISM, organism_getter
+
+
+class FetchJournal:
+    """
+    Checkpoint journal for the fetch scripts. The columns a fetch stage appends to every completed row are written to
+    '<output>.journal' as soon as the row is produced, under a fingerprint of the input columns the stage depends on
+    (the ID and e.g. the UniProt ID). A run that is interrupted (e.g. by a dropped connection) resumes where it
+    stopped, and because the journal is kept after a run completes, the next run (e.g. after genes were added to the
+    input) only fetches the genes whose fingerprint is not in the journal yet. Every row is journaled with the time it
+    was fetched, rows older than the TTL are fetched again like the entries of the cache. Rows whose data could not be
+    retrieved are not journaled, their IDs are written to '<output>.failed' instead so they are retried on the next
+    run.
+    """
+
+    def __init__(self, out_path, key_columns=None, refresh=False, organism=None, ttl=None):
+        """
+        :param out_path:
+        text or byte string giving the name (and path) of the output file of the fetch script.
+        :param key_columns:
+        list of the names of the input columns the fetched data depends on, defaults to the first column (the ID).
+        :param refresh:
+        boolean, if True the rows in the journal are not reused and all data is fetched again.
+        :param organism:
+        string giving the KEGG organism code of the genes without an 'organism' column in the input, which is then
+        part of the fingerprint as well, or None if the fetched data does not depend on the organism.
+        :param ttl:
+        number of seconds a journaled row stays valid, None means rows never expire (see cache.journal_ttl()).
+        """
+        self.journal_path = "{0}.journal".format(out_path)
+        self.retry_path = "{0}.failed".format(out_path)
+        self.key_columns = key_columns
+        self.refresh = refresh
+        self.organism = organism
+        self.ttl = ttl
+        self.failures = set()
+        self.resumed = 0
+
+    def resume(self, rows, stage):
+        """
+        Function that runs a fetch stage on the rows whose fingerprint is not in the journal yet and merges its output
+        with the journaled columns of the other rows, keeping the order of the input. Once all rows are produced the
+        journal is compacted to the fingerprints of the current input.
+        :param rows:
+        iterator yielding the header row followed by the other rows of the input file (see read_rows()).
+        :param stage:
+        function that takes an iterator of rows (header first) and returns a generator of enriched rows (header
+        first), which consist of the input columns followed by the columns added by the stage. IDs of rows it fails to
+        retrieve data for must be added to the failures set before the row is yielded.
+        :return:
+        generator yielding the header row followed by the enriched rows.
+        """
+        header = next(rows)
+        input_width = len(header)
+        try:
+            key_indices = [header.index(column) for column in self.key_columns] if self.key_columns else [0]
+        except ValueError:
+            sys.exit("The file does not contain the columns {0}, quitting.".format(", ".join(self.key_columns)))
+        if self.organism is not None:
+            organism_of = organism_getter(header, self.organism)
+            key = lambda row: fingerprint(row, key_indices, organism_of(row))
+        else:
+            key = lambda row: fingerprint(row, key_indices)
+        completed = {}
+        seen = set()
+
+        stage_rows, input_rows = itertools.tee(rows)
+        pending = (row for row in stage_rows if key(row) not in completed)
+        output = stage(itertools.chain([list(header)], pending))
+
+        output_header = next(output)
+        journal_header = ["fingerprint", "fetched"] + output_header[input_width:]
+        if not self.refresh:
+            completed.update(self._load(journal_header))
+        self.resumed = 0
+
+        with open(self.journal_path, mode="a" if completed else "w", buffering=1) as file:
+            journal = csv.writer(file, dialect="excel", delimiter="\t")
+            if not completed:
+                journal.writerow(journal_header)
+            yield output_header
+
+            for row in input_rows:
+                row_key = key(row)
+                seen.add(row_key)
+                if row_key in completed:
+                    self.resumed += 1
+                    yield row[:input_width] + completed[row_key]
+                    continue
+                row = next(output)
+                if row[0] not in self.failures:
+                    journal.writerow([row_key, "{0:.0f}".format(time.time())] + row[input_width:])
+                yield row
+
+        self._compact(journal_header, seen)
+        if self.failures:
+            with open(self.retry_path, mode="w") as file:
+                file.writelines("{0}\n".format(kegg_id) for kegg_id in sorted(self.failures))
+            print("The data of {0} genes could not be retrieved, their IDs are listed in {1}.".format(
+                len(self.failures), self.retry_path), file=sys.stderr)
+        elif os.path.exists(self.retry_path):
+            os.remove(self.retry_path)
+
+    def _load(self, journal_header):
+        try:
+            with open(self.journal_path, mode="r") as file:
+                journal = csv.reader(file, dialect="excel", delimiter="\t")
+                if next(journal, None) != journal_header:
+                    return {}
+                # Journals are appended to, so a row that was fetched again comes after the expired one.
+                oldest = time.time() - self.ttl if self.ttl is not None else None
+                completed = {}
+                for row in journal:
+                    if len(row) != len(journal_header):
+                        continue
+                    if oldest is None or float(row[1]) >= oldest:
+                        completed[row[0]] = row[2:]
+                    else:
+                        completed.pop(row[0], None)
+                return completed
+        except OSError:
+            return {}
+
+    def _compact(self, journal_header, seen):
+        # Rewrites the journal without the rows of genes that are no longer in the input (and without duplicates, of
+        # which the last row is the most recent), so it does not keep growing with every run.
+        compact_path = "{0}.tmp".format(self.journal_path)
+        with open(self.journal_path, mode="r") as file, open(compact_path, mode="w") as compact_file:
+            journal = csv.reader(file, dialect="excel", delimiter="\t")
+            compact = csv.writer(compact_file, dialect="excel", delimiter="\t")
+            compact.writerow(next(journal))
+            compact.writerows({row[0]: row for row in journal
+                               if row[0] in seen and len(row) == len(journal_header)}.values())
+        os.replace(compact_path, self.journal_path)
+
+
+def fingerprint(row, key_indices, organism=None):
+    """
+    Function that calculates the fingerprint of a row from the columns a stage depends on.
+    :param row:
+    list of strings representing a row of the input file.
+    :param key_indices:
+    list of the indices of the columns the fingerprint is calculated from.
+    :param organism:
+    string giving the KEGG organism code of the gene, or None. The default organism is left out, so journals written
+    before organisms could be chosen stay valid.
+    :return:
+    string giving the hexadecimal SHA-256 digest of the columns.
+    """
+    values = [row[index] for index in key_indices]
+    if organism is not None and organism != DEFAULT_ORGANISM:
+        values.append(organism)
+    return hashlib.sha256("\t".join(values).encode("utf-8")).hexdigest()
+
+
+def add_journal_arguments(parser):
+    """
+    Function that adds the commandline argument that disables reusing the rows of a previous run to an argument
+    parser.
+    :param parser:
+    argparse.ArgumentParser object.
+    :return:
+    """
+    parser.add_argument("--refresh",
+                        action="store_true",
+                        help="fetch the data of all genes again instead of reusing the results of previous runs.")
@@ -0,0 +1,102 @@
+import os
+import threading
+
+import requests
+from bioservices import KEGG, UniProt
+from bioservices.kegg import KEGGParser
+
+# Maximum number of connections kept open per host, at least the number of requests sent concurrently (--workers).
+POOL_SIZE = 16
+
+# Clients of the current process, created on first use (see shared()).
+_clients = {}
+# Reentrant, as creating a client also gets the shared session.
+_lock = threading.RLock()
+
+
+def shared(name, create):
+    """
+    Function that returns the client of the current process stored under a name, creating it on first use. Creating
+    a bioservices client connects to the database, so every script (and every thread of a script) uses the same one.
+    :param name:
+    string giving the name of the client.
+    :param create:
+    function without arguments that creates the client.
+    :return:
+    the client.
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = create()
+    return client
+
+
+def http_session():
+    """
+    Function that returns the HTTP session shared by the KEGG and UniProt clients. Its connections are kept alive
+    between requests, up to POOL_SIZE per host, and responses are compressed with gzip.
+    :return:
+    requests.Session object.
+    """
+    return shared("session", _create_session)
+
+
+def kegg_client(offline=False):
+    """
+    Function that returns the KEGG client, pointed at the URL in the KEGG_URL environment variable if it is set (e.g.
+    a local mock server). Creating a KEGG object checks whether the database can be reached, so offline only the
+    parser of the client is returned, which parses the entries from the cache or local store without any requests.
+    :param offline:
+    boolean, if True a parser is returned instead of a client.
+    :return:
+    bioservices KEGG object, or KEGGParser object if offline.
+    """
+    if offline:
+        return shared("kegg_parser", KEGGParser)
+    return shared("kegg", _create_kegg)
+
+
+def uniprot_client():
+    """
+    Function that returns the UniProt client, pointed at the URL in the UNIPROT_URL environment variable if it is set
+    (e.g. a local mock server).
+    :return:
+    bioservices UniProt object.
+    """
+    return shared("uniprot", _create_uniprot)
+
+
+def _create_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+    return session
+
+
+def _create_kegg():
+    kegg = KEGG()
+    if os.environ.get("KEGG_URL"):
+        kegg.url = os.environ["KEGG_URL"]
+    _use_shared_session(kegg)
+    return kegg
+
+
+def _create_uniprot():
+    uniprot = UniProt()
+    if os.environ.get("UNIPROT_URL"):
+        uniprot.services.url = os.environ["UNIPROT_URL"]
+    _use_shared_session(uniprot.services)
+    return uniprot
+
+
+def _use_shared_session(service):
+    # bioservices creates a session per client on first use, which the shared session takes the place of.
+    service._session = http_session()
+    # Requests are rate limited per database by fetching.rate_limited(), the limit of bioservices itself is not
+    # thread-safe and would also apply to a mock server.
+    service.requests_per_sec = float("inf")
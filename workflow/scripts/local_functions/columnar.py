@@ -0,0 +1,198 @@
+import sys
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from local_functions.metrics import record_written
+
+# Formats the scripts can write their output in, the format of an input file is detected from its contents.
+FORMATS = ("tsv", "parquet")
+
+# Number of rows per row group of a Parquet file, which is also the number of rows held in memory while reading or
+# writing one.
+PARQUET_BATCH_SIZE = 10000
+
+# Columns that are not stored as strings. The list columns hold the values that are separated by semicolons in tsv
+# files, so the rows read from a Parquet file are the same as the rows read from the equivalent tsv file.
+COLUMN_TYPES = {"pathways": "str_list",
+                "PubMed_ID": "str_list",
+                "PubMed_ID_count": "int",
+                "gc_content": "int",
+                "gc_content_subsections": "int_list",
+                "gc_skew": "float",
+                "gc_skew_subsections": "float_list",
+                "n_content": "int",
+                "n_content_subsections": "int_list"}
+
+# Columns holding sequences, which are nearly all unique so dictionary encoding only costs space.
+SEQUENCE_COLUMNS = {"nt_seq", "aa_seq"}
+
+_ENCODERS = {"str": str,
+             "int": int,
+             "float": float,
+             "str_list": lambda value: value.split(";"),
+             "int_list": lambda value: [int(item) for item in value.split(";")],
+             "float_list": lambda value: [float(item) for item in value.split(";")]}
+
+
+def require_pyarrow():
+    """
+    Function that quits with a message if pyarrow, which is needed to read and write Parquet files, is not installed.
+    :return:
+    """
+    if pa is None:
+        sys.exit("Reading and writing Parquet files requires pyarrow, install it with 'pip install pyarrow'.")
+
+
+def is_parquet(data_path):
+    """
+    Function that checks whether a file is a Parquet file by looking at its first bytes.
+    :param data_path:
+    text or byte string giving the name (and path) of the file.
+    :return:
+    boolean, True if the file is a Parquet file.
+    """
+    try:
+        with open(data_path, mode="rb") as file:
+            return file.read(4) == b"PAR1"
+    except OSError:
+        return False
+
+
+def _arrow_type(column):
+    kind = COLUMN_TYPES.get(column, "str")
+    item_type = {"str": pa.string(), "int": pa.int64(), "float": pa.float64()}[kind.replace("_list", "")]
+    return pa.list_(item_type) if kind.endswith("_list") else item_type
+
+
+def encode_column(column, values):
+    """
+    Function that converts the cells of a column as they appear in a tsv file to the values stored in a Parquet file.
+    Empty cells are stored as missing values, except in string columns.
+    :param column:
+    string giving the name of the column.
+    :param values:
+    list of cells (strings or numbers).
+    :return:
+    list of values matching the type of the column (see COLUMN_TYPES).
+    """
+    kind = COLUMN_TYPES.get(column, "str")
+    if kind == "str":
+        return [str(value) for value in values]
+    encode = _ENCODERS[kind]
+    return [None if value == "" else encode(value) for value in values]
+
+
+def decode_column(column, values):
+    """
+    Function that converts the values of a column read from a Parquet file back to the cells of a tsv file.
+    :param column:
+    string giving the name of the column.
+    :param values:
+    list of values as returned by pyarrow.
+    :return:
+    list of strings.
+    """
+    kind = COLUMN_TYPES.get(column, "str")
+    if kind == "str":
+        return ["" if value is None else value for value in values]
+    if kind.endswith("_list"):
+        return ["" if value is None else ";".join(map(str, value)) for value in values]
+    return ["" if value is None else str(value) for value in values]
+
+
+def read_parquet_rows(data_path, columns=None):
+    """
+    Function that reads a Parquet file one row group at a time and yields its rows like a tsv file would be read.
+    :param data_path:
+    text or byte string giving the name (and path) of the Parquet file.
+    :param columns:
+    list of the names of the columns to read, or None to read all columns. Columns that are not read are not decoded
+    either.
+    :return:
+    generator yielding the header row followed by the other rows as lists of strings.
+    """
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(data_path)
+    columns = list(columns or parquet_file.schema_arrow.names)
+    yield list(columns)
+    for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_SIZE, columns=columns):
+        cells = [decode_column(column, batch.column(index).to_pylist()) for index, column in enumerate(columns)]
+        for row in zip(*cells):
+            yield list(row)
+
+
+def parquet_row_count(data_path):
+    """
+    Function that returns the number of rows (excluding the header) of a Parquet file from its metadata.
+    :param data_path:
+    text or byte string giving the name (and path) of the Parquet file.
+    :return:
+    integer representing the number of rows.
+    """
+    require_pyarrow()
+    return pq.ParquetFile(data_path).metadata.num_rows
+
+
+class ParquetRowWriter:
+    """
+    Writer with the same interface as RowWriter that writes rows to a Parquet file. Rows are collected until a row
+    group is full, the columns are then converted to their types (see COLUMN_TYPES) and written with zstd compression.
+    """
+
+    def __init__(self, out_path):
+        """
+        :param out_path:
+        text or byte string giving the name (and path) of the file that should be written to.
+        """
+        require_pyarrow()
+        self.out_path = out_path
+        # The first row written is the header, which is not counted.
+        self.row_count = -1
+        self._header = None
+        self._schema = None
+        self._rows = []
+        self._writer = None
+        self._seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(write_sidecar=exc_type is None)
+
+    def writerow(self, row):
+        if self._header is None:
+            self._header = list(row)
+            self._schema = pa.schema([(column, _arrow_type(column)) for column in self._header])
+        else:
+            self._rows.append(row)
+            if len(self._rows) >= PARQUET_BATCH_SIZE:
+                self._flush()
+        self.row_count += 1
+
+    def _flush(self):
+        start = time.perf_counter()
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.out_path, self._schema, compression="zstd",
+                                            use_dictionary=[column for column in self._header
+                                                            if column not in SEQUENCE_COLUMNS])
+        columns = [encode_column(column, list(values)) for column, values in zip(self._header, zip(*self._rows))]
+        if not self._rows:
+            columns = [[] for column in self._header]
+        self._writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, self._schema)], schema=self._schema))
+        self._rows = []
+        self._seconds += time.perf_counter() - start
+
+    def close(self, write_sidecar=True):
+        # The number of rows is stored in the metadata of the file, so no sidecar is needed.
+        if self._header is not None and (self._rows or self._writer is None):
+            self._flush()
+        if self._writer is not None:
+            self._writer.close()
+        record_written(self.out_path, self.row_count, self._seconds)
@@ -0,0 +1,90 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+
+def incidence_matrix(rows, max_genes=0):
+    """
+    Function that builds a sparse gene x PubMed incidence matrix, where a cell is 1 if the gene is associated with the
+    article.
+    :param rows:
+    iterable of rows consisting of a KEGG ID and the semicolon separated PubMed IDs of the gene.
+    :param max_genes:
+    integer, articles associated with more genes than this (e.g. genome papers) are left out. 0 keeps all articles.
+    :return:
+    scipy.sparse CSR matrix of int32 with a row per gene and a column per article, a list of the KEGG IDs of the rows
+    and a list of the PubMed IDs of the columns.
+    """
+    kegg_ids = []
+    pubmed_index = {}
+    gene_indices = []
+    article_indices = []
+    for kegg_id, pubmed_ids in rows:
+        gene = len(kegg_ids)
+        kegg_ids.append(kegg_id)
+        for pubmed_id in pubmed_ids.split(";") if pubmed_ids else ():
+            gene_indices.append(gene)
+            article_indices.append(pubmed_index.setdefault(pubmed_id, len(pubmed_index)))
+
+    data = np.ones(len(gene_indices), dtype=np.int32)
+    matrix = sparse.csr_matrix((data, (gene_indices, article_indices)), shape=(len(kegg_ids), len(pubmed_index)))
+    # A PubMed ID listed twice for the same gene is counted once.
+    matrix.data = np.minimum(matrix.data, 1)
+
+    pubmed_ids = list(pubmed_index)
+    if max_genes:
+        keep = np.flatnonzero(np.asarray(matrix.sum(axis=0)).ravel() <= max_genes)
+        matrix = matrix[:, keep]
+        pubmed_ids = [pubmed_ids[index] for index in keep]
+    return matrix.tocsr(), kegg_ids, pubmed_ids
+
+
+def gene_pairs(matrix, min_shared=1, min_jaccard=0.0):
+    """
+    Function that calculates the number of shared articles and the Jaccard similarity (shared articles divided by the
+    articles of either gene) of every pair of genes that share at least one article, using the sparse product of the
+    incidence matrix with its transpose.
+    :param matrix:
+    scipy.sparse CSR gene x PubMed incidence matrix (see incidence_matrix()).
+    :param min_shared:
+    integer representing the minimum number of shared articles of a pair.
+    :param min_jaccard:
+    float representing the minimum Jaccard similarity of a pair.
+    :return:
+    numpy arrays with the row indices of the first and second gene, the number of shared articles and the Jaccard
+    similarity of every pair, sorted by descending similarity and number of shared articles.
+    """
+    articles = np.asarray(matrix.sum(axis=1)).ravel()
+    shared = sparse.triu(matrix @ matrix.T, k=1).tocoo()
+    first, second, counts = shared.row, shared.col, shared.data
+
+    keep = counts >= max(min_shared, 1)
+    first, second, counts = first[keep], second[keep], counts[keep]
+    jaccard = counts / (articles[first] + articles[second] - counts)
+
+    keep = jaccard >= min_jaccard
+    first, second, counts, jaccard = first[keep], second[keep], counts[keep], jaccard[keep]
+    order = np.lexsort((second, first, -counts, -jaccard))
+    return first[order], second[order], counts[order], jaccard[order]
+
+
+def gene_clusters(gene_count, first, second):
+    """
+    Function that groups genes in clusters of genes that are connected by a chain of gene pairs.
+    :param gene_count:
+    integer representing the number of genes.
+    :param first:
+    numpy array with the index of the first gene of every pair.
+    :param second:
+    numpy array with the index of the second gene of every pair.
+    :return:
+    list of numpy arrays with the indices of the genes of every cluster of two or more genes, from the largest to the
+    smallest cluster.
+    """
+    graph = sparse.coo_matrix((np.ones(len(first), dtype=np.int8), (first, second)), shape=(gene_count, gene_count))
+    cluster_count, labels = connected_components(graph, directed=False)
+    sizes = np.bincount(labels, minlength=cluster_count)
+    genes = np.argsort(labels, kind="stable")
+    members = np.split(genes, np.cumsum(sizes)[:-1])
+    # Sorted by descending size, clusters of the same size keep the order of their first gene.
+    return sorted((cluster for cluster in members if len(cluster) > 1), key=len, reverse=True)
@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+from scipy import sparse, stats
+
+from local_functions.cooccurrence import incidence_matrix
+from local_functions.expression import benjamini_hochberg
+
+
+class PathwayIndex:
+    """
+    Inverted index of the KEGG pathways of the genes, a sparse boolean gene x pathway matrix. The index is built once
+    from the 'pathways' column of a tabular file and saved next to it (see open_pathway_index()), so the enrichment of
+    new gene sets is tested without reading and splitting the pathways of every gene again.
+    """
+
+    def __init__(self, matrix, kegg_ids, pathways):
+        """
+        :param matrix:
+        scipy.sparse matrix with a row per gene and a column per pathway, nonzero if the gene is part of the pathway.
+        :param kegg_ids:
+        list of strings giving the KEGG IDs of the rows.
+        :param pathways:
+        list of strings giving the pathways of the columns (e.g. 'lpl00010: Glycolysis / Gluconeogenesis').
+        """
+        self.matrix = sparse.csr_matrix(matrix, dtype=bool)
+        self.kegg_ids = list(kegg_ids)
+        self.pathways = list(pathways)
+        self._rows = {kegg_id: row for row, kegg_id in enumerate(self.kegg_ids)}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Function that builds the index from the pathways of the genes.
+        :param rows:
+        iterable of rows consisting of a KEGG ID and the semicolon separated pathways of the gene.
+        :return:
+        PathwayIndex object.
+        """
+        return cls(*incidence_matrix(rows))
+
+    def save(self, index_path, stamp=()):
+        """
+        Function that writes the index to a NumPy '.npz' file, which replaces the previous file only once complete.
+        :param index_path:
+        text or byte string giving the name (and path) of the file.
+        :param stamp:
+        tuple of integers identifying the version of the file the index was built from (see source_stamp()).
+        :return:
+        """
+        with open(index_path + ".tmp", mode="wb") as file:
+            np.savez(file, indptr=self.matrix.indptr, indices=self.matrix.indices, shape=self.matrix.shape,
+                     kegg_ids=np.array(self.kegg_ids, dtype=str), pathways=np.array(self.pathways, dtype=str),
+                     stamp=np.array(stamp, dtype=np.int64))
+        os.replace(index_path + ".tmp", index_path)
+
+    @classmethod
+    def load(cls, index_path, stamp=None):
+        """
+        Function that reads an index written by save().
+        :param index_path:
+        text or byte string giving the name (and path) of the file.
+        :param stamp:
+        tuple of integers identifying the current version of the file the index was built from, or None to accept any
+        index.
+        :return:
+        PathwayIndex object, or None if there is no index or it was built from another version of the file.
+        """
+        try:
+            with np.load(index_path, allow_pickle=False) as data:
+                if stamp is not None and tuple(data["stamp"].tolist()) != tuple(stamp):
+                    return None
+                matrix = sparse.csr_matrix((np.ones(len(data["indices"]), dtype=bool), data["indices"], data["indptr"]),
+                                           shape=tuple(data["shape"]))
+                return cls(matrix, data["kegg_ids"].tolist(), data["pathways"].tolist())
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def gene_set_matrix(self, gene_sets):
+        """
+        Function that converts gene sets to a sparse gene set x gene matrix over the genes of the index. Genes that are
+        not in the index, or have no pathways, are left out.
+        :param gene_sets:
+        list of iterables of KEGG IDs.
+        :return:
+        scipy.sparse CSR matrix of int64 with a row per gene set and a column per gene of the index.
+        """
+        annotated = np.diff(self.matrix.indptr) > 0
+        set_indices = []
+        gene_indices = []
+        for number, kegg_ids in enumerate(gene_sets):
+            rows = {self._rows[kegg_id] for kegg_id in kegg_ids if kegg_id in self._rows}
+            rows = [row for row in rows if annotated[row]]
+            set_indices.extend([number] * len(rows))
+            gene_indices.extend(rows)
+        return sparse.csr_matrix((np.ones(len(gene_indices), dtype=np.int64), (set_indices, gene_indices)),
+                                 shape=(len(gene_sets), len(self.kegg_ids)))
+
+    def enrichment(self, gene_sets):
+        """
+        Function that tests the over-representation of every pathway in every gene set at once, with a one-sided
+        Fisher's exact (hypergeometric) test. The universe is the genes of the index with at least one pathway. The
+        overlaps of all gene sets with all pathways are a single sparse matrix product and only the pairs that overlap
+        are tested, the p-values of every gene set are adjusted for the number of pathways with the Benjamini-Hochberg
+        procedure.
+        :param gene_sets:
+        list of iterables of KEGG IDs.
+        :return:
+        dictionary of numpy arrays with a value per gene set and pathway pair that overlaps: the index of the gene set
+        ('gene_set') and pathway ('pathway'), the size of the gene set ('set_size') and pathway ('pathway_size'), the
+        number of genes in both ('overlap'), the fold enrichment over the expected overlap ('fold_enrichment') and the
+        p-value ('p_value') and q-value ('q_value'), sorted by gene set and p-value.
+        """
+        selection = self.gene_set_matrix(gene_sets)
+        universe = int((np.diff(self.matrix.indptr) > 0).sum())
+        pathway_sizes = np.asarray(self.matrix.sum(axis=0)).ravel()
+        set_sizes = np.asarray(selection.sum(axis=1)).ravel()
+
+        overlaps = (selection @ self.matrix.astype(np.int64)).tocoo()
+        gene_set, pathway, overlap = overlaps.row, overlaps.col, overlaps.data
+        p_values = stats.hypergeom.sf(overlap - 1, universe, pathway_sizes[pathway], set_sizes[gene_set])
+        q_values = benjamini_hochberg(p_values, gene_set, len(self.pathways))
+        order = np.lexsort((p_values, gene_set))
+        expected = set_sizes[gene_set] * pathway_sizes[pathway] / max(universe, 1)
+        return {"gene_set": gene_set[order],
+                "pathway": pathway[order],
+                "set_size": set_sizes[gene_set][order],
+                "pathway_size": pathway_sizes[pathway][order],
+                "overlap": overlap[order],
+                "fold_enrichment": (overlap / expected)[order],
+                "p_value": p_values[order],
+                "q_value": q_values[order]}
+
+
+def source_stamp(data_path):
+    """
+    Function that identifies the version of a file by its size and modification time.
+    :param data_path:
+    text or byte string giving the name (and path) of the file.
+    :return:
+    tuple of integers, empty if the file does not exist.
+    """
+    try:
+        status = os.stat(data_path)
+    except OSError:
+        return ()
+    return status.st_size, status.st_mtime_ns
+
+
+def open_pathway_index(index_path, data_path, read_pathways):
+    """
+    Function that loads the pathway index of a file, or builds and saves it if there is no index or the file has
+    changed since it was built. If the file no longer exists an existing index is used as is.
+    :param index_path:
+    text or byte string giving the name (and path) of the index file.
+    :param data_path:
+    text or byte string giving the name (and path) of the tabular file with the pathways of the genes.
+    :param read_pathways:
+    function that takes data_path and returns an iterable of rows consisting of a KEGG ID and the semicolon separated
+    pathways of the gene.
+    :return:
+    PathwayIndex object and a boolean, True if the index was loaded from index_path.
+    """
+    stamp = source_stamp(data_path)
+    index = PathwayIndex.load(index_path, stamp or None)
+    if index is not None:
+        return index, True
+    index = PathwayIndex.from_rows(read_pathways(data_path))
+    directory = os.path.dirname(index_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    index.save(index_path, stamp)
+    return index, False
@@ -0,0 +1,182 @@
+import re
+
+import numpy as np
+from scipy import special, stats
+
+# Count columns are named '{strain}.{condition}.{replicate}', e.g. WCFS1.glc.1, the condition of a sample is its name
+# without the replicate number.
+SAMPLE_PATTERN = re.compile(r"^(.+)\.\d+$")
+
+
+def sample_columns(header):
+    """
+    Function that finds the columns with the RNA-Seq counts of the samples in a header row.
+    :param header:
+    list of strings giving the names of the columns.
+    :return:
+    list of strings giving the names of the count columns, in the order of the header.
+    """
+    return [column for column in header if SAMPLE_PATTERN.match(column)]
+
+
+def condition_groups(samples):
+    """
+    Function that assigns the samples to their conditions.
+    :param samples:
+    list of strings giving the names of the samples (see SAMPLE_PATTERN).
+    :return:
+    list of strings giving the names of the conditions in order of appearance and a numpy array with the index of the
+    condition of every sample.
+    """
+    conditions = {}
+    groups = [conditions.setdefault(SAMPLE_PATTERN.match(sample).group(1), len(conditions)) for sample in samples]
+    return list(conditions), np.array(groups, dtype=np.intp)
+
+
+def to_matrix(cells, missing=0.0):
+    """
+    Function that converts the cells of a table to a contiguous numpy array of floats in a single conversion.
+    :param cells:
+    list of rows, each a list of strings with the same number of cells.
+    :param missing:
+    float used for the empty cells, e.g. 0 for counts and NaN for other values.
+    :return:
+    C-contiguous 2-dimensional numpy array of float64, with a row per row of cells.
+    """
+    text = np.array(cells, dtype=str).reshape(len(cells), -1)
+    text[text == ""] = str(missing)
+    return np.ascontiguousarray(text.astype(np.float64))
+
+
+def cpm(counts):
+    """
+    Function that normalises counts to counts per million reads of their sample (library size normalisation).
+    :param counts:
+    2-dimensional numpy array with a row per gene and a column per sample.
+    :return:
+    numpy array of float64 with the same shape as counts. Samples without reads are 0.
+    """
+    library_sizes = counts.sum(axis=0, dtype=np.float64)
+    return np.divide(counts * 1e6, library_sizes, out=np.zeros(counts.shape), where=library_sizes > 0)
+
+
+def tpm(counts, lengths):
+    """
+    Function that normalises counts to transcripts per million: the counts are divided by the length of their gene
+    and then scaled to a million per sample, so the values of genes of different lengths can be compared.
+    :param counts:
+    2-dimensional numpy array with a row per gene and a column per sample.
+    :param lengths:
+    numpy array with the length in nucleotides of every gene, 0 or NaN if it is not known.
+    :return:
+    numpy array of float64 with the same shape as counts. Genes without a length are NaN and are left out of the
+    scaling.
+    """
+    known = np.isfinite(lengths) & (lengths > 0)
+    rates = np.full(counts.shape, np.nan)
+    rates[known] = counts[known] / lengths[known, np.newaxis]
+    totals = rates[known].sum(axis=0)
+    return np.divide(rates * 1e6, totals, out=np.full(counts.shape, np.nan), where=(totals > 0) & known[:, np.newaxis])
+
+
+def group_means(values, groups, group_count):
+    """
+    Function that averages the samples of every condition, as a single product with the sample x condition design
+    matrix.
+    :param values:
+    2-dimensional numpy array with a row per gene and a column per sample.
+    :param groups:
+    numpy array with the index of the condition of every sample.
+    :param group_count:
+    integer representing the number of conditions.
+    :return:
+    numpy array of float64 with a row per gene and a column per condition.
+    """
+    design = (groups[:, np.newaxis] == np.arange(group_count)).astype(np.float64)
+    return values @ (design / design.sum(axis=0))
+
+
+def anova(values, groups, group_count):
+    """
+    Function that tests for every gene whether its mean differs between the conditions, with a one-way ANOVA over
+    the samples of all genes at once.
+    :param values:
+    2-dimensional numpy array with a row per gene and a column per sample, e.g. log2 CPM values.
+    :param groups:
+    numpy array with the index of the condition of every sample.
+    :param group_count:
+    integer representing the number of conditions.
+    :return:
+    numpy array with the p-value of every gene, NaN if there are not more samples than conditions or all samples of
+    the gene have the same value.
+    """
+    sample_count = values.shape[1]
+    if group_count < 2 or sample_count <= group_count:
+        return np.full(values.shape[0], np.nan)
+    sizes = np.bincount(groups, minlength=group_count)
+    means = group_means(values, groups, group_count)
+    grand_means = values.mean(axis=1, keepdims=True)
+    between = ((means - grand_means) ** 2 * sizes).sum(axis=1) / (group_count - 1)
+    within = ((values - means[:, groups]) ** 2).sum(axis=1) / (sample_count - group_count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f_values = between / within
+    p_values = special.fdtrc(group_count - 1, sample_count - group_count, f_values)
+    # Identical replicates with different condition means are as significant as it gets.
+    p_values[(within == 0) & (between > 0)] = 0.0
+    return p_values
+
+
+def benjamini_hochberg(p_values, groups=None, test_count=None):
+    """
+    Function that adjusts p-values for multiple testing with the Benjamini-Hochberg procedure (false discovery rate).
+    :param p_values:
+    numpy array of p-values, NaN values are left out of the adjustment.
+    :param groups:
+    numpy array with a non-negative integer per p-value giving the family of tests it belongs to, the p-values of
+    every family are adjusted separately. None adjusts all p-values together.
+    :param test_count:
+    integer representing the number of tests per family, including tests that are not in p_values because their
+    p-value is 1 (e.g. gene sets that do not overlap a pathway), or None for the number of p-values of the family.
+    :return:
+    numpy array with the adjusted p-values (q-values) in the same order, NaN where the p-value is NaN.
+    """
+    q_values = np.full(p_values.shape, np.nan)
+    tested = np.flatnonzero(np.isfinite(p_values))
+    if not len(tested):
+        return q_values
+    groups = np.zeros(len(p_values), dtype=np.intp) if groups is None else groups
+    order = tested[np.lexsort((p_values[tested], groups[tested]))]
+    ordered_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, ordered_groups[1:] != ordered_groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    ranks = np.arange(1, len(order) + 1) - np.repeat(starts, sizes)
+    counts = np.repeat(sizes, sizes) if test_count is None else test_count
+    ranked = np.minimum(p_values[order] * counts / ranks, 1.0)
+    # The running minimum from the largest p-value down must not carry over into the previous family, so every family
+    # is lifted above all values of the families before it and lowered again afterwards.
+    lift = 2.0 * np.repeat(np.arange(len(starts)), sizes)
+    q_values[order] = np.minimum.accumulate((ranked + lift)[::-1])[::-1] - lift
+    return q_values
+
+
+def spearman(values, other):
+    """
+    Function that calculates the Spearman rank correlation of every column of values with another variable, leaving
+    out the genes where the other variable is missing.
+    :param values:
+    2-dimensional numpy array with a row per gene and a column per variable.
+    :param other:
+    numpy array with a value per gene, NaN if it is missing.
+    :return:
+    numpy array with the correlation coefficient of every column and the number of genes it is based on.
+    """
+    known = np.isfinite(other)
+    if known.sum() < 3:
+        return np.full(values.shape[1], np.nan), int(known.sum())
+    ranks = stats.rankdata(values[known], axis=0)
+    other_ranks = stats.rankdata(other[known])
+    ranks -= ranks.mean(axis=0)
+    other_ranks -= other_ranks.mean()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = other_ranks @ ranks / np.sqrt((ranks ** 2).sum(axis=0) * (other_ranks ** 2).sum())
+    return rho, int(known.sum())
@@ -0,0 +1,291 @@
+import fcntl
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from local_functions.metrics import metrics
+
+# HTTP status codes (as returned by bioservices on failed requests) after which a request is retried.
+RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+
+# Requests per second per host, KEGG asks users to stay at or below 3 requests per second.
+DEFAULT_RATES = {"kegg": 3.0, "uniprot": 10.0}
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class FetchError(Exception):
+    """
+    Raised when a request still fails after all retries.
+    """
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter. Tokens are added at a fixed rate up to the capacity of the bucket and every
+    request takes one token, waiting until one is available if the bucket is empty.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        :param rate:
+        number of tokens added per second.
+        :param capacity:
+        maximum number of tokens in the bucket, i.e. the number of requests that may be sent in a burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Function that takes a token from the bucket, waiting until one becomes available.
+        :return:
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimiter:
+    """
+    Rate limiter shared by all processes using the same file, e.g. the jobs of the workflow that run in parallel. The
+    file holds the time at which the next request may be sent. Every request reserves that time while holding a lock
+    on the file, moves it on by one interval and waits until the reserved time has come.
+    """
+
+    def __init__(self, path, rate):
+        """
+        :param path:
+        text or byte string giving the name (and path) of the file, it is created if it does not exist.
+        :param rate:
+        number of requests per second sent by all processes together.
+        """
+        self.path = path
+        self.rate = rate
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def acquire(self):
+        """
+        Function that reserves the next free time for a request, waiting until it has come.
+        :return:
+        """
+        with open(self.path, mode="a+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            file.seek(0)
+            now = time.time()
+            try:
+                reserved = max(now, float(file.read()))
+            except ValueError:
+                reserved = now
+            file.seek(0)
+            file.truncate()
+            file.write(repr(reserved + 1 / self.rate))
+        # Closing the file releases the lock, the other processes can reserve the times after this one while it waits.
+        wait = reserved - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+
+def set_rate_limit(host, rate, shared_path=None):
+    """
+    Function that sets the maximum number of requests per second sent to a host by all threads in this process, or by
+    all processes using the same shared_path.
+    :param host:
+    string giving the name of the host.
+    :param rate:
+    number of requests per second, 0 disables rate limiting for the host.
+    :param shared_path:
+    text or byte string giving the name (and path) of the file shared with the other processes (see
+    SharedRateLimiter), or None to only limit the requests of this process.
+    :return:
+    """
+    with _rate_limiters_lock:
+        if not rate:
+            _rate_limiters[host] = None
+        elif shared_path:
+            _rate_limiters[host] = SharedRateLimiter(shared_path, rate)
+        else:
+            _rate_limiters[host] = TokenBucket(rate)
+
+
+def rate_limited(host, function, *args, retries=5, backoff=1.0, **kwargs):
+    """
+    Function that calls a request function once a token for the host is available. Requests that fail with one of the
+    RETRY_STATUSES, a connection error or without a response (bioservices returns None on connection errors and
+    timeouts) are retried with exponential backoff, a FetchError is raised once the retries are exhausted. The time
+    spent waiting for the rate limiter and on every request, the bytes received and the number of retries and failures
+    are added to the metrics per host.
+    :param host:
+    string giving the name of the host the request is sent to.
+    :param function:
+    function that sends the request, e.g. KEGG().get.
+    :param args:
+    positional arguments passed to the function.
+    :param retries:
+    integer representing the maximum number of retries.
+    :param backoff:
+    number of seconds waited before the first retry, doubled for every following retry.
+    :param kwargs:
+    keyword arguments passed to the function.
+    :return:
+    the value returned by the function, never None.
+    """
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            rate = DEFAULT_RATES.get(host)
+            _rate_limiters[host] = TokenBucket(rate) if rate else None
+        rate_limiter = _rate_limiters[host]
+
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            with metrics.timer("wait.{0}".format(host)):
+                rate_limiter.acquire()
+        try:
+            with metrics.timer("request.{0}".format(host)):
+                result = function(*args, **kwargs)
+        except OSError as e:
+            error = e
+        else:
+            if result is None:
+                error = "no response"
+            elif not (isinstance(result, int) and result in RETRY_STATUSES):
+                if isinstance(result, (str, bytes)):
+                    metrics.count("bytes.{0}".format(host), len(result))
+                return result
+            else:
+                error = "status {0}".format(result)
+        if attempt < retries:
+            metrics.count("retries.{0}".format(host))
+            time.sleep(backoff * 2 ** attempt * random.uniform(1, 1.5))
+
+    metrics.count("failures.{0}".format(host))
+    raise FetchError("Request to {0} failed after {1} retries ({2}).".format(host, retries, error))
+
+
+def fetch_all(items, function, workers=1):
+    """
+    Function that applies a (network bound) function to every item using a bounded pool of threads. Results are
+    yielded as soon as they and all results before them are available, so the output order is the same as the input
+    order.
+    :param items:
+    iterable object, e.g. a csv reader or a generator of batches.
+    :param function:
+    function that takes a single item and returns its result.
+    :param workers:
+    integer representing the number of threads, 1 processes the items sequentially.
+    :return:
+    generator yielding tuples of an item and its result.
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, function(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(function, item)))
+            if len(pending) >= workers * 2:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+
+def run_ahead(iterable, size=1024):
+    """
+    Function that runs an iterable in a background thread, at most size items ahead of the consumer. Chaining the
+    generators of several fetch stages this way makes them work like the processes of a shell pipeline: a stage keeps
+    sending requests for the next rows while the stage after it waits for the responses of the rows it already got.
+    An exception raised by the iterable is raised again in the consumer.
+    :param iterable:
+    iterable object, e.g. the generator of a fetch stage. It is only iterated by the background thread.
+    :param size:
+    integer representing the number of items that are buffered.
+    :return:
+    generator yielding the items of the iterable in the same order.
+    """
+    items = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as error:
+            put((end, error))
+
+    thread = threading.Thread(target=produce, name="run-ahead", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Also when the consumer stops early, the producer then stops after its current item.
+        stopped.set()
+        thread.join()
+
+
+def add_fetch_arguments(parser, host, prefix=""):
+    """
+    Function that adds the commandline arguments used to configure concurrent fetching to an argument parser.
+    :param parser:
+    argparse.ArgumentParser object.
+    :param host:
+    string giving the name of the host the script sends its requests to ('kegg' or 'uniprot').
+    :param prefix:
+    string put in front of the names of the arguments (e.g. 'kegg-' for --kegg-workers), for scripts that send
+    requests to more than one host.
+    :return:
+    """
+    parser.add_argument("--{0}workers".format(prefix),
+                        type=int,
+                        required=False,
+                        default=4,
+                        help="number of requests that are sent concurrently.")
+    parser.add_argument("--{0}rate".format(prefix),
+                        type=float,
+                        required=False,
+                        default=DEFAULT_RATES[host],
+                        help="maximum number of requests per second, 0 disables the rate limit.")
+    parser.add_argument("--{0}rate-file".format(prefix),
+                        type=str,
+                        required=False,
+                        default=None,
+                        help="(absolute) path for a file through which the rate limit is shared with other scripts "
+                             "running at the same time, by default it only applies to this script.")
@@ -0,0 +1,233 @@
+import numpy as np
+
+from local_functions.genome import open_genome
+
+# Metrics that can be calculated for a sequence and the name of the columns they are written to.
+METRICS = {"gc": "gc_content", "skew": "gc_skew", "n": "n_content"}
+
+
+def _lookup(bases):
+    return bytes(1 if chr(code).lower() in bases else 0 for code in range(256))
+
+
+# Translation tables mapping every base to 1 if it belongs to the group and 0 otherwise. S (strong) is an ambiguous G
+# or C and counts towards the GC content, W (weak, A or T) and N (any base) do not.
+GC_BASES = _lookup("gcs")
+G_BASES = _lookup("g")
+C_BASES = _lookup("c")
+N_BASES = _lookup("n")
+
+
+def membership(seq, table):
+    """
+    Function that maps a nucleotide sequence to an array of unsigned 8-bit integers that are 1 for the bases belonging
+    to a group and 0 otherwise. The mapping is done with bytes.translate() so the sequence is only copied once.
+    :param seq:
+    string, bytes or buffer (e.g. a slice of a memory-mapped file) representing a nucleotide sequence.
+    :param table:
+    translation table (e.g. GC_BASES).
+    :return:
+    numpy array of uint8.
+    """
+    if isinstance(seq, str):
+        seq = seq.encode("ascii")
+    return np.frombuffer(bytes(seq).translate(table), dtype=np.uint8)
+
+
+def cumulative_counts(members):
+    """
+    Function that calculates the cumulative number of bases belonging to a group, with a leading 0 so the number of
+    bases in [start, end) is cumulative[end] - cumulative[start].
+    :param members:
+    numpy array of integers, e.g. the uint8 array returned by membership().
+    :return:
+    numpy array of integers with one element more than members.
+    """
+    cumulative = np.zeros(len(members) + 1, dtype=np.int64)
+    np.cumsum(members, out=cumulative[1:])
+    return cumulative
+
+
+def window_counts(members, window, step):
+    """
+    Function that counts the bases belonging to a group in every window of a sequence. If the window size is a
+    multiple of the step the sequence is first summed in blocks of step bases (by adding the columns of the sequence
+    reshaped to one block per row) and the windows are taken from the cumulative sum of the blocks, otherwise they are
+    taken from the cumulative sum of the whole sequence. Either way the cost does not depend on the window size.
+    :param members:
+    numpy array of uint8 (see membership()).
+    :param window:
+    integer representing the size of the windows.
+    :param step:
+    integer representing the distance between the starts of consecutive windows (step < window gives overlapping
+    windows).
+    :return:
+    numpy array of integers with the number of bases belonging to the group per window, windows that do not fit
+    entirely in the sequence are left out.
+    """
+    if len(members) < window:
+        return np.zeros(0, dtype=np.int32)
+
+    if window % step:
+        cumulative = cumulative_counts(members)
+        starts = np.arange(0, len(members) - window + 1, step)
+        return cumulative[starts + window] - cumulative[starts]
+
+    blocks = members[:len(members) // step * step].reshape(-1, step)
+    if step <= 64:
+        block_counts = blocks[:, 0].astype(np.int32)
+        for column in range(1, step):
+            block_counts += blocks[:, column]
+    else:
+        block_counts = blocks.sum(axis=1, dtype=np.int32)
+
+    blocks_per_window = window // step
+    if blocks_per_window == 1:
+        return block_counts
+    cumulative = cumulative_counts(block_counts)
+    return cumulative[blocks_per_window:] - cumulative[:-blocks_per_window]
+
+
+def percentage(counts, total):
+    """
+    Function that turns counts into percentages rounded to integers (rounding half to even, like round()).
+    :param counts:
+    integer or numpy array of integers.
+    :param total:
+    integer the counts are divided by.
+    :return:
+    integer or numpy array of integers.
+    """
+    return np.rint(counts / total * 100).astype(np.int64)
+
+
+def skew(g_counts, c_counts):
+    """
+    Function that calculates the GC skew (G - C) / (G + C), which is 0 where there are no G or C bases.
+    :param g_counts:
+    integer or numpy array of integers giving the number of G bases.
+    :param c_counts:
+    integer or numpy array of integers giving the number of C bases.
+    :return:
+    float or numpy array of floats rounded to three decimals.
+    """
+    g_counts = np.asarray(g_counts, dtype=np.float64)
+    c_counts = np.asarray(c_counts, dtype=np.float64)
+    total = g_counts + c_counts
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = np.where(total > 0, (g_counts - c_counts) / total, 0.0)
+    return np.round(result, 3)
+
+
+def gc_profile(seq, window=10, step=None, metrics=("gc",)):
+    """
+    Function that calculates the overall and windowed values of the requested metrics for a nucleotide sequence:
+    'gc' the GC percentage, 'skew' the GC skew and 'n' the percentage of unknown (N) bases.
+    :param seq:
+    string, bytes or buffer representing a nucleotide sequence.
+    :param window:
+    integer representing the size of the windows.
+    :param step:
+    integer representing the distance between the starts of consecutive windows, defaults to the window size.
+    :param metrics:
+    iterable of metric names (keys of METRICS).
+    :return:
+    dictionary where each key is a metric and each value a tuple of the overall value and a list with the value of
+    every window.
+    """
+    if isinstance(seq, str):
+        seq = seq.encode("ascii")
+    step = step or window
+    length = len(seq)
+
+    def counts(table):
+        members = membership(seq, table)
+        return np.count_nonzero(members), window_counts(members, window, step)
+
+    profile = {}
+    for metric in metrics:
+        if metric == "gc":
+            total, subsections = counts(GC_BASES)
+            profile[metric] = (int(percentage(total, length)), percentage(subsections, window).tolist())
+        elif metric == "n":
+            total, subsections = counts(N_BASES)
+            profile[metric] = (int(percentage(total, length)), percentage(subsections, window).tolist())
+        elif metric == "skew":
+            g_total, g_subsections = counts(G_BASES)
+            c_total, c_subsections = counts(C_BASES)
+            profile[metric] = (float(skew(g_total, c_total)), skew(g_subsections, c_subsections).tolist())
+        else:
+            raise ValueError("Unknown metric '{0}'.".format(metric))
+    return profile
+
+
+def profile_cells(seq, window=10, step=None, metrics=("gc",)):
+    """
+    Function that calculates the overall and windowed values of the requested metrics of a nucleotide sequence and
+    formats them as the cells of a row, with the windowed values separated by semicolons.
+    :param seq:
+    string representing a nucleotide sequence (can be empty).
+    :param window:
+    integer representing the size of the windows.
+    :param step:
+    integer representing the distance between the starts of consecutive windows, defaults to the window size.
+    :param metrics:
+    list of metric names (keys of METRICS).
+    :return:
+    list containing two cells per metric, empty strings if the sequence is empty.
+    """
+    if not seq:
+        return ["", ""] * len(metrics)
+
+    cells = []
+    profile = gc_profile(seq, window, step, metrics)
+    for metric in metrics:
+        total, subsections = profile[metric]
+        cells.extend([total, ";".join(map(str, subsections))])
+    return cells
+
+
+def profile_chunk(seqs, window=10, step=None, metrics=("gc",)):
+    """
+    Function that formats the values of the requested metrics of a chunk of sequences, used to send the sequences of
+    many rows to a worker process at once (see process_all()).
+    :param seqs:
+    list of strings representing nucleotide sequences.
+    :param window:
+    integer representing the size of the windows.
+    :param step:
+    integer representing the distance between the starts of consecutive windows, defaults to the window size.
+    :param metrics:
+    list of metric names (keys of METRICS).
+    :return:
+    list with the cells (see profile_cells()) of every sequence.
+    """
+    return [profile_cells(seq, window, step, metrics) for seq in seqs]
+
+
+def profile_genome_chunk(genes, window=10, step=None, metrics=("gc",), fasta_paths=(), annotation_paths=()):
+    """
+    Function that formats the values of the requested metrics of a chunk of genes whose sequences are extracted from
+    a reference genome (see genome.Genome), so only the locus tags are sent to a worker process instead of the
+    sequences.
+    :param genes:
+    list of tuples of a locus tag and the sequence to use if the gene is not in the genome (can be empty).
+    :param window:
+    integer representing the size of the windows.
+    :param step:
+    integer representing the distance between the starts of consecutive windows, defaults to the window size.
+    :param metrics:
+    list of metric names (keys of METRICS).
+    :param fasta_paths:
+    tuple of the paths of the FASTA files of the genome.
+    :param annotation_paths:
+    tuple of the paths of the GFF3 or GenBank files of the genome.
+    :return:
+    list with the cells (see profile_cells()) of every gene.
+    """
+    genome = open_genome(fasta_paths, annotation_paths)
+    cells = []
+    for locus_tag, fallback in genes:
+        seq = genome.sequence(locus_tag)
+        cells.append(profile_cells(fallback if seq is None else seq, window, step, metrics))
+    return cells
@@ -0,0 +1,250 @@
+import hashlib
+import math
+import os
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+from PIL import Image
+
+# Size of the plots in pixels, the width grows with the length of the sequence (as in plot_GC.R) up to max_width.
+DPI = 100
+PLOT_HEIGHT = 480
+MIN_WIDTH = 480
+MAX_WIDTH = 4000
+
+# Number of plots per page of the tiled overview (columns, rows).
+OVERVIEW_TILES = (4, 6)
+
+# Key of the PNG text chunk holding the fingerprint of the data a plot was rendered from, increased whenever the
+# layout of the plots changes so existing plots are rendered again.
+FINGERPRINT_KEY = "gc-fingerprint"
+RENDER_VERSION = 1
+
+# The plotter of a worker process, kept between chunks so its figure is reused (see render_chunk()).
+_plotter = None
+
+
+def parse_gc_row(row):
+    """
+    Function that parses the 'KEGG_ID', 'gc_content' and 'gc_content_subsections' cells of a row.
+    :param row:
+    list of the three cells, as read with read_rows(data_path, columns=[...]).
+    :return:
+    tuple of the KEGG ID, the total GC percentage and a numpy array with the GC percentage of every subsection, or None
+    if the gene has no subsections (e.g. because it has no sequence).
+    """
+    kegg_id, gc_content, subsections = row
+    if not gc_content or not subsections:
+        return None
+    return kegg_id, int(gc_content), np.array(subsections.split(";"), dtype=np.int64)
+
+
+def plot_path(out_dir, kegg_id):
+    """
+    Function that returns the path of the plot of a gene, named after its KEGG ID.
+    :param out_dir:
+    text or byte string giving the directory the plots are written to.
+    :param kegg_id:
+    string giving the KEGG identifier of the gene.
+    :return:
+    string giving the path of the .png file.
+    """
+    return os.path.join(out_dir, "{0}.png".format(kegg_id))
+
+
+def fingerprint(gene, settings):
+    """
+    Function that calculates a fingerprint of the data and settings a plot is rendered from.
+    :param gene:
+    tuple of the KEGG ID, total GC percentage and subsections (see parse_gc_row()).
+    :param settings:
+    tuple of the window, step and max_width used to render the plot.
+    :return:
+    string giving the hexadecimal SHA-256 digest.
+    """
+    kegg_id, gc_content, subsections = gene
+    text = "{0}|{1}|{2}|{3}|{4}".format(RENDER_VERSION, settings, kegg_id, gc_content, subsections.tobytes().hex())
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_up_to_date(path, digest):
+    """
+    Function that checks whether a plot exists and was rendered from the data with the given fingerprint. Only the
+    header of the PNG file is read.
+    :param path:
+    text or byte string giving the path of the plot.
+    :param digest:
+    string giving the fingerprint (see fingerprint()).
+    :return:
+    boolean, True if the plot does not have to be rendered again.
+    """
+    try:
+        with Image.open(path) as image:
+            return image.text.get(FINGERPRINT_KEY) == digest
+    except (OSError, SyntaxError):
+        return False
+
+
+class GCPlotter:
+    """
+    Renders GC content plots: the GC percentage of every subsection as a line with points and the total GC percentage
+    as a dashed horizontal line. A single figure is created and its lines are updated for every gene, which is much
+    faster than creating a new figure per plot.
+    """
+
+    def __init__(self, window=10, step=None, max_width=MAX_WIDTH):
+        """
+        :param window:
+        integer representing the size of the subsections.
+        :param step:
+        integer representing the distance between the starts of consecutive subsections, defaults to the window size.
+        :param max_width:
+        integer representing the maximum width of a plot in pixels.
+        """
+        self.window = window
+        self.step = step or window
+        self.max_width = max_width
+        self.figure = Figure(dpi=DPI)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+        self._line, = self.axes.plot([], [], marker="o", markersize=4, markerfacecolor="none", color="black",
+                                     linewidth=1)
+        self._total = self.axes.axhline(0, linestyle="--", color="black", linewidth=1)
+        self._style(self.axes)
+
+    @staticmethod
+    def _style(axes):
+        axes.set_ylim(0, 100)
+        axes.set_yticks([0, 25, 50, 75, 100])
+        axes.set_xlabel("Sequence position")
+        axes.set_ylabel("GC percentage")
+
+    def positions(self, subsections):
+        """
+        Function that returns the position of the end of every subsection in the sequence.
+        :param subsections:
+        numpy array with the GC percentage of every subsection.
+        :return:
+        numpy array of integers.
+        """
+        return self.window + self.step * np.arange(len(subsections))
+
+    def draw(self, gene):
+        """
+        Function that updates the figure with the data of a gene and resizes it to the length of the sequence.
+        :param gene:
+        tuple of the KEGG ID, total GC percentage and subsections (see parse_gc_row()).
+        :return:
+        """
+        kegg_id, gc_content, subsections = gene
+        x = self.positions(subsections)
+        width = min(max(int(x[-1]), MIN_WIDTH), self.max_width)
+        self.figure.set_size_inches(width / DPI, PLOT_HEIGHT / DPI)
+        # Margins in pixels, so they do not change with the width of the plot.
+        self.figure.subplots_adjust(left=70 / width, right=1 - 20 / width, bottom=0.12, top=0.92)
+        self._line.set_data(x, subsections)
+        self._total.set_ydata([gc_content, gc_content])
+        self.axes.set_xlim(0, x[-1])
+        self.axes.set_title(kegg_id)
+
+    def save(self, gene, path, digest=None):
+        """
+        Function that renders the plot of a gene to a PNG file.
+        :param gene:
+        tuple of the KEGG ID, total GC percentage and subsections (see parse_gc_row()).
+        :param path:
+        text or byte string giving the path of the plot.
+        :param digest:
+        string giving the fingerprint of the data (see fingerprint()), stored in the PNG file.
+        :return:
+        """
+        self.draw(gene)
+        self.figure.savefig(path, format="png", metadata={FINGERPRINT_KEY: digest} if digest else None)
+
+    def write_pdf(self, genes, path):
+        """
+        Function that writes the plots of genes to a multi-page PDF file with one page per gene.
+        :param genes:
+        iterable of tuples of the KEGG ID, total GC percentage and subsections (see parse_gc_row()).
+        :param path:
+        text or byte string giving the path of the PDF file.
+        :return:
+        integer representing the number of pages.
+        """
+        pages = 0
+        with PdfPages(path) as pdf:
+            for gene in genes:
+                self.draw(gene)
+                pdf.savefig(self.figure)
+                pages += 1
+        return pages
+
+    def write_overview(self, genes, path, tiles=OVERVIEW_TILES):
+        """
+        Function that writes a tiled overview of the plots of genes to a multi-page PDF file, with a grid of small
+        plots per page. The axes of a page are reused for every following page.
+        :param genes:
+        list of tuples of the KEGG ID, total GC percentage and subsections (see parse_gc_row()).
+        :param path:
+        text or byte string giving the path of the PDF file.
+        :param tiles:
+        tuple of the number of columns and rows of plots per page.
+        :return:
+        integer representing the number of pages.
+        """
+        columns, rows = tiles
+        per_page = columns * rows
+        figure = Figure(figsize=(8.27, 11.69), dpi=DPI)
+        FigureCanvasAgg(figure)
+        grid = figure.subplots(rows, columns, sharey=True).flatten()
+        figure.subplots_adjust(left=0.07, right=0.98, bottom=0.04, top=0.97, wspace=0.1, hspace=0.45)
+        lines = [axes.plot([], [], color="black", linewidth=0.5)[0] for axes in grid]
+        totals = [axes.axhline(0, linestyle="--", color="black", linewidth=0.5) for axes in grid]
+        for axes in grid:
+            axes.set_ylim(0, 100)
+            axes.set_yticks([0, 50, 100])
+            axes.tick_params(labelsize=5)
+
+        pages = math.ceil(len(genes) / per_page)
+        with PdfPages(path) as pdf:
+            for page in range(pages):
+                page_genes = genes[page * per_page:(page + 1) * per_page]
+                for index, axes in enumerate(grid):
+                    axes.set_visible(index < len(page_genes))
+                    if index >= len(page_genes):
+                        continue
+                    kegg_id, gc_content, subsections = page_genes[index]
+                    x = self.positions(subsections)
+                    lines[index].set_data(x, subsections)
+                    totals[index].set_ydata([gc_content, gc_content])
+                    axes.set_xlim(0, x[-1])
+                    axes.set_title(kegg_id, fontsize=6)
+                pdf.savefig(figure)
+        return pages
+
+
+def render_chunk(genes, out_dir, window=10, step=None, max_width=MAX_WIDTH):
+    """
+    Function that renders the PNG plots of a chunk of genes, used to divide the genes over worker processes (see
+    process_all()). The plotter, and with it the figure, is kept for the following chunks of the same process.
+    :param genes:
+    list of tuples of a gene (see parse_gc_row()) and its fingerprint (see fingerprint()).
+    :param out_dir:
+    text or byte string giving the directory the plots are written to.
+    :param window:
+    integer representing the size of the subsections.
+    :param step:
+    integer representing the distance between the starts of consecutive subsections, defaults to the window size.
+    :param max_width:
+    integer representing the maximum width of a plot in pixels.
+    :return:
+    integer representing the number of plots rendered.
+    """
+    global _plotter
+    if _plotter is None or (_plotter.window, _plotter.step, _plotter.max_width) != (window, step or window, max_width):
+        _plotter = GCPlotter(window, step, max_width)
+    for gene, digest in genes:
+        _plotter.save(gene, plot_path(out_dir, gene[0]), digest)
+    return len(genes)
@@ -0,0 +1,245 @@
+import functools
+import mmap
+import re
+import sys
+from urllib.parse import unquote
+
+# Translation table giving the complement of every (IUPAC) base, in upper and lower case.
+COMPLEMENT = bytes.maketrans(b"ACGTURYKMBDHVSWNacgturykmbdhvswn", b"TGCAAYRMKVHDBSWNtgcaayrmkvhdbswn")
+
+# GFF3 attributes and GenBank qualifiers under which a feature is indexed, the old locus tags of RefSeq annotations
+# are the IDs KEGG uses for some organisms (e.g. lp_0001 for lpl).
+LOCUS_TAG_KEYS = ("locus_tag", "old_locus_tag")
+
+# Feature types whose location is used for a locus tag, before those of any other feature with the same tag.
+GENE_FEATURES = ("gene", "pseudogene")
+
+
+class Genome:
+    """
+    Reference genome that extracts the sequences of genes by their locus tag. The FASTA files are memory-mapped and
+    indexed like 'samtools faidx' (the offset of every sequence and the number of bases and bytes per line), so a
+    gene's sequence is read with a single slice of the mapped file. The locations of the genes are read from GFF3 or
+    GenBank annotation files, the sequences of genes on the minus strand are reverse complemented.
+    """
+
+    def __init__(self, fasta_paths, annotation_paths):
+        """
+        :param fasta_paths:
+        list of the paths of the FASTA files with the sequences of the chromosomes (and plasmids).
+        :param annotation_paths:
+        list of the paths of the GFF3 or GenBank files with the locations of the genes.
+        """
+        self._files = []
+        self.contigs = {}
+        for fasta_path in fasta_paths:
+            with open(fasta_path, mode="rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._files.append(data)
+            for name, contig in index_fasta(data).items():
+                self.contigs.setdefault(name, (data,) + contig)
+
+        self.loci = {}
+        for annotation_path in annotation_paths:
+            for locus_tag, location in read_annotation(annotation_path).items():
+                self.loci.setdefault(locus_tag, location)
+
+    def sequence(self, locus_tag):
+        """
+        Function that extracts the nucleotide sequence of a gene from the genome.
+        :param locus_tag:
+        string giving the locus tag of the gene.
+        :return:
+        bytes containing the sequence of the gene in the letter case of the FASTA file (reverse complemented for genes
+        on the minus strand), or None if the gene or its chromosome is not in the genome.
+        """
+        location = self.loci.get(locus_tag)
+        if location is None:
+            return None
+        contig, start, end, strand = location
+        if contig not in self.contigs:
+            return None
+        data, offset, length, line_bases, line_bytes = self.contigs[contig]
+        start, end = max(start, 0), min(end, length)
+        if start >= end:
+            return b""
+
+        # The newlines between start and end are removed by the translation, which also copies the slice.
+        seq = data[offset + start // line_bases * line_bytes + start % line_bases:
+                   offset + end // line_bases * line_bytes + end % line_bases]
+        if line_bytes != line_bases:
+            seq = seq.translate(None, b"\r\n")
+        if strand == "-":
+            seq = seq.translate(COMPLEMENT)[::-1]
+        return seq
+
+    def close(self):
+        """
+        Function that unmaps the FASTA files.
+        :return:
+        """
+        for data in self._files:
+            data.close()
+        self._files = []
+
+
+@functools.lru_cache(maxsize=4)
+def open_genome(fasta_paths, annotation_paths):
+    """
+    Function that returns the genome of a set of files, opened once per process so the workers of a process pool
+    (see processing.process_all()) each index and map the files only once. The mapped pages are shared by all
+    processes through the page cache.
+    :param fasta_paths:
+    tuple of the paths of the FASTA files.
+    :param annotation_paths:
+    tuple of the paths of the GFF3 or GenBank files.
+    :return:
+    Genome object.
+    """
+    return Genome(fasta_paths, annotation_paths)
+
+
+def index_fasta(data):
+    """
+    Function that indexes the sequences of a FASTA file. All lines of a sequence, except its last, must have the same
+    length.
+    :param data:
+    bytes or memory-mapped file with the contents of the FASTA file.
+    :return:
+    dictionary where each key is the name of a sequence (the first word of its header) and each value a tuple of the
+    offset of its first base, its length and the number of bases and of bytes per line.
+    """
+    contigs = {}
+    position = data.find(b">")
+    while position != -1:
+        header_end = data.find(b"\n", position)
+        if header_end == -1:
+            break
+        name = data[position + 1:header_end].split(None, 1)[0].decode() if header_end > position + 1 else ""
+        offset = header_end + 1
+        next_record = data.find(b"\n>", header_end)
+        end = len(data) if next_record == -1 else next_record + 1
+
+        line_lengths = [len(line) for line in data[offset:end].split(b"\n")]
+        if line_lengths and line_lengths[-1] == 0:
+            line_lengths.pop()
+        carriage_return = 1 if data.find(b"\r", offset, end) != -1 else 0
+        line_bytes = (line_lengths[0] + 1) if line_lengths else 1
+        line_bases = line_bytes - 1 - carriage_return
+        if any(line_length != line_bytes - 1 for line_length in line_lengths[:-1]):
+            sys.exit("The lines of sequence {0} do not all have the same length, quitting.".format(name))
+        length = sum(line_lengths) - carriage_return * len(line_lengths)
+        contigs[name] = (offset, length, max(line_bases, 1), line_bytes)
+        position = next_record + 1 if next_record != -1 else -1
+    return contigs
+
+
+def read_annotation(annotation_path):
+    """
+    Function that reads the locations of the genes in a GFF3 or GenBank file, the format is detected from the first
+    line.
+    :param annotation_path:
+    text or byte string giving the name (and path) of the file.
+    :return:
+    dictionary where each key is a locus tag and each value a tuple of the name of the sequence, the start (0-based)
+    and end (exclusive) of the gene and its strand ('+' or '-').
+    """
+    with open(annotation_path, mode="r") as file:
+        first_line = file.readline()
+        file.seek(0)
+        if first_line.startswith("LOCUS"):
+            return parse_genbank(file)
+        return parse_gff(file)
+
+
+def parse_gff(lines):
+    """
+    Function that reads the locations of the genes from the lines of a GFF3 file. Features are indexed under their
+    locus tags (see LOCUS_TAG_KEYS), gene features take precedence over e.g. the CDS features of the same gene.
+    :param lines:
+    iterable object yielding the lines of the file.
+    :return:
+    dictionary where each key is a locus tag and each value a tuple of the name of the sequence, the start (0-based)
+    and end (exclusive) of the gene and its strand ('+' or '-').
+    """
+    loci = {}
+    genes = set()
+    for line in lines:
+        if line.startswith("##FASTA"):
+            break
+        if line.startswith("#") or not line.strip():
+            continue
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 9:
+            continue
+        attributes = dict(attribute.split("=", 1) for attribute in fields[8].split(";") if "=" in attribute)
+        location = (unquote(fields[0]), int(fields[3]) - 1, int(fields[4]), fields[6])
+        is_gene = fields[2] in GENE_FEATURES
+        for key in LOCUS_TAG_KEYS:
+            for locus_tag in unquote(attributes.get(key, "")).split(","):
+                locus_tag = locus_tag.strip()
+                if locus_tag and (locus_tag not in loci or is_gene and locus_tag not in genes):
+                    loci[locus_tag] = location
+                    if is_gene:
+                        genes.add(locus_tag)
+    return loci
+
+
+def parse_genbank(lines):
+    """
+    Function that reads the locations of the genes from the lines of a GenBank file, which may contain several
+    records. The sequence name of a record is the accession with version from its VERSION line (as used in FASTA
+    headers), or its LOCUS name. A location joining several parts (e.g. 'complement(join(1..10,20..30))') is taken
+    as a whole, from its first to its last base.
+    :param lines:
+    iterable object yielding the lines of the file.
+    :return:
+    dictionary where each key is a locus tag and each value a tuple of the name of the sequence, the start (0-based)
+    and end (exclusive) of the gene and its strand ('+' or '-').
+    """
+    loci = {}
+    genes = set()
+    contig = None
+    in_features = False
+    feature = None
+
+    def add(feature):
+        if feature is None:
+            return
+        key, location, qualifiers = feature
+        positions = [int(position) for position in re.findall(r"\d+", location)]
+        if not positions:
+            return
+        location = (contig, min(positions) - 1, max(positions), "-" if location.startswith("complement") else "+")
+        is_gene = key in GENE_FEATURES
+        for qualifier, value in qualifiers:
+            if qualifier in LOCUS_TAG_KEYS and (value not in loci or is_gene and value not in genes):
+                loci[value] = location
+                if is_gene:
+                    genes.add(value)
+
+    for line in lines:
+        if line.startswith("LOCUS"):
+            contig = line.split()[1]
+        elif line.startswith("VERSION") and len(line.split()) > 1:
+            contig = line.split()[1]
+        elif line.startswith("FEATURES"):
+            in_features = True
+        elif in_features and line[:1].strip():
+            # ORIGIN, CONTIG or the end of the record ('//').
+            add(feature)
+            feature = None
+            in_features = False
+        elif in_features and line[5:6].strip():
+            add(feature)
+            feature = (line[5:21].strip(), line[21:].strip(), [])
+        elif in_features and feature is not None:
+            value = line[21:].strip()
+            if value.startswith("/"):
+                qualifier, _, value = value[1:].partition("=")
+                feature[2].append((qualifier, value.strip('"')))
+            elif not feature[2]:
+                # The location continues on this line.
+                feature = (feature[0], feature[1] + value, feature[2])
+    add(feature)
+    return loci
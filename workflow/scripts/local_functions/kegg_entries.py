@@ -0,0 +1,207 @@
+from local_functions.cache import cached_fetch
+from local_functions.clients import kegg_client
+from local_functions.fetching import FetchError, rate_limited
+from local_functions.metrics import metrics
+from local_functions.organisms import DEFAULT_ORGANISM
+
+# The KEGG REST 'get' operation accepts at most 10 entries joined with '+' per request.
+KEGG_BATCH_SIZE = 10
+
+
+def get_kegg_entry(kegg_id, cache=None, kegg=None, organism=DEFAULT_ORGANISM):
+    """
+    Function that uses a KEGG ID to query the KEGG database (or the cache) for the corresponding entry and parses it.
+    :param kegg_id:
+    string giving the identifier of a KEGG database entry.
+    :param cache:
+    EntryCache object used to look up the entry before querying the database, or None to always query it.
+    :param kegg:
+    bioservices KEGG object to query the database with, the shared client (see clients.kegg_client()) is used if None.
+    Offline only its parse() method is used.
+    :param organism:
+    string giving the KEGG organism code of the gene (e.g. 'lpl').
+    :return:
+    dictionary containing the parsed KEGG entry. A FetchError is raised if no entry was retrieved, e.g. because the
+    request failed or the entry is not cached while offline.
+    """
+    if kegg is None:
+        kegg = kegg_client(offline=cache is not None and cache.offline)
+    response = cached_fetch(cache, "kegg", "{0}:{1}".format(organism, kegg_id),
+                            lambda entry_id: rate_limited("kegg", kegg.get, entry_id))
+    if not isinstance(response, str):
+        raise FetchError("No KEGG entry retrieved for {0}:{1} ({2}).".format(organism, kegg_id, response))
+    with metrics.timer("parse.kegg"):
+        return kegg.parse(response)
+
+
+def get_kegg_entries(kegg_ids, cache=None, kegg=None, batch_size=KEGG_BATCH_SIZE, failures=None,
+                     organism=DEFAULT_ORGANISM):
+    """
+    Function that retrieves and parses the KEGG entries of multiple KEGG IDs. Entries that are not cached are queried
+    in batches of up to batch_size IDs per request, the response is split into records which are mapped back to their
+    ID by the ENTRY line. IDs missing from a batch response (or from a failed batch) are retried one at a time. If
+    that fails as well, or the entry is not cached while offline, the ID is added to failures, or a FetchError is
+    raised if failures is None.
+    :param kegg_ids:
+    list of strings giving the identifiers of KEGG database entries.
+    :param cache:
+    EntryCache object used to look up the entries before querying the database, or None to always query it.
+    :param kegg:
+    bioservices KEGG object to query the database with, the shared client (see clients.kegg_client()) is used if None.
+    Offline only its parse() method is used.
+    :param batch_size:
+    integer representing the maximum number of IDs per request (1 queries every ID separately).
+    :param failures:
+    set to which the IDs whose entry could not be retrieved are added, or None.
+    :param organism:
+    string giving the KEGG organism code of the genes (e.g. 'lpl').
+    :return:
+    dictionary where each key is a KEGG ID and each value a dictionary containing the parsed KEGG entry (empty if the
+    entry could not be retrieved).
+    """
+    if kegg is None:
+        kegg = kegg_client(offline=cache is not None and cache.offline)
+
+    records = {}
+    missing = []
+    for kegg_id in dict.fromkeys(kegg_ids):
+        record = cache.get("kegg", "{0}:{1}".format(organism, kegg_id)) if cache is not None else None
+        if record is not None:
+            records[kegg_id] = record
+        elif cache is None or not cache.offline:
+            missing.append(kegg_id)
+
+    if batch_size > 1:
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            try:
+                response = rate_limited("kegg", kegg.get, "+".join("{0}:{1}".format(organism, kegg_id)
+                                                                  for kegg_id in batch))
+            except FetchError:
+                continue
+            if not isinstance(response, str):
+                continue
+            for kegg_id, record in match_kegg_records(batch, response).items():
+                records[kegg_id] = record
+                if cache is not None:
+                    cache.put("kegg", "{0}:{1}".format(organism, kegg_id), record)
+
+    entries = {}
+    for kegg_id in kegg_ids:
+        if kegg_id in entries:
+            continue
+        try:
+            if kegg_id in records:
+                with metrics.timer("parse.kegg"):
+                    entries[kegg_id] = kegg.parse(records[kegg_id])
+            elif kegg_id in missing:
+                entries[kegg_id] = get_kegg_entry(kegg_id, cache, kegg, organism)
+            else:
+                raise FetchError("KEGG entry {0}:{1} is not cached and the cache is offline.".format(organism, kegg_id))
+        except FetchError:
+            if failures is None:
+                raise
+            failures.add(kegg_id)
+            entries[kegg_id] = {}
+    return entries
+
+
+def get_organism_entries(lines, organism_of, cache=None, kegg=None, batch_size=KEGG_BATCH_SIZE, failures=None):
+    """
+    Function that retrieves and parses the KEGG entries of the rows of a tabular file, which may be of genes of
+    different organisms. The rows are grouped by organism and the entries of every group are retrieved with
+    get_kegg_entries().
+    :param lines:
+    list of lists representing rows of a tabular file with the KEGG ID in the first column.
+    :param organism_of:
+    function that takes a row and returns the KEGG organism code of its gene (see organisms.organism_getter()).
+    :param cache:
+    EntryCache object used to look up the entries before querying the database, or None to always query it.
+    :param kegg:
+    bioservices KEGG object to query the database with, the shared client (see clients.kegg_client()) is used if None.
+    Offline only its parse() method is used.
+    :param batch_size:
+    integer representing the maximum number of IDs per request (1 queries every ID separately).
+    :param failures:
+    set to which the IDs whose entry could not be retrieved are added, or None.
+    :return:
+    dictionary where each key is a tuple of an organism code and a KEGG ID and each value a dictionary containing the
+    parsed KEGG entry (empty if the entry could not be retrieved).
+    """
+    kegg_ids = {}
+    for line in lines:
+        kegg_ids.setdefault(organism_of(line), []).append(line[0])
+    entries = {}
+    for organism, organism_kegg_ids in kegg_ids.items():
+        for kegg_id, entry in get_kegg_entries(organism_kegg_ids, cache, kegg, batch_size, failures, organism).items():
+            entries[organism, kegg_id] = entry
+    return entries
+
+
+def match_kegg_records(kegg_ids, response):
+    """
+    Function that splits a KEGG flat-file response containing multiple entries on the '///' record terminators and
+    maps each record to the requested KEGG ID named on its ENTRY line.
+    :param kegg_ids:
+    list of strings giving the requested KEGG identifiers.
+    :param response:
+    string containing the concatenated KEGG entries.
+    :return:
+    dictionary where each key is a KEGG ID and each value a string containing its record (including the terminator).
+    """
+    requested = {kegg_id.lower(): kegg_id for kegg_id in kegg_ids}
+    records = {}
+    for record in response.split("///"):
+        record = record.lstrip("\n")
+        if not record.startswith("ENTRY"):
+            continue
+        fields = record.split(None, 2)
+        kegg_id = requested.get(fields[1].lower()) if len(fields) > 1 else None
+        if kegg_id is not None:
+            records[kegg_id] = record + "///\n"
+    return records
+
+
+def get_alt_ids(kegg_entry):
+    """
+    Function that takes the UniProt and NCBI Protein ID (if available) from a parsed KEGG entry.
+    :param kegg_entry:
+    dictionary containing a parsed KEGG entry.
+    :return:
+    two strings giving the identifiers for UniProt and NCBI respectively.
+    """
+    try:
+        uniprot = kegg_entry["DBLINKS"]["UniProt"]
+    except KeyError:
+        uniprot = ""
+
+    try:
+        NCBIProteinID = kegg_entry["DBLINKS"]["NCBI-ProteinID"]
+    except KeyError:
+        NCBIProteinID = ""
+
+    return uniprot, NCBIProteinID
+
+
+def get_seq_and_pathways(kegg_entry):
+    """
+    Function that takes the nucleotide sequence and the pathways (if available) from a parsed KEGG entry.
+    :param kegg_entry:
+    dictionary containing a parsed KEGG entry.
+    :return:
+    a string giving the nucleotide sequence and a list containing the pathways.
+    """
+    try:
+        nt_seq = kegg_entry["NTSEQ"]
+    except KeyError:
+        nt_seq = ""
+
+    try:
+        pathways = []
+        for pathway in kegg_entry["PATHWAY"]:
+            s = "{0}: {1}".format(pathway, kegg_entry["PATHWAY"][pathway])
+            pathways.append(s.replace(";", "."))
+    except KeyError:
+        pathways = ""
+
+    return nt_seq, pathways
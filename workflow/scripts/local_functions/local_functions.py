@@ -1,6 +1,11 @@
 import csv
+import os
+import sys
+import time
 
 from tqdm import tqdm
+from local_functions.columnar import FORMATS, ParquetRowWriter, is_parquet, parquet_row_count, read_parquet_rows
+from local_functions.metrics import metrics, record_written
 
 
 def count_lines(file):
@@ -17,7 +22,27 @@ def count_lines(file):
     return row_count
 
 
-def write_to_csv(out_path, output, row_count):
+def chunked(iterable, size):
+    """
+    Function that splits an iterable in lists of (at most) the given size without reading it entirely first.
+    :param iterable:
+    iterable object, e.g. a csv reader.
+    :param size:
+    integer representing the maximum number of items per list.
+    :return:
+    generator yielding lists of items from the iterable.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_to_csv(out_path, output, row_count, out_format="tsv"):
     """
     Function that creates a tabular file of the supplied data. Uses row_count to provide a progressbar.
     :param out_path:
@@ -26,9 +51,158 @@ def write_to_csv(out_path, output, row_count):
     nested list [[],[],etc] of the data that is to be written to a file.
     :param row_count:
     integer representing the number of row that will be written (number of nested lists in output).
+    :param out_format:
+    string giving the format of the file, 'tsv' or 'parquet'.
     :return:
     """
-    with open(out_path, mode="w") as file:
-        csvWriter = csv.writer(file, dialect="excel", delimiter="\t")
+    with open_writer(out_path, out_format) as writer:
         for line in tqdm(output, desc="Writing to file", total=row_count):
-            csvWriter.writerow(line)
+            writer.writerow(line)
+
+
+def read_rows(data_path, columns=None):
+    """
+    Function that reads a tabular file one row at a time, so the file never has to be held in memory as a whole. Both
+    tsv and Parquet files can be read, the format is detected from the contents of the file.
+    :param data_path:
+    text or byte string giving the name (and path) of the tabular file.
+    :param columns:
+    list of the names of the columns to read in that order, or None to read all columns. Only the requested columns
+    are loaded from a Parquet file.
+    :return:
+    generator yielding the header row followed by the other rows as lists of strings.
+    """
+    if is_parquet(data_path):
+        yield from metrics.timed("io.read", read_parquet_rows(data_path, columns))
+        return
+
+    with open(data_path, mode="r") as file:
+        csvReader = metrics.timed("io.read", csv.reader(file, dialect="excel", delimiter="\t"))
+        if columns is None:
+            yield from csvReader
+            return
+        header = next(csvReader)
+        try:
+            indices = [header.index(column) for column in columns]
+        except ValueError:
+            sys.exit("The file does not contain the columns {0}, quitting.".format(", ".join(columns)))
+        yield list(columns)
+        for line in csvReader:
+            yield [line[index] for index in indices]
+
+
+def row_count_hint(data_path):
+    """
+    Function that returns the number of rows (excluding the header) of a tabular file written by RowWriter, as stored
+    in its '.rows' sidecar file. The sidecar is ignored if it is older than the file itself. The number of rows of a
+    Parquet file is taken from its metadata.
+    :param data_path:
+    text or byte string giving the name (and path) of the tabular file.
+    :return:
+    integer representing the number of rows or None if it is not known.
+    """
+    if is_parquet(data_path):
+        return parquet_row_count(data_path)
+
+    sidecar_path = "{0}.rows".format(data_path)
+    try:
+        if os.path.getmtime(sidecar_path) < os.path.getmtime(data_path):
+            return None
+        with open(sidecar_path, mode="r") as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+class RowWriter:
+    """
+    Writer that writes rows to a tabular file as soon as they are supplied. When closed the number of rows (excluding
+    the header) is stored in a '.rows' sidecar file, which row_count_hint() uses to size progress bars without
+    reading the file twice, and the number of rows and the time spent writing them are added to the metrics.
+    """
+
+    def __init__(self, out_path):
+        """
+        :param out_path:
+        text or byte string giving the name (and path) of the file that should be written to.
+        """
+        self.out_path = out_path
+        # The first row written is the header, which is not counted.
+        self.row_count = -1
+        self._file = open(out_path, mode="w", buffering=1)
+        self._csvWriter = csv.writer(self._file, dialect="excel", delimiter="\t")
+        self._seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(write_sidecar=exc_type is None)
+
+    def writerow(self, row):
+        start = time.perf_counter()
+        self._csvWriter.writerow(row)
+        self._seconds += time.perf_counter() - start
+        self.row_count += 1
+
+    def close(self, write_sidecar=True):
+        self._file.close()
+        record_written(self.out_path, self.row_count, self._seconds)
+        if write_sidecar:
+            with open("{0}.rows".format(self.out_path), mode="w") as file:
+                file.write(str(max(self.row_count, 0)))
+
+
+def open_writer(out_path, out_format="tsv"):
+    """
+    Function that opens a writer for a tabular file in the given format.
+    :param out_path:
+    text or byte string giving the name (and path) of the file that should be written to.
+    :param out_format:
+    string giving the format of the file, 'tsv' or 'parquet'.
+    :return:
+    RowWriter or ParquetRowWriter object.
+    """
+    if out_format == "parquet":
+        return ParquetRowWriter(out_path)
+    return RowWriter(out_path)
+
+
+def add_format_argument(parser):
+    """
+    Function that adds the --format commandline argument, which sets the format of the output file, to an argument
+    parser.
+    :param parser:
+    argparse.ArgumentParser object.
+    :return:
+    """
+    parser.add_argument("--format",
+                        type=str,
+                        required=False,
+                        default="tsv",
+                        choices=FORMATS,
+                        help="format of the output file. Input files can be in either format.")
+
+
+def write_rows(out_path, rows, row_count=None, desc="Writing to file", out_format="tsv"):
+    """
+    Function that writes rows to a tabular file as soon as they are produced, e.g. by a generator that enriches the
+    rows of another file. Uses row_count to provide a progressbar.
+    :param out_path:
+    text or byte string giving the name (and path) of the file that should be written to.
+    :param rows:
+    iterable object yielding the header row followed by the other rows.
+    :param row_count:
+    integer representing the number of rows (excluding the header) that will be written, or None if it is not known.
+    :param desc:
+    string giving the description shown in front of the progressbar.
+    :param out_format:
+    string giving the format of the file, 'tsv' or 'parquet'.
+    :return:
+    """
+    rows = iter(rows)
+    header = next(rows)
+    with open_writer(out_path, out_format) as writer:
+        writer.writerow(header)
+        for row in tqdm(rows, desc=desc, total=row_count):
+            writer.writerow(row)
@@ -0,0 +1,245 @@
+import gzip
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+
+from local_functions.metrics import metrics
+
+# Names of the files of a store, inside its directory.
+DATA_FILE = "entries.dat"
+INDEX_FILE = "index.sqlite"
+
+# Lines that end an entry in the flat-file downloads of each database.
+TERMINATORS = {"kegg": "///", "uniprot": "//"}
+
+
+class LocalStore:
+    """
+    Read-only store of raw database entries (KEGG and UniProt flat-files) imported from bulk downloads (see
+    import_dumps()). The entries are concatenated in a data file that is memory-mapped, a SQLite index maps the
+    database name and identifier of every entry to its offset and length in that file. A store can be used in place
+    of an EntryCache in offline mode, entries that are not in the store are returned as None and nothing is fetched.
+    Stores frozen from an entry cache also hold the UniProt fields retrieved by the batch queries ('uniprot_fields',
+    see uniprot_entries.get_uniprot_annotations()), so an offline run gives the same results as the online one.
+    """
+
+    def __init__(self, path):
+        """
+        :param path:
+        text or byte string giving the directory of the store.
+        """
+        index_path = os.path.join(path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            sys.exit("No local store found in {0}, create it with import_dump.py first, quitting.".format(path))
+
+        self.offline = True
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(index_path, check_same_thread=False)
+        self.databases = {row[0] for row in self._connection.execute("SELECT DISTINCT db FROM entries")}
+        self._data = b""
+        with open(os.path.join(path, DATA_FILE), mode="rb") as file:
+            # An empty file cannot be mapped, a store without entries has nothing to look up anyway.
+            if os.fstat(file.fileno()).st_size:
+                self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, db, entry_id):
+        """
+        Function that looks up an entry in the store.
+        :param db:
+        string giving the name of the database the entry belongs to (e.g. 'kegg' or 'uniprot').
+        :param entry_id:
+        string giving the identifier of the entry.
+        :return:
+        string containing the raw text of the entry or None if it is not in the store.
+        """
+        if db not in self.databases:
+            # E.g. the UniProt fields in a store that was not frozen from a cache, the full entries are read instead.
+            return None
+        with self._lock:
+            row = self._connection.execute("SELECT offset, length FROM entries WHERE db = ? AND id = ?",
+                                           (db, entry_id)).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.count("cache.{0}.misses".format(db))
+                return None
+            self.hits += 1
+        metrics.count("cache.{0}.hits".format(db))
+        return self._data[row[0]:row[0] + row[1]].decode()
+
+    def put(self, db, entry_id, text):
+        """
+        Function that ignores an entry, the store only changes when it is imported again.
+        :param db:
+        string giving the name of the database the entry belongs to.
+        :param entry_id:
+        string giving the identifier of the entry.
+        :param text:
+        string containing the raw text of the entry.
+        :return:
+        """
+
+    def fetch(self, db, entry_id, retrieve):
+        """
+        Function that returns an entry from the store, the retrieve function is never called.
+        :param db:
+        string giving the name of the database the entry belongs to (e.g. 'kegg' or 'uniprot').
+        :param entry_id:
+        string giving the identifier of the entry.
+        :param retrieve:
+        function that would retrieve the entry, kept for compatibility with EntryCache.fetch().
+        :return:
+        string containing the raw text of the entry or None if it is not in the store.
+        """
+        return self.get(db, entry_id)
+
+    def close(self):
+        """
+        Function that closes the index and unmaps the data file.
+        :return:
+        """
+        with self._lock:
+            self._connection.close()
+            if isinstance(self._data, mmap.mmap):
+                self._data.close()
+
+
+def import_dumps(path, kegg_paths=(), uniprot_paths=(), organism=None, cache_path=None):
+    """
+    Function that creates a store (see LocalStore) from bulk flat-file downloads, replacing the store in path if there
+    is one. KEGG entries are stored under '{organism}:{ID}' like in the cache, with the organism taken from their
+    ORGANISM line. UniProt entries are stored under each of their accessions, the primary accession is used if an
+    accession belongs to more than one entry. Files ending with '.gz' are decompressed while they are read. The KEGG
+    and UniProt entries of an entry cache (see cache.EntryCache) can be added as well, together with the UniProt fields
+    of the batch queries, e.g. to run the workflow again later on exactly the entries retrieved by an earlier run.
+    Entries from the flat-files take precedence over those of the cache.
+    :param path:
+    text or byte string giving the directory of the store, it is created if needed.
+    :param kegg_paths:
+    iterable object yielding the paths of KEGG flat-files with entries separated by '///' lines (e.g. the result of
+    'get' requests for all genes of an organism).
+    :param uniprot_paths:
+    iterable object yielding the paths of UniProt flat-files ('.dat' files, e.g. of a proteome).
+    :param organism:
+    string giving the KEGG organism code of the KEGG entries without an ORGANISM line, or None to skip those entries.
+    :param cache_path:
+    text or byte string giving the name (and path) of the SQLite file of an entry cache, or None.
+    :return:
+    dictionary where each key is a database name and each value the number of entries imported from it.
+    """
+    os.makedirs(path, exist_ok=True)
+    data_path = os.path.join(path, DATA_FILE)
+    index_path = os.path.join(path, INDEX_FILE)
+    # The store is built next to the old one and replaces it once complete, so a failed import leaves it usable.
+    for tmp_path in (data_path + ".tmp", index_path + ".tmp"):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    counts = {"kegg": 0, "uniprot": 0, "uniprot_fields": 0}
+    connection = sqlite3.connect(index_path + ".tmp")
+    try:
+        connection.execute("CREATE TABLE entries (db TEXT NOT NULL, id TEXT NOT NULL, offset INTEGER NOT NULL, "
+                           "length INTEGER NOT NULL, PRIMARY KEY (db, id)) WITHOUT ROWID")
+        with open(data_path + ".tmp", mode="wb") as data:
+            for db, dump_paths in (("kegg", kegg_paths), ("uniprot", uniprot_paths)):
+                for dump_path in dump_paths:
+                    for entry in read_entries(dump_path, TERMINATORS[db]):
+                        ids = kegg_entry_ids(entry, organism) if db == "kegg" else uniprot_entry_ids(entry)
+                        if not ids:
+                            continue
+                        text = entry.encode()
+                        offset = data.tell()
+                        data.write(text)
+                        # The primary accession of a UniProt entry takes precedence over the secondary ones of others.
+                        connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                                           (db, ids[0], offset, len(text)))
+                        connection.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)",
+                                               [(db, entry_id, offset, len(text)) for entry_id in ids[1:]])
+                        counts[db] += 1
+            if cache_path:
+                cache = sqlite3.connect(cache_path, timeout=60)
+                try:
+                    for db, entry_id, text in cache.execute(
+                            "SELECT entries.db, entries.id, blobs.text FROM entries JOIN blobs ON entries.digest = "
+                            "blobs.digest WHERE entries.db IN ('kegg', 'uniprot', 'uniprot_fields')"):
+                        text = text.encode()
+                        if connection.execute("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)",
+                                              (db, entry_id, data.tell(), len(text))).rowcount:
+                            data.write(text)
+                            counts[db] += 1
+                finally:
+                    cache.close()
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(index_path + ".tmp", index_path)
+    return counts
+
+
+def read_entries(dump_path, terminator):
+    """
+    Function that reads a flat-file download one entry at a time.
+    :param dump_path:
+    text or byte string giving the name (and path) of the file, decompressed while it is read if it ends with '.gz'.
+    :param terminator:
+    string giving the line that ends an entry.
+    :return:
+    generator yielding strings containing the entries, including their terminator line.
+    """
+    opener = gzip.open if str(dump_path).endswith(".gz") else open
+    with opener(dump_path, mode="rt") as file:
+        lines = []
+        for line in file:
+            lines.append(line)
+            if line.rstrip() == terminator:
+                yield "".join(lines)
+                lines = []
+        if any(line.strip() for line in lines):
+            yield "".join(lines) + terminator + "\n"
+
+
+def kegg_entry_ids(entry, organism=None):
+    """
+    Function that takes the identifier of a KEGG gene entry, prefixed with the organism code.
+    :param entry:
+    string containing a KEGG flat-file entry.
+    :param organism:
+    string giving the KEGG organism code if the entry has no ORGANISM line, or None.
+    :return:
+    list with a string giving the identifier (e.g. 'lpl:lp_0001'), empty if the entry has no identifier or organism.
+    """
+    kegg_id = None
+    for line in entry.splitlines():
+        if line.startswith("ENTRY"):
+            fields = line.split()
+            kegg_id = fields[1] if len(fields) > 1 else None
+        elif line.startswith("ORGANISM"):
+            fields = line.split()
+            organism = fields[1] if len(fields) > 1 else organism
+            break
+    if kegg_id is None or organism is None:
+        return []
+    return ["{0}:{1}".format(organism, kegg_id)]
+
+
+def uniprot_entry_ids(entry):
+    """
+    Function that takes the accessions of a UniProt flat-file entry from its AC lines.
+    :param entry:
+    string containing a UniProt flat-file entry.
+    :return:
+    list of strings giving the accessions, the primary accession first.
+    """
+    accessions = []
+    for line in entry.splitlines():
+        if line.startswith("AC   "):
+            accessions.extend(accession.strip() for accession in line[5:].split(";") if accession.strip())
+        elif accessions:
+            # The AC lines follow each other, the rest of the entry has no accessions.
+            break
+    return accessions
@@ -0,0 +1,213 @@
+import cProfile
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Environment variable that enables profiling of a stage, set it to 'cprofile' or 'pyinstrument'.
+PROFILE_ENV = "BI11A_PROFILE"
+
+
+class Metrics:
+    """
+    Thread-safe collection of the timers and counters of a stage. Timers record the number of calls and the total and
+    maximum wall time per name (e.g. 'request.kegg' or 'io.write'), counters are summed per name (e.g. 'bytes.kegg' or
+    'cache.kegg.hits').
+    """
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, name, seconds):
+        """
+        Function that adds a measured wall time to a timer.
+        :param name:
+        string giving the name of the timer.
+        :param seconds:
+        number of seconds.
+        :return:
+        """
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Context manager that adds the wall time spent in its block to a timer.
+        :param name:
+        string giving the name of the timer.
+        :return:
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        """
+        Function that adds a value to a counter.
+        :param name:
+        string giving the name of the counter.
+        :param value:
+        number that is added.
+        :return:
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timed(self, name, iterable):
+        """
+        Function that adds the wall time spent producing every item of an iterable (e.g. reading a row) to a timer.
+        :param name:
+        string giving the name of the timer.
+        :param iterable:
+        iterable object.
+        :return:
+        generator yielding the items of the iterable.
+        """
+        iterator = iter(iterable)
+        seconds = 0.0
+        items = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - start
+                items += 1
+                yield item
+        finally:
+            # Added once at the end, a lock per item would cost more than reading it.
+            with self._lock:
+                timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+                timer[0] += items
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds / max(items, 1))
+
+    def snapshot(self):
+        """
+        Function that returns the current values of the timers and counters.
+        :return:
+        dictionary with a 'timers' dictionary (with the 'calls', 'seconds' and 'max_seconds' of every timer) and a
+        'counters' dictionary.
+        """
+        with self._lock:
+            return {"timers": {name: {"calls": calls, "seconds": round(seconds, 6), "max_seconds": round(longest, 6)}
+                               for name, (calls, seconds, longest) in sorted(self.timers.items())},
+                    "counters": dict(sorted(self.counters.items()))}
+
+
+# Metrics of the current process, recorded by the functions in local_functions and written by instrument().
+metrics = Metrics()
+
+
+def record_written(out_path, row_count, seconds):
+    """
+    Function that adds the number of rows written to a file and the time spent writing them to the metrics.
+    :param out_path:
+    text or byte string giving the name (and path) of the file.
+    :param row_count:
+    integer representing the number of rows (excluding the header).
+    :param seconds:
+    number of seconds spent writing.
+    :return:
+    """
+    metrics.count("rows.{0}".format(os.path.basename(out_path)), max(row_count, 0))
+    metrics.add_time("io.write", seconds)
+
+
+@contextmanager
+def instrument(stage, metrics_path=None):
+    """
+    Context manager that records the wall time of a stage and, if a path is given, writes the metrics of the stage to
+    a JSON file when it ends. Set the environment variable BI11A_PROFILE to 'cprofile' or 'pyinstrument' to also
+    profile the stage, the profile is written next to the metrics file (or to the working directory).
+    :param stage:
+    string giving the name of the stage (e.g. the name of the script).
+    :param metrics_path:
+    text or byte string giving the name (and path) of the JSON file, or None to not write the metrics.
+    :return:
+    """
+    profiler = _start_profiler()
+    started = datetime.datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        wall_seconds = time.perf_counter() - start
+        if profiler is not None:
+            _stop_profiler(profiler, os.path.splitext(metrics_path)[0] if metrics_path else stage)
+        if metrics_path:
+            # The rows of a stage are those of its largest output file.
+            rows = max((value for name, value in metrics.counters.items() if name.startswith("rows.")), default=0)
+            report = {"stage": stage,
+                      "command": sys.argv,
+                      "started": started,
+                      "wall_seconds": round(wall_seconds, 3),
+                      "rows": rows,
+                      "rows_per_second": round(rows / wall_seconds, 1) if wall_seconds else 0.0}
+            report.update(metrics.snapshot())
+            directory = os.path.dirname(metrics_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(metrics_path, mode="w") as file:
+                json.dump(report, file, indent=2)
+
+
+def _start_profiler():
+    kind = os.environ.get(PROFILE_ENV, "").lower()
+    if kind == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("{0}=pyinstrument requires pyinstrument, profiling is disabled.".format(PROFILE_ENV),
+                  file=sys.stderr)
+            return None
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    return None
+
+
+def _stop_profiler(profiler, base_path):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats("{0}.prof".format(base_path))
+    else:
+        profiler.stop()
+        with open("{0}.html".format(base_path), mode="w") as file:
+            file.write(profiler.output_html())
+
+
+def add_metrics_argument(parser):
+    """
+    Function that adds the --metrics-file commandline argument, which sets the file the metrics of the stage are written
+    to, to an argument parser.
+    :param parser:
+    argparse.ArgumentParser object.
+    :return:
+    """
+    parser.add_argument("--metrics-file",
+                        type=str,
+                        required=False,
+                        default=None,
+                        help="(absolute) path for a JSON file with the timings and counters of the run.")
@@ -0,0 +1,36 @@
+# KEGG organism code of the genes if the input does not give one, Lactobacillus plantarum WCFS1.
+DEFAULT_ORGANISM = "lpl"
+# Name of the optional input column giving the KEGG organism code of every gene.
+ORGANISM_COLUMN = "organism"
+
+
+def organism_getter(header, organism=DEFAULT_ORGANISM):
+    """
+    Function that creates a function returning the KEGG organism code of a row. This is the value in the ORGANISM_COLUMN
+    if the file has one and it is not empty, otherwise the given organism.
+    :param header:
+    list of strings representing the header row of a tabular file.
+    :param organism:
+    string giving the KEGG organism code of the genes without one in the file.
+    :return:
+    function that takes a row and returns the organism code of its gene.
+    """
+    if ORGANISM_COLUMN not in header:
+        return lambda line: organism
+    organism_index = header.index(ORGANISM_COLUMN)
+    return lambda line: line[organism_index].strip() or organism
+
+
+def add_organism_argument(parser):
+    """
+    Function that adds the commandline argument giving the KEGG organism code of the genes to an argument parser.
+    :param parser:
+    argparse.ArgumentParser object.
+    :return:
+    """
+    parser.add_argument("--organism",
+                        type=str,
+                        required=False,
+                        default=DEFAULT_ORGANISM,
+                        help="KEGG organism code of the genes (e.g. lpl, lpj or lps), used for the genes without one "
+                             "in the '{0}' column of the input file.".format(ORGANISM_COLUMN))
@@ -0,0 +1,68 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def job_count(jobs):
+    """
+    Function that turns the value of a --jobs argument into a number of processes.
+    :param jobs:
+    integer representing the number of processes, 0 uses one process per CPU.
+    :return:
+    integer representing the number of processes (at least 1).
+    """
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    return max(jobs, 1)
+
+
+def process_all(items, function, jobs=1):
+    """
+    Function that applies a (CPU bound) function to every item using a pool of processes. At most jobs * 2 items are
+    submitted at once so the input is not read entirely first, and results are yielded in the same order as the input.
+    Items and results are pickled to be sent between processes, so to keep the overhead small every item should
+    represent a chunk of work (e.g. a list of sequences, see chunked()) rather than a single row.
+    :param items:
+    iterable object, e.g. a generator of chunks.
+    :param function:
+    function that takes a single item and returns its result. Must be picklable, i.e. defined at the top level of a
+    module (or a functools.partial of such a function).
+    :param jobs:
+    integer representing the number of processes, 1 processes the items in the current process.
+    :return:
+    generator yielding the result of every item.
+    """
+    if jobs <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def add_jobs_argument(parser, chunk_size):
+    """
+    Function that adds the commandline arguments used to configure parallel processing to an argument parser.
+    :param parser:
+    argparse.ArgumentParser object.
+    :param chunk_size:
+    integer giving the default number of rows sent to a process at once.
+    :return:
+    """
+    parser.add_argument("--jobs",
+                        type=int,
+                        required=False,
+                        default=1,
+                        help="number of processes, 0 uses one process per CPU.")
+    parser.add_argument("--chunk-size",
+                        type=int,
+                        required=False,
+                        default=chunk_size,
+                        help="number of rows sent to a process at once.")
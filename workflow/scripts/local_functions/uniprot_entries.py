@@ -0,0 +1,103 @@
+import re
+
+from local_functions.cache import cached_fetch
+from local_functions.clients import uniprot_client
+from local_functions.fetching import FetchError, rate_limited
+from local_functions.metrics import metrics
+
+# Number of accessions per query to the UniProt stream endpoint, limited by the maximum length of the request URL.
+UNIPROT_BATCH_SIZE = 100
+
+# Only the fields used by the workflow are requested from the stream endpoint.
+UNIPROT_FIELDS = "accession,cc_function,lit_pubmed_id"
+
+ACCESSION_REGEX = re.compile("^[A-Z0-9]+$")
+
+
+def get_uniprot_entry(uniprot_id, cache=None, uniprot=None):
+    """
+    Function that uses a UniProt ID to query the UniProt database (or the cache) for the corresponding flat-file entry.
+    :param uniprot_id:
+    string giving the identifier of a UniProt database entry.
+    :param cache:
+    EntryCache object used to look up the entry before querying the database, or None to always query it.
+    :param uniprot:
+    bioservices UniProt object to query the database with, the shared client (see clients.uniprot_client()) is used if
+    None.
+    :return:
+    string containing the UniProt entry in flat-file format. A FetchError is raised if no entry was retrieved, e.g.
+    because the request failed or the entry is not cached while offline.
+    """
+    # The client is only created when the entry is not cached, creating it checks whether the database can be reached.
+    response = cached_fetch(cache, "uniprot", uniprot_id,
+                            lambda entry_id: rate_limited("uniprot", (uniprot or uniprot_client()).retrieve, entry_id,
+                                                          frmt="txt"))
+    if not isinstance(response, str):
+        raise FetchError("No UniProt entry retrieved for {0} ({1}).".format(uniprot_id, response))
+    return response
+
+
+def get_uniprot_annotations(uniprot_ids, cache=None, uniprot=None):
+    """
+    Function that retrieves the function and PubMed identifiers of multiple UniProt IDs with a single query to the
+    UniProt stream endpoint, requesting only these fields in TSV format. The results are cached per ID. IDs that are
+    not valid accessions or are missing from the response (e.g. secondary accessions or because the query failed) are
+    left out of the result so they can be retrieved one at a time.
+    :param uniprot_ids:
+    list of strings giving the identifiers of UniProt database entries.
+    :param cache:
+    EntryCache object used to look up the entries before querying the database, or None to always query it.
+    :param uniprot:
+    bioservices UniProt object to query the database with, the shared client (see clients.uniprot_client()) is used if
+    None.
+    :return:
+    dictionary where each key is a UniProt ID and each value a tuple of a string giving the gene function and a list
+    containing the PubMed identifiers.
+    """
+    rows = {}
+    missing = []
+    for uniprot_id in dict.fromkeys(uniprot_ids):
+        row = cache.get("uniprot_fields", uniprot_id) if cache is not None else None
+        if row is not None:
+            rows[uniprot_id] = row
+        elif ACCESSION_REGEX.match(uniprot_id) and (cache is None or not cache.offline):
+            missing.append(uniprot_id)
+
+    if missing:
+        if uniprot is None:
+            uniprot = uniprot_client()
+        params = {"query": "accession:({0})".format(" OR ".join(missing)), "fields": UNIPROT_FIELDS, "format": "tsv"}
+        try:
+            response = rate_limited("uniprot", uniprot.services.http_get, "uniprotkb/stream", frmt="txt", params=params)
+        except FetchError:
+            response = None
+        if isinstance(response, bytes):
+            response = response.decode()
+        if isinstance(response, str):
+            for row in response.splitlines()[1:]:
+                uniprot_id = row.split("\t", 1)[0]
+                if uniprot_id in missing:
+                    rows[uniprot_id] = row
+                    if cache is not None:
+                        cache.put("uniprot_fields", uniprot_id, row)
+
+    with metrics.timer("parse.uniprot"):
+        return {uniprot_id: parse_uniprot_fields(row) for uniprot_id, row in rows.items()}
+
+
+def parse_uniprot_fields(row):
+    """
+    Function that parses a row of a TSV response of the UniProt stream endpoint with the UNIPROT_FIELDS columns.
+    :param row:
+    string containing a tab separated row with the accession, function and PubMed identifiers.
+    :return:
+    a string giving the gene function and a list containing the PubMed identifiers.
+    """
+    fields = row.split("\t")
+    fields.extend([""] * (3 - len(fields)))
+
+    gene_function = fields[1].split("FUNCTION: ")[1] if "FUNCTION: " in fields[1] else ""
+    gene_function = re.sub(" +", " ", gene_function).strip().replace(";", ".")
+    pubmed_ids = [pubmed_id.strip() for pubmed_id in fields[2].split(";") if pubmed_id.strip()]
+
+    return gene_function, pubmed_ids
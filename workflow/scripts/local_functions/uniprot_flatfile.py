@@ -0,0 +1,78 @@
+# The lines of a flat-file entry are ordered by their code (ID, AC, DE, ..., RX, ..., CC, DR, PE, KW, FT, SQ), parsing
+# stops at the first line after the sections that are used.
+END_CODES = {"DR", "PE", "KW", "FT", "SQ", "//"}
+DETAILS_END_CODES = {"PE", "KW", "FT", "SQ", "//"}
+
+
+def parse_uniprot_entry(entry, details=False):
+    """
+    Function that parses a UniProt flat-file entry in a single pass over its lines, dispatching on the two-letter line
+    code. The function is the text of the first 'CC   -!- FUNCTION:' topic and the PubMed identifiers are taken from
+    the RX lines. With details the GO terms and other cross-references (DR lines) and the EC numbers (DE lines) are
+    collected in the same pass. The lines after the last section that is needed (e.g. the features and the sequence)
+    are not read.
+    :param entry:
+    string containing the UniProt entry in flat-file format, anything else (e.g. None or an error code returned for a
+    failed request) is parsed as an empty entry.
+    :param details:
+    boolean, if True the 'go_terms', 'ec_numbers' and 'xrefs' are also returned.
+    :return:
+    dictionary with a string giving the gene function under 'function' and a list containing the PubMed identifiers
+    under 'pubmed_ids'. With details also a list of GO identifiers under 'go_terms', a list of EC numbers under
+    'ec_numbers' and a dictionary with a list of identifiers per database under 'xrefs'.
+    """
+    function_words = []
+    pubmed_ids = []
+    go_terms = []
+    ec_numbers = []
+    xrefs = {}
+    # 0 before the FUNCTION topic, 1 inside it and 2 after it, only the first FUNCTION topic is used.
+    in_function = 0
+    end_codes = DETAILS_END_CODES if details else END_CODES
+
+    if not isinstance(entry, str):
+        entry = ""
+    # The lines are found by their offsets rather than split, so only the lines that are used are copied.
+    length = len(entry)
+    end = -1
+    while end < length:
+        start = end + 1
+        end = entry.find("\n", start)
+        if end == -1:
+            end = length
+        code = entry[start:start + 2]
+        if code in end_codes:
+            break
+        if code == "CC":
+            if entry.startswith("CC   -!- ", start, end):
+                if in_function == 1:
+                    in_function = 2
+                elif in_function == 0 and entry.startswith("CC   -!- FUNCTION: ", start, end):
+                    in_function = 1
+                    function_words.extend(entry[start + 19:end].split())
+            elif in_function == 1:
+                if entry.startswith("CC   ---", start, end):
+                    in_function = 2
+                else:
+                    function_words.extend(entry[start + 5:end].split())
+        elif code == "RX":
+            pubmed_start = entry.find("PubMed=", start, end)
+            if pubmed_start != -1:
+                pubmed_end = entry.find(";", pubmed_start, end)
+                if pubmed_end != -1:
+                    pubmed_ids.append(entry[pubmed_start + 7:pubmed_end])
+        elif details and code == "DR":
+            fields = entry[start + 5:end].split("; ")
+            if len(fields) > 1:
+                if fields[0] == "GO":
+                    go_terms.append(fields[1])
+                xrefs.setdefault(fields[0], []).append(fields[1].rstrip("."))
+        elif details and code == "DE":
+            ec_start = entry.find("EC=", start, end)
+            if ec_start != -1:
+                ec_numbers.append(entry[ec_start + 3:end].split(None, 1)[0].rstrip(";"))
+
+    parsed = {"function": " ".join(function_words).replace(";", "."), "pubmed_ids": pubmed_ids}
+    if details:
+        parsed.update({"go_terms": go_terms, "ec_numbers": ec_numbers, "xrefs": xrefs})
+    return parsed
@@ -0,0 +1,226 @@
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+# Number of seconds a detached worker is given to start listening.
+START_TIMEOUT = 60
+
+
+class WorkerUnavailable(Exception):
+    """
+    Exception raised when no worker is listening on a socket.
+    """
+
+
+def serve(socket_path, run, preload=()):
+    """
+    Function that runs a worker process listening on a Unix socket. The modules in preload are imported once, after
+    which every command that is received is run in a fork of the worker, so it starts with the modules already
+    imported but with its own state (metrics, rate limiters, working directory and environment). The command writes to
+    the standard streams of the client that sent it and its exit status is sent back. The worker stops when a client
+    sends a stop request (see stop()).
+    :param socket_path:
+    text or byte string giving the name (and path) of the socket.
+    :param run:
+    function that runs a command, called with the name of the command and a list of its arguments.
+    :param preload:
+    iterable object yielding the names of the modules to import before listening.
+    :return:
+    """
+    for module in preload:
+        try:
+            __import__(module)
+        except ImportError as e:
+            # The command fails with the same error when it is run.
+            print("Could not preload {0}: {1}".format(module, e), file=sys.stderr)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    # Finished commands are reaped by the kernel, the worker does not wait for them.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    stopping = None
+    try:
+        while True:
+            connection, _ = server.accept()
+            try:
+                request, fds = _receive(connection)
+            except (OSError, ValueError):
+                # Empty (e.g. from is_running()) or malformed request.
+                connection.close()
+                continue
+            if request.get("stop"):
+                # Closed once the socket is removed, which is what stop() waits for.
+                stopping = connection
+                break
+            if os.fork() == 0:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _run_request(connection, request, fds, run)
+            connection.close()
+            for fd in fds:
+                os.close(fd)
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        if stopping is not None:
+            stopping.close()
+
+
+def _receive(connection):
+    message, fds, _, _ = socket.recv_fds(connection, 1 << 20, 3)
+    while message and not message.endswith(b"\n"):
+        data = connection.recv(1 << 20)
+        if not data:
+            break
+        message += data
+    try:
+        return json.loads(message), fds
+    except ValueError:
+        for fd in fds:
+            os.close(fd)
+        raise
+
+
+def _run_request(connection, request, fds, run):
+    # Runs in the fork, which never returns to the accept loop of the worker.
+    code = 1
+    try:
+        for fd, target in zip(fds, (0, 1, 2)):
+            os.dup2(fd, target)
+            os.close(fd)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        # The command is stopped when the client goes away, e.g. when snakemake cancels the job.
+        threading.Thread(target=_stop_on_hangup, args=(connection,), daemon=True).start()
+        try:
+            run(request["command"], request["argv"])
+            code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException:
+            traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            connection.sendall(json.dumps({"code": code}).encode() + b"\n")
+        finally:
+            os._exit(code)
+
+
+def _stop_on_hangup(connection):
+    if not connection.recv(1):
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
+def submit(socket_path, command, argv):
+    """
+    Function that runs a command in the worker listening on a socket (see serve()). The command runs in the working
+    directory and with the environment of the calling process and writes to its standard streams.
+    :param socket_path:
+    text or byte string giving the name (and path) of the socket.
+    :param command:
+    string giving the name of the command.
+    :param argv:
+    list of strings giving the arguments of the command.
+    :return:
+    integer giving the exit status of the command.
+    """
+    connection = _connect(socket_path)
+    with connection:
+        request = {"command": command, "argv": list(argv), "cwd": os.getcwd(), "env": dict(os.environ)}
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(connection, [json.dumps(request).encode() + b"\n"],
+                        [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()])
+        reply = b""
+        while not reply.endswith(b"\n"):
+            data = connection.recv(1024)
+            if not data:
+                return 1
+            reply += data
+    return json.loads(reply)["code"]
+
+
+def stop(socket_path):
+    """
+    Function that stops the worker listening on a socket and returns once it no longer listens, so a new worker can
+    be started on the socket right away. Commands that are still running are finished.
+    :param socket_path:
+    text or byte string giving the name (and path) of the socket.
+    :return:
+    """
+    with _connect(socket_path) as connection:
+        socket.send_fds(connection, [json.dumps({"stop": True}).encode() + b"\n"], [])
+        connection.recv(1)
+
+
+def is_running(socket_path):
+    """
+    Function that checks whether a worker is listening on a socket.
+    :param socket_path:
+    text or byte string giving the name (and path) of the socket.
+    :return:
+    boolean, True if a worker is listening.
+    """
+    try:
+        _connect(socket_path).close()
+    except WorkerUnavailable:
+        return False
+    return True
+
+
+def _connect(socket_path):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError as e:
+        connection.close()
+        raise WorkerUnavailable("No worker is listening on {0} ({1}).".format(socket_path, e))
+    return connection
+
+
+def detach(socket_path, log_path, run, preload=()):
+    """
+    Function that starts a worker (see serve()) in the background and returns once it is listening.
+    :param socket_path:
+    text or byte string giving the name (and path) of the socket.
+    :param log_path:
+    text or byte string giving the name (and path) of the file the output of the worker itself is written to.
+    :param run:
+    function that runs a command, called with the name of the command and a list of its arguments.
+    :param preload:
+    iterable object yielding the names of the modules to import before listening.
+    :return:
+    """
+    if is_running(socket_path):
+        return
+    if os.fork() == 0:
+        os.setsid()
+        with open(log_path, mode="a") as log, open(os.devnull, mode="r") as devnull:
+            os.dup2(devnull.fileno(), 0)
+            os.dup2(log.fileno(), 1)
+            os.dup2(log.fileno(), 2)
+        try:
+            serve(socket_path, run, preload)
+        finally:
+            os._exit(0)
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while not is_running(socket_path):
+        if time.monotonic() > deadline:
+            sys.exit("The worker did not start within {0} seconds, see {1}.".format(START_TIMEOUT, log_path))
+        time.sleep(0.05)
@@ -0,0 +1,93 @@
+import argparse
+import sys
+
+from local_functions.local_functions import *
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.organisms import ORGANISM_COLUMN
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if len(args.input) != len(args.organisms):
+        sys.exit("Got {0} input files for {1} organisms, quitting.".format(len(args.input), len(args.organisms)))
+    with instrument("merge_organisms", args.metrics_file):
+        row_count = sum(row_count_hint(in_path) or 0 for in_path in args.input) or None
+        rows = merge([read_rows(in_path) for in_path in args.input], args.organisms)
+        write_rows(args.output, rows, row_count, desc="Merging organisms", out_format=args.format)
+
+
+def merge(shards, organisms):
+    """
+    Function that concatenates the rows of the tabular files of multiple organisms (see split_by_organism.py) into a
+    single file. If the files have no 'organism' column it is added after the first column (the KEGG ID), so genes
+    with the same ID in different organisms can still be told apart. Empty cells in the column are filled in with the
+    organism of the file. The file of a single organism is passed through unchanged, so the columns of the outputs
+    only change when multiple organisms are configured.
+    :param shards:
+    list of iterators yielding the header row followed by the other rows of a tabular file (see read_rows()).
+    :param organisms:
+    list of strings giving the KEGG organism code of the genes of each file.
+    :return:
+    generator yielding the header row followed by the rows of all files.
+    """
+    if len(shards) == 1:
+        yield from shards[0]
+        return
+
+    header = None
+    for rows, organism in zip(shards, organisms):
+        shard_header = next(rows)
+        add_column = ORGANISM_COLUMN not in shard_header
+        if add_column:
+            shard_header.insert(1, ORGANISM_COLUMN)
+        if header is None:
+            header = shard_header
+            yield header
+        elif shard_header != header:
+            sys.exit("The file of {0} does not have the same columns as the file of {1}, quitting.".format(
+                organism, organisms[0]))
+        organism_index = header.index(ORGANISM_COLUMN)
+        for line in rows:
+            if add_column:
+                line.insert(organism_index, organism)
+            elif not line[organism_index]:
+                line[organism_index] = organism
+            yield line
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input argument for the input files, one for each organism in
+    --organisms in the same order, and an --output argument for the output file. The input files must be tabular with
+    the same header row. The --format argument sets the format of the output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input', 'organisms', 'output', 'format' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Merge the files of multiple organisms into one file.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        nargs="+",
+                        required=True,
+                        help="(absolute) paths for the files of the organisms. First row must be a header.")
+    parser.add_argument("--organisms",
+                        type=lambda value: [organism.strip() for organism in value.split(",") if organism.strip()],
+                        required=True,
+                        help="comma separated KEGG organism codes of the input files, in the same order.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=True,
+                        help="(absolute) path for the output file.")
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
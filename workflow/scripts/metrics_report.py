@@ -0,0 +1,135 @@
+import argparse
+import glob
+import json
+import os
+import sys
+
+from local_functions.local_functions import *
+
+REPORT_COLUMNS = ["stage", "job", "started", "wall_seconds", "rows", "rows_per_second", "requests", "mean_request_ms",
+                  "max_request_ms", "request_wait_seconds", "bytes", "retries", "failures", "cache_hit_rate",
+                  "read_seconds", "write_seconds", "parse_seconds"]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    reports = read_reports(args.input)
+    if not reports:
+        sys.exit("No metrics files found in {0}, quitting.".format(args.input))
+    summary = [summarise(report) for report in reports]
+    write_to_csv(args.output, [REPORT_COLUMNS] + [[line[column] for column in REPORT_COLUMNS] for line in summary],
+                 len(summary) + 1)
+    print_summary(summary)
+
+
+def read_reports(metrics_dir):
+    """
+    Function that reads the JSON metrics files written by the stages of the pipeline (see metrics.instrument()).
+    :param metrics_dir:
+    text or byte string giving the directory containing the metrics files.
+    :return:
+    list of dictionaries with the metrics of every stage, in the order the stages were started. The name of the
+    metrics file (e.g. 'harvest_kegg.lpl') is added under 'job', to tell apart the jobs of a stage that is run once
+    per organism.
+    """
+    reports = []
+    for metrics_path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        with open(metrics_path, mode="r") as file:
+            try:
+                report = json.load(file)
+            except ValueError:
+                print("Skipping {0}, it is not a valid metrics file.".format(metrics_path), file=sys.stderr)
+                continue
+        if "stage" in report:
+            report["job"] = os.path.splitext(os.path.basename(metrics_path))[0]
+            reports.append(report)
+    return sorted(reports, key=lambda report: report.get("started", ""))
+
+
+def summarise(report):
+    """
+    Function that sums the timers and counters of a stage over the databases it queried.
+    :param report:
+    dictionary with the metrics of a stage as written by metrics.instrument().
+    :return:
+    dictionary with a value for every column in REPORT_COLUMNS.
+    """
+    timers = report.get("timers", {})
+    counters = report.get("counters", {})
+
+    def timer_total(prefix, field="seconds"):
+        return sum(timer[field] for name, timer in timers.items() if name.startswith(prefix))
+
+    def counter_total(prefix, suffix=""):
+        return sum(value for name, value in counters.items() if name.startswith(prefix) and name.endswith(suffix))
+
+    requests = timer_total("request.", "calls")
+    hits = counter_total("cache.", ".hits")
+    lookups = hits + counter_total("cache.", ".misses")
+    return {"stage": report["stage"],
+            "job": report.get("job", report["stage"]),
+            "started": report.get("started", ""),
+            "wall_seconds": report.get("wall_seconds", 0),
+            "rows": report.get("rows", 0),
+            "rows_per_second": report.get("rows_per_second", 0),
+            "requests": requests,
+            "mean_request_ms": round(timer_total("request.") / requests * 1000, 1) if requests else "",
+            "max_request_ms": round(max((timer["max_seconds"] for name, timer in timers.items()
+                                         if name.startswith("request.")), default=0) * 1000, 1) if requests else "",
+            "request_wait_seconds": round(timer_total("wait."), 3),
+            "bytes": counter_total("bytes."),
+            "retries": counter_total("retries."),
+            "failures": counter_total("failures."),
+            "cache_hit_rate": round(hits / lookups, 3) if lookups else "",
+            "read_seconds": round(timer_total("io.read"), 3),
+            "write_seconds": round(timer_total("io.write"), 3),
+            "parse_seconds": round(timer_total("parse."), 3)}
+
+
+def print_summary(summary):
+    """
+    Function that prints a short overview of the run, with the share of the total wall time spent in every stage.
+    :param summary:
+    list of dictionaries as returned by summarise().
+    :return:
+    """
+    total = sum(line["wall_seconds"] for line in summary)
+    print("{0:<24}{1:>12}{2:>8}{3:>12}{4:>12}{5:>10}".format("job", "seconds", "share", "rows", "rows/s",
+                                                             "requests"), file=sys.stderr)
+    for line in summary:
+        print("{0:<24}{1:>12.1f}{2:>8.0%}{3:>12}{4:>12.1f}{5:>10}".format(
+            line["job"], line["wall_seconds"], line["wall_seconds"] / total if total else 0, line["rows"],
+            line["rows_per_second"], line["requests"]), file=sys.stderr)
+    print("{0:<24}{1:>12.1f}".format("total", total), file=sys.stderr)
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input argument for the directory containing the metrics files
+    of the stages (see the --metrics-file argument of the other scripts) and an --output argument for the summary file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input' and 'output'.
+    """
+    parser = argparse.ArgumentParser(description="Summarise the metrics of the stages of a pipeline run",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        required=False,
+                        default="./results/metrics",
+                        help="(absolute) path for directory with the JSON metrics files of the stages.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=False,
+                        default="./results/run_summary.csv",
+                        help="(absolute) path for the output file.")
+
+    args = parser.parse_args(argv)
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import argparse
+import itertools
+import os
+import sys
+
+import numpy as np
+
+from local_functions.local_functions import *
+from local_functions.enrichment import open_pathway_index
+from local_functions.metrics import add_metrics_argument, instrument, metrics
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("pathway_enrichment", args.metrics_file):
+        if not os.path.exists(args.input) and not os.path.exists(args.index):
+            sys.exit("Neither {0} nor the pathway index {1} exists, quitting.".format(args.input, args.index))
+        index, cached = open_pathway_index(args.index, args.input, read_pathways)
+        metrics.count("pathway_index.hits" if cached else "pathway_index.builds")
+
+        names, gene_sets = [], []
+        if args.genes:
+            names.append("genes")
+            gene_sets.append(args.genes)
+        for gene_set_path in args.gene_sets:
+            add_gene_sets(names, gene_sets, read_gene_sets(gene_set_path))
+        if args.top_cited:
+            add_gene_sets(names, gene_sets, top_cited(args.input, args.top_cited))
+        if args.expression:
+            add_gene_sets(names, gene_sets, expression_gene_sets(args.expression, args.top_expressed,
+                                                                 args.differential_q))
+        if not gene_sets:
+            sys.exit("No gene sets given, use --genes, --gene-sets, --top-cited or --expression, quitting.")
+
+        results = index.enrichment(gene_sets)
+        keep = results["q_value"] <= args.max_q
+        rows = ([names[gene_set], index.pathways[pathway], set_size, pathway_size, overlap,
+                 round(fold_enrichment, 3), "{0:.4g}".format(p_value), "{0:.4g}".format(q_value)]
+                for gene_set, pathway, set_size, pathway_size, overlap, fold_enrichment, p_value, q_value
+                in zip(*(results[key][keep].tolist() for key in results)))
+        header = ["gene_set", "pathway", "set_size", "pathway_size", "overlap", "fold_enrichment", "p_value", "q_value"]
+        write_rows(args.output, itertools.chain([header], rows), int(keep.sum()), desc="Writing enrichment",
+                   out_format=args.format)
+
+
+def add_gene_sets(names, gene_sets, named_sets):
+    """
+    Function that appends named gene sets to the lists of names and gene sets.
+    :param names:
+    list of strings giving the names of the gene sets.
+    :param gene_sets:
+    list of lists of KEGG IDs.
+    :param named_sets:
+    iterable of tuples of a name and a list of KEGG IDs.
+    :return:
+    """
+    for name, kegg_ids in named_sets:
+        names.append(name)
+        gene_sets.append(kegg_ids)
+
+
+def read_pathways(data_path):
+    """
+    Function that reads the KEGG IDs and pathways of the genes in a tabular file.
+    :param data_path:
+    text or byte string giving the name (and path) of the tabular file with the columns 'KEGG_ID' and 'pathways'.
+    :return:
+    generator yielding rows consisting of a KEGG ID and the semicolon separated pathways of the gene.
+    """
+    rows = read_rows(data_path, columns=["KEGG_ID", "pathways"])
+    next(rows)
+    yield from tqdm(rows, desc="Indexing pathways", total=row_count_hint(data_path))
+
+
+def read_gene_sets(gene_set_path):
+    """
+    Function that reads gene sets from a tabular file with a header row, where the first column gives the name of the
+    gene set and the 'KEGG_ID' column the semicolon separated KEGG IDs of its genes, such as the files written by
+    cluster_pubmed.py and pubmed_cooccurrence.py.
+    :param gene_set_path:
+    text or byte string giving the name (and path) of the tabular file.
+    :return:
+    generator yielding tuples of the name of a gene set and a list of its KEGG IDs.
+    """
+    rows = read_rows(gene_set_path)
+    header = next(rows)
+    if "KEGG_ID" not in header:
+        sys.exit("The gene set file {0} has no KEGG_ID column, quitting.".format(gene_set_path))
+    kegg_id_index = header.index("KEGG_ID")
+    for line in rows:
+        yield line[0], [kegg_id for kegg_id in line[kegg_id_index].split(";") if kegg_id]
+
+
+def top_cited(data_path, count):
+    """
+    Function that takes the genes with the most PubMed IDs as a gene set.
+    :param data_path:
+    text or byte string giving the name (and path) of the tabular file with the columns 'KEGG_ID' and 'PubMed_ID'.
+    :param count:
+    integer representing the number of genes in the gene set.
+    :return:
+    list with a tuple of the name of the gene set ('top_cited') and a list of its KEGG IDs.
+    """
+    rows = read_rows(data_path, columns=["KEGG_ID", "PubMed_ID"])
+    next(rows)
+    cells = np.array(list(rows), dtype=str).reshape(-1, 2)
+    citations = np.char.count(cells[:, 1], ";") + (cells[:, 1] != "")
+    # A stable sort keeps the order of the file for genes with the same number of citations.
+    top = np.argsort(-citations, kind="stable")[:count]
+    return [("top_cited", cells[top[citations[top] > 0], 0].tolist())]
+
+
+def expression_gene_sets(expression_path, count, max_q):
+    """
+    Function that takes the most highly expressed genes of every condition and the differentially expressed genes
+    from the output of expression_analysis.py as gene sets.
+    :param expression_path:
+    text or byte string giving the name (and path) of the tabular file written by expression_analysis.py.
+    :param count:
+    integer representing the number of genes in the gene set of every condition, 0 leaves these gene sets out.
+    :param max_q:
+    float representing the maximum q-value of the differentially expressed genes.
+    :return:
+    list of tuples of the name of a gene set ('top_expressed.{condition}' and 'differential') and a list of its KEGG
+    IDs.
+    """
+    rows = read_rows(expression_path)
+    header = next(rows)
+    table = np.array(list(rows), dtype=str).reshape(-1, len(header))
+    kegg_ids = table[:, header.index("KEGG_ID")]
+
+    def values(column):
+        cells = table[:, header.index(column)].copy()
+        cells[cells == ""] = "nan"
+        return cells.astype(np.float64)
+
+    gene_sets = []
+    if count:
+        for column in header:
+            if column.startswith("mean_cpm."):
+                top = np.argsort(-np.nan_to_num(values(column), nan=-np.inf), kind="stable")[:count]
+                gene_sets.append(("top_expressed.{0}".format(column[len("mean_cpm."):]), kegg_ids[top].tolist()))
+    if "q_value" in header:
+        gene_sets.append(("differential", kegg_ids[values("q_value") <= max_q].tolist()))
+    return gene_sets
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input argument for the file with the pathways of the genes, an
+    --index argument for the pathway index built from it and an --output argument for the output file. The input file
+    must be tabular with a header row and the columns 'KEGG_ID' and 'pathways', the index is only rebuilt when the
+    input changes. The gene sets are given with --genes, read from the --gene-sets files, taken from the 'PubMed_ID'
+    column of the input with --top-cited or from the --expression file with --top-expressed and --differential-q. The
+    --max-q argument leaves out less significant results and the --format argument sets the format of the output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input', 'index', 'output', 'genes', 'gene_sets', 'top_cited',
+    'expression', 'top_expressed', 'differential_q', 'max_q', 'format' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Test which KEGG pathways are over-represented in sets of genes.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        required=False,
+                        default="./results/gc_content.csv",
+                        help="(absolute) path for file with KEGG identifiers and pathways. First row must be a header.")
+    parser.add_argument("--index",
+                        type=str,
+                        required=False,
+                        default="./results/.cache/pathway_index.npz",
+                        help="(absolute) path for the pathway index, which is built from the input when it is missing "
+                             "or the input has changed.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=False,
+                        default="./results/pathway_enrichment.csv",
+                        help="(absolute) path for the output file.")
+    parser.add_argument("--genes",
+                        type=lambda value: [kegg_id.strip() for kegg_id in value.split(",") if kegg_id.strip()],
+                        required=False,
+                        default=[],
+                        help="comma separated KEGG identifiers of a gene set called 'genes'.")
+    parser.add_argument("--gene-sets",
+                        type=str,
+                        nargs="+",
+                        default=[],
+                        help="(absolute) paths for files with a gene set per row: its name in the first column and "
+                             "its KEGG identifiers in the KEGG_ID column, e.g. ./results/pubmed_gene_clusters.csv.")
+    parser.add_argument("--top-cited",
+                        type=int,
+                        required=False,
+                        default=0,
+                        help="number of genes with the most PubMed identifiers in the input that form the gene set "
+                             "'top_cited'. 0 leaves it out.")
+    parser.add_argument("--expression",
+                        type=str,
+                        required=False,
+                        default=None,
+                        help="(absolute) path for the output of expression_analysis.py, the differentially expressed "
+                             "genes form the gene set 'differential'.")
+    parser.add_argument("--top-expressed",
+                        type=int,
+                        required=False,
+                        default=0,
+                        help="number of genes with the highest mean CPM of every condition in --expression that form "
+                             "the gene sets 'top_expressed.{condition}'. 0 leaves them out.")
+    parser.add_argument("--differential-q",
+                        type=float,
+                        required=False,
+                        default=0.05,
+                        help="maximum q-value of the differentially expressed genes in --expression.")
+    parser.add_argument("--max-q",
+                        type=float,
+                        required=False,
+                        default=1.0,
+                        help="maximum q-value of the pathways that are written, 1 writes every pathway that overlaps "
+                             "a gene set.")
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+    if args.top_cited < 0 or args.top_expressed < 0:
+        parser.error("--top-cited and --top-expressed must be at least 0.")
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import functools
+import os
+import sys
+
+from local_functions.local_functions import *
+from local_functions.gc_plots import (MAX_WIDTH, GCPlotter, fingerprint, is_up_to_date, parse_gc_row, plot_path,
+                                      render_chunk)
+from local_functions.metrics import add_metrics_argument, instrument, metrics
+from local_functions.processing import add_jobs_argument, job_count, process_all
+
+# Number of plots per chunk sent to a worker process.
+PLOT_CHUNK_SIZE = 32
+
+GC_COLUMNS = ["KEGG_ID", "gc_content", "gc_content_subsections"]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("plot_gc_content", args.metrics_file):
+        os.makedirs(args.output, exist_ok=True)
+        genes = plot_gc_content(read_rows(args.input, columns=GC_COLUMNS), args.output, args.window, args.step,
+                                args.max_width, job_count(args.jobs), args.chunk_size, row_count_hint(args.input),
+                                keep=bool(args.pdf or args.overview))
+
+        plotter = GCPlotter(args.window, args.step, args.max_width)
+        if args.pdf:
+            plotter.write_pdf(tqdm(genes, desc="Writing PDF"), args.pdf)
+        if args.overview:
+            plotter.write_overview(genes, args.overview)
+
+
+def plot_gc_content(rows, out_dir, window=10, step=None, max_width=MAX_WIDTH, jobs=1, chunk_size=PLOT_CHUNK_SIZE,
+                    row_count=None, keep=False):
+    """
+    Function that renders a PNG plot of the GC content of every gene, named after its KEGG ID, and writes an index of
+    the plots to 'index.tsv' in the output directory. Plots that were rendered from the same data and settings before
+    are skipped, the other plots are divided over a pool of processes.
+    :param rows:
+    iterator yielding the header row followed by the 'KEGG_ID', 'gc_content' and 'gc_content_subsections' cells of
+    every gene (see read_rows()).
+    :param out_dir:
+    text or byte string giving the directory the plots are written to.
+    :param window:
+    integer representing the size of the subsections.
+    :param step:
+    integer representing the distance between the starts of consecutive subsections, defaults to the window size.
+    :param max_width:
+    integer representing the maximum width of a plot in pixels.
+    :param jobs:
+    integer representing the number of processes.
+    :param chunk_size:
+    integer representing the number of plots sent to a process at once.
+    :param row_count:
+    integer representing the number of genes, used for the progressbar, or None if it is not known.
+    :param keep:
+    boolean, if True the parsed genes are returned to be plotted again (e.g. to a PDF file).
+    :return:
+    list of tuples of the KEGG ID, total GC percentage and subsections of every plotted gene if keep is True, otherwise
+    an empty list.
+    """
+    if next(rows) != GC_COLUMNS:
+        sys.exit("The file does not contain a valid header, quitting.")
+
+    settings = (window, step or window, max_width)
+    kept = []
+    index = [["KEGG_ID", "plot"]]
+    up_to_date = 0
+
+    def pending():
+        nonlocal up_to_date
+        for row in tqdm(rows, desc="Plotting", total=row_count):
+            gene = parse_gc_row(row)
+            if gene is None:
+                continue
+            if keep:
+                kept.append(gene)
+            path = plot_path(out_dir, gene[0])
+            index.append([gene[0], os.path.basename(path)])
+            digest = fingerprint(gene, settings)
+            if is_up_to_date(path, digest):
+                up_to_date += 1
+                continue
+            yield gene, digest
+
+    render = functools.partial(render_chunk, out_dir=out_dir, window=window, step=step, max_width=max_width)
+    rendered = sum(process_all(chunked(pending(), chunk_size), render, jobs))
+    write_to_csv(os.path.join(out_dir, "index.tsv"), index, len(index))
+    metrics.count("plots.rendered", rendered)
+    metrics.count("plots.up_to_date", up_to_date)
+    print("Rendered {0} plots, {1} were up to date.".format(rendered, up_to_date), file=sys.stderr)
+    return kept
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input and --output argument for an input file and output
+    directory respectively. The input file must be tabular (tsv or Parquet) with a header row and the columns 'KEGG_ID',
+    'gc_content' and 'gc_content_subsections' as written by calculate_gc_content.py. The --window and --step arguments
+    must match the ones the GC content was calculated with, the --max-width argument limits the width of the plots and
+    the --jobs and --chunk-size arguments set the number of processes and the number of plots sent to a process at
+    once. The optional --pdf and --overview arguments also write all plots to a multi-page PDF file and a tiled
+    overview respectively.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input', 'output', 'window', 'step', 'max_width', 'jobs', 'chunk_size',
+    'pdf', 'overview' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Create plots for GC content.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        required=False,
+                        default="./results/gc_content.csv",
+                        help="(absolute) path for file with GC content of sequences. First row must be a header.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=False,
+                        default="./results/gc_plots",
+                        help="(absolute) path for directory where the plots should be put.")
+    parser.add_argument("--window",
+                        type=int,
+                        required=False,
+                        default=10,
+                        help="size of the subsections in nucleotides.")
+    parser.add_argument("--step",
+                        type=int,
+                        required=False,
+                        default=None,
+                        help="distance between the starts of consecutive subsections, defaults to the window size.")
+    parser.add_argument("--max-width",
+                        type=int,
+                        required=False,
+                        default=MAX_WIDTH,
+                        help="maximum width of a plot in pixels, the width grows with the length of the sequence.")
+    parser.add_argument("--pdf",
+                        type=str,
+                        required=False,
+                        default=None,
+                        help="(absolute) path for a multi-page PDF file with one plot per page.")
+    parser.add_argument("--overview",
+                        type=str,
+                        required=False,
+                        default=None,
+                        help="(absolute) path for a PDF file with a tiled overview of all plots.")
+    add_jobs_argument(parser, PLOT_CHUNK_SIZE)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+    if args.window < 1 or (args.step is not None and args.step < 1) or args.max_width < 1:
+        parser.error("--window, --step and --max-width must be at least 1.")
+    if args.jobs < 0 or args.chunk_size < 1:
+        parser.error("--jobs must be at least 0 and --chunk-size at least 1.")
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
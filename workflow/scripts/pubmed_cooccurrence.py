@@ -0,0 +1,104 @@
+import argparse
+import itertools
+
+from local_functions.local_functions import *
+from local_functions.cooccurrence import gene_clusters, gene_pairs, incidence_matrix
+from local_functions.metrics import add_metrics_argument, instrument
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("pubmed_cooccurrence", args.metrics_file):
+        matrix, kegg_ids, pubmed_ids = read_incidence(args.input, args.max_genes)
+        first, second, counts, jaccard = gene_pairs(matrix, args.min_shared, args.min_jaccard)
+
+        pairs = ([kegg_ids[a], kegg_ids[b], count, round(similarity, 4)]
+                 for a, b, count, similarity in zip(first, second, counts.tolist(), jaccard.tolist()))
+        write_rows(args.output, itertools.chain([["KEGG_ID_1", "KEGG_ID_2", "shared_PubMed_IDs", "jaccard"]], pairs),
+                   len(counts), desc="Writing pairs", out_format=args.format)
+
+        clusters = [[number, len(cluster), ";".join(kegg_ids[gene] for gene in cluster)]
+                    for number, cluster in enumerate(gene_clusters(len(kegg_ids), first, second), start=1)]
+        write_rows(args.clusters, [["cluster", "size", "KEGG_ID"]] + clusters, len(clusters),
+                   desc="Writing clusters", out_format=args.format)
+
+
+def read_incidence(data_path, max_genes=0):
+    """
+    Function that reads the KEGG and PubMed identifiers of a tabular file into a sparse gene x PubMed incidence
+    matrix.
+    :param data_path:
+    text or byte string giving the name (and path) of the tabular file containing PubMed and KEGG identifiers.
+    :param max_genes:
+    integer, articles associated with more genes than this are left out. 0 keeps all articles.
+    :return:
+    scipy.sparse CSR matrix with a row per gene and a column per article, a list of the KEGG IDs of the rows and a list
+    of the PubMed IDs of the columns.
+    """
+    rows = read_rows(data_path, columns=["KEGG_ID", "PubMed_ID"])
+    next(rows)
+    return incidence_matrix(tqdm(rows, desc="Reading file", total=row_count_hint(data_path)), max_genes)
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input argument for an input file and an --output and
+    --clusters argument for the gene pairs and clusters output files respectively. The input file must be tabular with
+    a header row and the columns 'KEGG_ID' and 'PubMed_ID' containing valid KEGG and PubMed identifiers (cells can be
+    left empty). The --min-shared and --min-jaccard arguments set the minimum number of shared articles and Jaccard
+    similarity of the pairs that are written, the --max-genes argument leaves out articles about many genes and the
+    --format argument sets the format of the output files.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input', 'output', 'clusters', 'min_shared', 'min_jaccard', 'max_genes',
+    'format' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Find the pairs and clusters of genes that appear in the same PubMed "
+                                                 "publications",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        required=False,
+                        default="./results/uniprot.csv",
+                        help="(absolute) path for file with PubMed identifiers. First row must be a header.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=False,
+                        default="./results/pubmed_pairs.csv",
+                        help="(absolute) path for the output file with the gene pairs.")
+    parser.add_argument("--clusters",
+                        type=str,
+                        required=False,
+                        default="./results/pubmed_gene_clusters.csv",
+                        help="(absolute) path for the output file with the clusters of connected genes.")
+    parser.add_argument("--min-shared",
+                        type=int,
+                        required=False,
+                        default=1,
+                        help="minimum number of PubMed identifiers a pair of genes must share.")
+    parser.add_argument("--min-jaccard",
+                        type=float,
+                        required=False,
+                        default=0.0,
+                        help="minimum Jaccard similarity (shared articles divided by the articles of either gene) of "
+                             "a pair of genes.")
+    parser.add_argument("--max-genes",
+                        type=int,
+                        required=False,
+                        default=0,
+                        help="leave out articles associated with more genes than this, e.g. genome papers. 0 keeps "
+                             "all articles.")
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+    if args.min_shared < 1 or not 0 <= args.min_jaccard <= 1 or args.max_genes < 0:
+        parser.error("--min-shared must be at least 1, --min-jaccard between 0 and 1 and --max-genes at least 0.")
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,133 @@
 import argparse
+import heapq
+import os
 import sys
+import tempfile
 
 from local_functions.local_functions import *
+from local_functions.metrics import add_metrics_argument, instrument
 
 
-def main():
-    args = parse_args()
-    data, row_count = sort(args.input)
-    write_to_csv(args.output, data, row_count)
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("sort_by_pubmed", args.metrics_file):
+        row_count = row_count_hint(args.input)
+        if args.top and row_count is not None:
+            row_count = min(args.top, row_count)
+        rows = sort(read_rows(args.input), args.top, args.max_rows, os.path.dirname(os.path.abspath(args.output)))
+        write_rows(args.output, rows, row_count, desc="Sorting", out_format=args.format)
 
 
-def sort(data_path):
+def sort(rows, top=0, max_rows=0, tmp_dir=None):
     """
-    Function that parses a tabular file for PubMed identifiers and sorts the rows by descending order of the number of
-    PubMed identifiers of each gene.
-    :param data_path:
-    text or byte string giving the name (and path) of the tabular file containing PubMed identifiers.
+    Function that sorts the rows of a tabular file by descending order of the number of PubMed identifiers of each
+    gene. The sort is stable: genes with the same number of PubMed identifiers keep the order of the input. The number
+    of PubMed identifiers is counted once per row and the rows are sorted with a bucket sort, as the counts are small
+    integers. With top only the first rows of the sorted file are kept, using a heap that never holds more than that
+    number of rows. With max_rows the input is sorted in runs of at most that number of rows, which are written to
+    temporary files and merged, so the input never has to be held in memory as a whole.
+    :param rows:
+    iterator yielding the header row followed by the other rows of a tabular file containing PubMed identifiers (see
+    read_rows()).
+    :param top:
+    integer representing the number of rows to keep, 0 keeps all rows.
+    :param max_rows:
+    integer representing the maximum number of rows held in memory, 0 sorts the input in memory at once.
+    :param tmp_dir:
+    text or byte string giving the directory the temporary files are written to, defaults to the system default.
     :return:
-    nested list [[],[],etc] containing the contents of the input file with the inner lists being sorted from most PubMed
-    identifiers to least (excluding the header which remains the first inner list in the outer list).
-    Integer representing the number of rows in the input file.
+    generator yielding the header row followed by the sorted rows.
     """
-    data = []
-    to_sort = []
-    with open(data_path, mode="r") as file:
-        row_count = count_lines(file)
-        csvReader = csv.reader(file, dialect="excel", delimiter="\t")
-
-        header = csvReader.__next__()
-        if header[0] == "KEGG_ID":
-            header.extend(["PubMed_ID_count"])
-            data.append(header)
-            pubmed_id_index = header.index("PubMed_ID")
+    header = next(rows)
+    if header[0] == "KEGG_ID":
+        yield header
+        pubmed_id_index = header.index("PubMed_ID")
+    else:
+        sys.exit("The file does not contain a valid header, quitting.")
+
+    def pubmed_count(line):
+        pubmed_ids = line[pubmed_id_index]
+        return pubmed_ids.count(";") + 1 if pubmed_ids else 0
+
+    if top:
+        # Equivalent to the first rows of the stable sort, but only holds top rows at a time.
+        yield from heapq.nlargest(top, rows, key=pubmed_count)
+    elif max_rows:
+        yield from merge_sort(rows, pubmed_count, max_rows, tmp_dir)
+    else:
+        yield from bucket_sort(rows, pubmed_count)
+
+
+def bucket_sort(rows, count):
+    """
+    Function that sorts rows by descending order of a small integer key with a stable bucket sort.
+    :param rows:
+    iterable object yielding rows.
+    :param count:
+    function that returns the (non-negative) integer key of a row.
+    :return:
+    list of the rows sorted from the highest to the lowest key.
+    """
+    buckets = {}
+    for line in rows:
+        key = count(line)
+        if key in buckets:
+            buckets[key].append(line)
         else:
-            sys.exit("The file does not contain a valid header, quitting.")
-
-        for line in tqdm(csvReader, desc="Reading file", total=row_count - 1):
-            pubmed_ids = line[pubmed_id_index]
-            if pubmed_ids:
-                pubmed_count = len(pubmed_ids.split(";"))
-                line.extend([pubmed_count])
-            else:
-                line.extend([0])
-            to_sort.append(line)
-
-    sorted_data = sorted(to_sort, key=lambda x: x[data[0].index("PubMed_ID_count")], reverse=True)
-    data.extend(sorted_data)
-
-    for row in data:
-        row.pop(-1)
+            buckets[key] = [line]
 
-    return data, row_count
+    sorted_rows = []
+    for key in sorted(buckets, reverse=True):
+        sorted_rows.extend(buckets[key])
+    return sorted_rows
 
 
-def parse_args():
+def merge_sort(rows, count, max_rows, tmp_dir=None):
+    """
+    Function that sorts rows that may not fit in memory by descending order of a small integer key. The rows are
+    sorted in runs of at most max_rows rows (see bucket_sort()) which are written to temporary files, after which the
+    runs are merged. Rows with the same key come from earlier runs first, so the sort is stable.
+    :param rows:
+    iterable object yielding rows.
+    :param count:
+    function that returns the (non-negative) integer key of a row.
+    :param max_rows:
+    integer representing the maximum number of rows per run.
+    :param tmp_dir:
+    text or byte string giving the directory the temporary files are written to, defaults to the system default.
+    :return:
+    generator yielding the sorted rows.
+    """
+    with tempfile.TemporaryDirectory(prefix="sort_by_pubmed_", dir=tmp_dir) as run_dir:
+        run_paths = []
+        for number, run in enumerate(chunked(rows, max_rows)):
+            run_path = os.path.join(run_dir, "{0}.tsv".format(number))
+            with open(run_path, mode="w", newline="") as file:
+                csv.writer(file, dialect="excel", delimiter="\t").writerows(bucket_sort(run, count))
+            run_paths.append(run_path)
+
+        runs = []
+        try:
+            for run_path in run_paths:
+                runs.append(open(run_path, mode="r", newline=""))
+            yield from heapq.merge(*(csv.reader(file, dialect="excel", delimiter="\t") for file in runs),
+                                   key=lambda line: -count(line))
+        finally:
+            for file in runs:
+                file.close()
+
+
+def parse_args(argv=None):
     """
     Function that parses commandline strings. Has an --input and --output argument for an input file and output file
     respectively. The input file must be tabular with a header row and a column called 'PubMed_ID' containing valid
-    PubMed identifiers (cells can be left empty).
+    PubMed identifiers (cells can be left empty). The --top argument only keeps the genes with the most PubMed
+    identifiers, the --max-rows argument limits the number of rows held in memory and the --format argument sets the
+    format of the output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
     :return:
-    Argument parser object with the arguments 'input' and 'output'.
+    Argument parser object with the arguments 'input', 'output', 'top', 'max_rows', 'format' and 'metrics_file'.
     """
     parser = argparse.ArgumentParser(description="Sort the genes by the number of associated PubMed identifiers",
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -74,10 +142,27 @@ def parse_args():
                         required=False,
                         default="./results/sorted_by_pubmed.csv",
                         help="(absolute) path for the output file.")
+    parser.add_argument("--top",
+                        type=int,
+                        required=False,
+                        default=0,
+                        help="only write the given number of genes with the most PubMed identifiers, 0 writes all "
+                             "genes.")
+    parser.add_argument("--max-rows",
+                        type=int,
+                        required=False,
+                        default=0,
+                        help="maximum number of rows held in memory, larger inputs are sorted in runs that are "
+                             "written to temporary files and merged. 0 sorts the input in memory.")
+    add_format_argument(parser)
+    add_metrics_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.top < 0 or args.max_rows < 0:
+        parser.error("--top and --max-rows must be at least 0.")
 
     return args
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+
+from local_functions.local_functions import *
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.organisms import organism_getter
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("split_by_organism", args.metrics_file):
+        counts = split(read_rows(args.input), args.organisms, args.output, row_count_hint(args.input))
+        for organism, count in counts.items():
+            print("{0}: {1} genes".format(organism, count), file=sys.stderr)
+
+
+def split(rows, organisms, out_pattern, row_count=None):
+    """
+    Function that divides the rows of a tabular file over one file per organism, so the genes of every organism can be
+    processed by a separate job. The organism of a row is taken from the 'organism' column, rows without one (or all
+    rows if the file has no such column) belong to the first organism. A file is written for every organism, also if
+    it has no genes, and the rows keep the columns and order of the input.
+    :param rows:
+    iterator yielding the header row followed by the other rows of a tabular file containing KEGG IDs (see read_rows()).
+    :param organisms:
+    list of strings giving the KEGG organism codes to write a file for.
+    :param out_pattern:
+    string giving the name (and path) of the output files, in which '{organism}' is replaced by the organism code.
+    :param row_count:
+    integer representing the number of rows in the input file (excluding the header), or None if it is not known.
+    :return:
+    dictionary where each key is an organism code and each value the number of rows written for it.
+    """
+    header = next(rows)
+    organism_of = organism_getter(header, organisms[0])
+    counts = dict.fromkeys(organisms, 0)
+    unknown = set()
+    writers = {}
+    try:
+        for organism in organisms:
+            out_path = out_pattern.format(organism=organism)
+            directory = os.path.dirname(out_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            writers[organism] = RowWriter(out_path)
+            writers[organism].writerow(header)
+        for line in tqdm(rows, desc="Splitting by organism", total=row_count):
+            organism = organism_of(line)
+            if organism in writers:
+                writers[organism].writerow(line)
+                counts[organism] += 1
+            else:
+                unknown.add(organism)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    if unknown:
+        sys.exit("The input contains genes of the organisms {0}, which are not in {1}, quitting.".format(
+            ", ".join(sorted(unknown)), ", ".join(organisms)))
+    return counts
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input argument for an input file and an --output argument with
+    the pattern for the output files, one per organism in --organisms. The input file must be tabular with a header
+    row, an optional 'organism' column gives the KEGG organism code of every gene.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input', 'output', 'organisms' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Split the genes into one file per organism.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        required=False,
+                        default="./data/RNA-Seq-counts.txt",
+                        help="(absolute) path for file with KEGG identifiers. First row must be a header.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=False,
+                        default="./results/organisms/{organism}/counts.csv",
+                        help="(absolute) path for the output files, '{organism}' is replaced by the organism code.")
+    parser.add_argument("--organisms",
+                        type=lambda value: [organism.strip() for organism in value.split(",") if organism.strip()],
+                        required=True,
+                        help="comma separated KEGG organism codes (e.g. lpl,lpj,lps). Genes without an organism in "
+                             "the input belong to the first.")
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+    if not args.organisms:
+        parser.error("--organisms must give at least one organism code.")
+    if "{organism}" not in args.output and len(args.organisms) > 1:
+        parser.error("--output must contain '{organism}' when splitting over more than one organism.")
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+
+from local_functions.local_functions import *
+from local_functions.cache import add_cache_arguments, journal_ttl, open_cache
+from local_functions.checkpoint import FetchJournal, add_journal_arguments
+from local_functions.fetching import add_fetch_arguments, run_ahead, set_rate_limit
+from local_functions.kegg_entries import KEGG_BATCH_SIZE
+from local_functions.metrics import add_metrics_argument, instrument
+from local_functions.organisms import add_organism_argument
+from local_functions.uniprot_entries import UNIPROT_BATCH_SIZE
+from kegg_harvest import harvest_kegg, write_outputs
+from uniprot import uniprot
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("stream_fetch", args.metrics_file):
+        cache = open_cache(args)
+        set_rate_limit("kegg", args.kegg_rate, args.kegg_rate_file)
+        set_rate_limit("uniprot", args.uniprot_rate, args.uniprot_rate_file)
+        with open_writer(args.kegg_output, args.format) as kegg_writer, \
+                RowWriter(args.alt_id_output) as alt_id_writer:
+            rows = stream_fetch(read_rows(args.input), cache, kegg_writer, alt_id_writer, args)
+            write_rows(args.output, rows, row_count_hint(args.input), desc="Retrieving data", out_format=args.format)
+
+
+def stream_fetch(rows, cache, kegg_writer, alt_id_writer, args):
+    """
+    Function that retrieves the KEGG and UniProt data of the genes in a single pipeline of generators, instead of
+    running kegg_harvest.py and uniprot.py one after the other. The KEGG stage runs in a background thread (see
+    fetching.run_ahead()) and writes its rows to the KEGG and alternate identifiers outputs as they are produced, the
+    UniProt stage starts on the first rows right away, so its requests overlap with those of the KEGG stage. Each stage
+    keeps its own journal, so an interrupted pipeline resumes like the separate scripts do.
+    :param rows:
+    iterator yielding the header row followed by the other rows of a tabular file containing KEGG IDs (see read_rows()).
+    :param cache:
+    EntryCache or LocalStore object shared by both stages, or None to always query the databases.
+    :param kegg_writer:
+    RowWriter or ParquetRowWriter object for the output file of the KEGG stage.
+    :param alt_id_writer:
+    RowWriter object for the alternate identifiers output of the KEGG stage.
+    :param args:
+    Argument parser object with the arguments of the script (see parse_args()).
+    :return:
+    generator yielding the header row followed by the rows of the input along with the data of both stages.
+    """
+    kegg_journal = FetchJournal(args.kegg_output, refresh=args.refresh, organism=args.organism,
+                                 ttl=journal_ttl(args))
+    kegg_rows = kegg_journal.resume(rows, lambda rows: harvest_kegg(rows, cache, args.kegg_batch_size,
+                                                                    args.kegg_workers, kegg_journal.failures,
+                                                                    args.organism))
+    kegg_rows = run_ahead(write_outputs(kegg_rows, kegg_writer, alt_id_writer, args.no_nt_seq), args.buffer)
+
+    uniprot_journal = FetchJournal(args.output, ["KEGG_ID", "UniProt_ID"], args.refresh, ttl=journal_ttl(args))
+    return uniprot_journal.resume(kegg_rows, lambda rows: uniprot(rows, cache, args.uniprot_workers,
+                                                                  args.uniprot_batch_size, uniprot_journal.failures))
+
+
+def parse_args(argv=None):
+    """
+    Function that parses commandline strings. Has an --input argument for an input file, a --kegg-output and
+    --alt-id-output argument for the outputs of the KEGG stage (as written by kegg_harvest.py) and an --output argument
+    for the output of the UniProt stage (as written by uniprot.py). The input file must be tabular with a header row and
+    the first column must be called 'ID' and contain valid KEGG identifiers, an optional 'organism' column gives the
+    KEGG organism code of every gene (--organism for genes without one). The --kegg-* and --uniprot-* arguments set the
+    batch size, workers, rate and rate file of each stage and the --buffer argument the number of rows the KEGG stage
+    may run ahead of the UniProt stage. The --cache, --cache-ttl, --cache-size and --offline arguments configure the
+    entry cache, with --source local the entries are read from the --store instead. The --refresh argument disables
+    reusing the results of previous runs, --no-nt-seq leaves the sequences out of the KEGG output and the --format
+    argument sets the format of the KEGG and UniProt outputs.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
+    :return:
+    Argument parser object with the arguments 'input', 'kegg_output', 'alt_id_output', 'output', 'kegg_batch_size',
+    'uniprot_batch_size', 'buffer', 'no_nt_seq', 'organism', 'kegg_workers', 'kegg_rate', 'kegg_rate_file',
+    'uniprot_workers', 'uniprot_rate', 'uniprot_rate_file', 'cache', 'cache_ttl', 'cache_size', 'offline', 'source',
+    'store', 'refresh', 'format' and 'metrics_file'.
+    """
+    parser = argparse.ArgumentParser(description="Get the KEGG and UniProt data of the genes in one streaming "
+                                                 "pipeline.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--input",
+                        type=str,
+                        required=False,
+                        default="./data/RNA-Seq-counts.txt",
+                        help="(absolute) path for file with KEGG identifiers. First row must be a header and first "
+                             "column must contain KEGG identifiers.")
+    parser.add_argument("--kegg-output",
+                        type=str,
+                        required=False,
+                        default="./results/kegg.csv",
+                        help="(absolute) path for the output file with all data retrieved from KEGG.")
+    parser.add_argument("--alt-id-output",
+                        type=str,
+                        required=False,
+                        default="./results/alternate_identifiers.csv",
+                        help="(absolute) path for the output file with only the UniProt and NCBI identifiers.")
+    parser.add_argument("--output",
+                        type=str,
+                        required=False,
+                        default="./results/uniprot.csv",
+                        help="(absolute) path for the output file with the data of both stages.")
+    parser.add_argument("--kegg-batch-size",
+                        type=int,
+                        required=False,
+                        default=KEGG_BATCH_SIZE,
+                        choices=range(1, KEGG_BATCH_SIZE + 1),
+                        metavar="[1-{}]".format(KEGG_BATCH_SIZE),
+                        help="number of KEGG entries retrieved per request (1 retrieves every entry separately).")
+    parser.add_argument("--uniprot-batch-size",
+                        type=int,
+                        required=False,
+                        default=UNIPROT_BATCH_SIZE,
+                        help="number of rows retrieved per UniProt query (1 retrieves every entry separately).")
+    parser.add_argument("--buffer",
+                        type=int,
+                        required=False,
+                        default=1024,
+                        help="number of rows the KEGG stage may run ahead of the UniProt stage.")
+    parser.add_argument("--no-nt-seq",
+                        action="store_true",
+                        help="leave the nt_seq column empty, e.g. when the sequences are taken from a reference "
+                             "genome by calculate_gc_content.py.")
+    add_organism_argument(parser)
+    add_fetch_arguments(parser, "kegg", "kegg-")
+    add_fetch_arguments(parser, "uniprot", "uniprot-")
+    add_cache_arguments(parser)
+    add_journal_arguments(parser)
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+
+    args = parser.parse_args(argv)
+    if args.buffer < 1:
+        parser.error("--buffer must be at least 1.")
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
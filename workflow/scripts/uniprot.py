@@ -1,91 +1,126 @@
 import argparse
 import sys
-import re
 
-from bioservices import UniProt
 from local_functions.local_functions import *
-
-
-def main():
-    args = parse_args()
-    data, row_count = uniprot(args.input)
-    write_to_csv(args.output, data, row_count)
-
-
-def uniprot(data_path):
+from local_functions.cache import add_cache_arguments, journal_ttl, open_cache
+from local_functions.checkpoint import FetchJournal, add_journal_arguments
+from local_functions.clients import uniprot_client
+from local_functions.fetching import FetchError, add_fetch_arguments, fetch_all, set_rate_limit
+from local_functions.metrics import add_metrics_argument, instrument, metrics
+from local_functions.uniprot_entries import UNIPROT_BATCH_SIZE, get_uniprot_annotations, get_uniprot_entry
+from local_functions.uniprot_flatfile import parse_uniprot_entry
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrument("uniprot", args.metrics_file):
+        cache = open_cache(args)
+        set_rate_limit("uniprot", args.rate, args.rate_file)
+        journal = FetchJournal(args.output, ["KEGG_ID", "UniProt_ID"], args.refresh, ttl=journal_ttl(args))
+        rows = journal.resume(read_rows(args.input),
+                              lambda rows: uniprot(rows, cache, args.workers, args.batch_size, journal.failures))
+        write_rows(args.output, rows, row_count_hint(args.input), desc="Retrieving data", out_format=args.format)
+
+
+def uniprot(rows, cache=None, workers=1, batch_size=UNIPROT_BATCH_SIZE, failures=None):
     """
-    Function that parses a tabular file for UniProt IDs and appends the corresponding function and PubMed identifiers to
-    the rows in the columns 'gene_function' and 'PubMed_ID'.
-    :param data_path:
-    text or byte string giving the name (and path) of the tabular file containing UniProt identifiers.
+    Function that takes the rows of a tabular file with UniProt IDs and appends the corresponding function and PubMed
+    identifiers to the rows in the columns 'gene_function' and 'PubMed_ID'. The data of batch_size rows is retrieved
+    with a single query, IDs missing from the batch response are retrieved one at a time. Rows are yielded as soon as
+    their data is retrieved.
+    :param rows:
+    iterator yielding the header row followed by the other rows of a tabular file containing UniProt identifiers (see
+    read_rows()).
+    :param cache:
+    EntryCache object used to look up UniProt entries before querying the database, or None to always query it.
+    :param workers:
+    integer representing the number of requests that are sent concurrently.
+    :param batch_size:
+    integer representing the number of rows retrieved per query (1 retrieves every entry separately).
+    :param failures:
+    set to which the KEGG IDs of rows whose UniProt entry could not be retrieved are added (their columns are left
+    empty), or None to raise a FetchError instead.
     :return:
-    nested list [[],[],etc] containing the contents of the input file along with the acquired gene functions and
+    generator yielding the header row followed by the rows of the input along with the acquired gene functions and
     PubMed identifiers.
-    Integer representing the number of rows in the input file.
     """
-    data = []
-    with open(data_path, mode="r") as file:
-        row_count = count_lines(file)
-        csvReader = csv.reader(file, dialect="excel", delimiter="\t")
-
-        header = csvReader.__next__()
-        if header[0] == "KEGG_ID":
-            header.extend(["gene_function", "PubMed_ID"])
-            data.append(header)
-            uniprot_id_index = header.index("UniProt_ID")
-        else:
-            sys.exit("The file does not contain a valid header, quitting.")
-
-        for line in tqdm(csvReader, desc="Retrieving data", total=row_count-1):
+    header = next(rows)
+    if header[0] == "KEGG_ID":
+        header.extend(["gene_function", "PubMed_ID"])
+        yield header
+        uniprot_id_index = header.index("UniProt_ID")
+    else:
+        sys.exit("The file does not contain a valid header, quitting.")
+
+    # Offline no client is needed, creating one checks whether the database can be reached.
+    client = None if cache is not None and cache.offline else uniprot_client()
+
+    def fetch(lines):
+        uniprot_ids = [line[uniprot_id_index] for line in lines if line[uniprot_id_index]]
+        results = get_uniprot_annotations(uniprot_ids, cache, client) if batch_size > 1 else {}
+        failed = set()
+        for line in lines:
+            uniprot_id = line[uniprot_id_index]
+            if uniprot_id and uniprot_id not in results:
+                try:
+                    results[uniprot_id] = get_uniprot_data(uniprot_id, cache, client)
+                except FetchError:
+                    if failures is None:
+                        raise
+                    failed.add(uniprot_id)
+                    results[uniprot_id] = ("", [])
+            # Every row of a UniProt ID that could not be retrieved is a failure, not only the first.
+            if uniprot_id in failed:
+                failures.add(line[0])
+        return results
+
+    batches = chunked(rows, batch_size)
+    for lines, results in fetch_all(batches, fetch, workers):
+        for line in lines:
             uniprot_id = line[uniprot_id_index]
             if uniprot_id:
-                gene_function, pubmed_ids = get_uniprot_data(uniprot_id)
+                gene_function, pubmed_ids = results[uniprot_id]
                 line.extend([gene_function, ";".join(pubmed_ids)])
             else:
                 line.extend(["", ""])
-            data.append(line)
+            yield line
 
-    return data, row_count
 
-
-def get_uniprot_data(uniprot_id):
+def get_uniprot_data(uniprot_id, cache=None, client=None):
     """
     Function that uses a UniProt ID to query the Uniprot database for the corresponding entry from which it then takes
     the function and PubMed identifiers (if available) and returns them.
     :param uniprot_id:
     string giving the identifier of a UniProt database entry.
+    :param cache:
+    EntryCache object used to look up the entry before querying the database, or None to always query it.
+    :param client:
+    bioservices UniProt object to query the database with, the shared client (see clients.uniprot_client()) is used if
+    None.
     :return:
     a string giving the gene function and a list containing the PubMed identifiers.
     """
-    data = UniProt().retrieve("{0}".format(uniprot_id), frmt="txt")
-
-    regex_function = re.compile("(?<=CC   -!- FUNCTION: )(?s:.*?)(?=CC   -!-)")
-    regex_pubmed = re.compile("(?<=RX   PubMed=)(\\d*)(?=;)")
+    data = get_uniprot_entry(uniprot_id, cache, client)
+    with metrics.timer("parse.uniprot"):
+        entry = parse_uniprot_entry(data)
 
-    try:
-        pubmed_ids = re.findall(regex_pubmed, data)
-        match = re.search(regex_function, data)
-        if match:
-            gene_function = match.group()
-            gene_function = re.sub("\nCC", "", gene_function)
-            gene_function = re.sub(" +", " ", gene_function)
-            gene_function = gene_function.strip().replace(";", ".")
-        else:
-            gene_function = ""
-    except TypeError:
-        gene_function = ""
-        pubmed_ids = ""
+    return entry["function"], entry["pubmed_ids"]
 
-    return gene_function, pubmed_ids
 
-
-def parse_args():
+def parse_args(argv=None):
     """
     Function that parses commandline strings. Has an --input and --output argument for an input file and output file
     respectively. The input file must be tabular with a header row and a column called 'UniProt_ID' containing valid
-    UniProt identifiers (cells can be left empty).
+    UniProt identifiers (cells can be left empty). The --batch-size, --workers and --rate arguments set the number of
+    rows per query, the number of concurrent requests and the requests per second, which the --rate-file argument shares
+    with other scripts, and the --cache, --cache-ttl, --cache-size and --offline arguments configure the entry cache,
+    with --source local the entries are read from the --store instead. The --refresh argument disables reusing the
+    results of previous runs and the --format argument sets the format of the output file.
+    :param argv:
+    list of strings giving the arguments, defaults to the commandline arguments (sys.argv[1:]).
     :return:
-    Argument parser object with the arguments 'input' and 'output'.
+    Argument parser object with the arguments 'input', 'output', 'batch_size', 'workers', 'rate', 'rate_file', 'cache',
+    'cache_ttl', 'cache_size', 'offline', 'source', 'store', 'refresh', 'format' and 'metrics_file'.
     """
     parser = argparse.ArgumentParser(description="Get gene functionality and PubMed identifiers.",
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -100,10 +135,21 @@ def parse_args():
                         required=False,
                         default="./results/uniprot.csv",
                         help="(absolute) path for the output file.")
+    parser.add_argument("--batch-size",
+                        type=int,
+                        required=False,
+                        default=UNIPROT_BATCH_SIZE,
+                        help="number of rows retrieved per query (1 retrieves every entry separately).")
+    add_fetch_arguments(parser, "uniprot")
+    add_cache_arguments(parser)
+    add_journal_arguments(parser)
+    add_format_argument(parser)
+    add_metrics_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     return args
 
 
-main()
+if __name__ == "__main__":
+    main()